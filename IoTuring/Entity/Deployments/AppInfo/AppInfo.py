@@ -17,8 +17,8 @@ class AppInfo(Entity):
     NAME = "AppInfo"
 
     def Initialize(self):
-        self.RegisterEntitySensor(EntitySensor(self, KEY_NAME))
-        self.RegisterEntitySensor(EntitySensor(self, KEY_VERSION))
+        self.RegisterEntitySensor(EntitySensor(self, KEY_NAME, static=True))
+        self.RegisterEntitySensor(EntitySensor(self, KEY_VERSION, static=True))
         self.RegisterEntitySensor(EntitySensor(self, KEY_UPDATE, supportsExtraAttributes=True))
 
         self.SetEntitySensorValue(KEY_NAME, App.getName())
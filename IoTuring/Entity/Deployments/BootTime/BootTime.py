@@ -1,7 +1,7 @@
 import datetime
-import psutil
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 
 KEY_BOOT_TIME = 'boot_time'
 
@@ -10,8 +10,8 @@ class BootTime(Entity):
     NAME = "BootTime"
 
     def Initialize(self):
-        self.RegisterEntitySensor(EntitySensor(self, KEY_BOOT_TIME))
+        self.RegisterEntitySensor(EntitySensor(self, KEY_BOOT_TIME, static=True))
 
     def Update(self):
         self.SetEntitySensorValue(KEY_BOOT_TIME,
-                                  str(datetime.datetime.fromtimestamp(psutil.boot_time())))
+                                  str(datetime.datetime.fromtimestamp(PsutilSnapshot().BootTime())))
@@ -1,7 +1,7 @@
-import psutil
 from IoTuring.Entity.ValueFormat import ValueFormatter, ValueFormatterOptions
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 
 FREQUENCY_DECIMALS = 0
 
@@ -57,44 +57,50 @@ class Cpu(Entity):
                 supportsExtraAttributes=True))
 
     def Update(self):
+        snapshot = PsutilSnapshot()
+        cpu_times = snapshot.CpuTimes()
+        cpu_stats = snapshot.CpuStats()
+        load_avg = snapshot.LoadAvg()
+        cpu_freq = snapshot.CpuFreq()
+
         # CPU Percentage
-        self.SetEntitySensorValue(KEY_PERCENTAGE, psutil.cpu_percent())
+        self.SetEntitySensorValue(KEY_PERCENTAGE, snapshot.CpuPercent())
         # Extra data
         self.SetEntitySensorExtraAttribute(
-            KEY_PERCENTAGE, EXTRA_KEY_COUNT, psutil.cpu_count())
+            KEY_PERCENTAGE, EXTRA_KEY_COUNT, snapshot.CpuCount())
         # CPU times
-        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_TIMES_USER, psutil.cpu_times()[
+        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_TIMES_USER, cpu_times[
             0], valueFormatterOptions=VALUEFORMATOPTIONS_CPU_TIME)
-        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_TIMES_SYSTEM, psutil.cpu_times()[
+        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_TIMES_SYSTEM, cpu_times[
             1], valueFormatterOptions=VALUEFORMATOPTIONS_CPU_TIME)
-        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_TIMES_IDLE, psutil.cpu_times()[
+        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_TIMES_IDLE, cpu_times[
             2], valueFormatterOptions=VALUEFORMATOPTIONS_CPU_TIME)
         # CPU stats
-        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_STATS_CTX, psutil.cpu_stats(
-        )[0], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
-        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_STATS_INTERR, psutil.cpu_stats()[
+        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_STATS_CTX, cpu_stats[
+            0], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
+        self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_STATS_INTERR, cpu_stats[
             1], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
 
         # CPU avg load
         self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_AVERAGE_LOAD_LAST_1,
-                                           psutil.getloadavg()[0], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
+                                           load_avg[0], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
         self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_AVERAGE_LOAD_LAST_5,
-                                           psutil.getloadavg()[1], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
+                                           load_avg[1], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
         self.SetEntitySensorExtraAttribute(KEY_PERCENTAGE, EXTRA_KEY_AVERAGE_LOAD_LAST_15,
-                                           psutil.getloadavg()[2], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
+                                           load_avg[2], valueFormatterOptions=VALUEFORMATOPTIONS_ROUND2)
 
         # CPU freq
         self.SetEntitySensorValue(
             KEY_FREQ_CURRENT,
-            value=MHZ * psutil.cpu_freq()[0])
+            value=MHZ * cpu_freq[0])
         # Extra data
         self.SetEntitySensorExtraAttribute(
             sensorDataKey=KEY_FREQ_CURRENT,
             attributeKey=EXTRA_KEY_FREQ_MIN,
-            attributeValue=MHZ * psutil.cpu_freq()[1],
+            attributeValue=MHZ * cpu_freq[1],
             valueFormatterOptions=VALUEFORMATOPTIONS_CPU_FREQUENCY_MHZ)
         self.SetEntitySensorExtraAttribute(
             sensorDataKey=KEY_FREQ_CURRENT,
             attributeKey=EXTRA_KEY_FREQ_MAX,
-            attributeValue=MHZ * psutil.cpu_freq()[2],
+            attributeValue=MHZ * cpu_freq[2],
             valueFormatterOptions=VALUEFORMATOPTIONS_CPU_FREQUENCY_MHZ)
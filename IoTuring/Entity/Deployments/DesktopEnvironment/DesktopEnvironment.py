@@ -16,7 +16,7 @@ class DesktopEnvironment(Entity):
 
         # Attribute only on Linux
         self.RegisterEntitySensor(EntitySensor(
-            self, KEY_DE, supportsExtraAttributes=OsD.IsLinux()))
+            self, KEY_DE, supportsExtraAttributes=OsD.IsLinux(), static=True))
 
         # The value for this sensor is static for the entire script run time
         self.SetEntitySensorValue(KEY_DE, De.GetDesktopEnvironment())
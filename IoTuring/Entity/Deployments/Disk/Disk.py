@@ -1,6 +1,7 @@
 import psutil
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 from IoTuring.Configurator.MenuPreset import MenuPreset
 from IoTuring.Entity.ValueFormat import ValueFormatterOptions
 from IoTuring.MyApp.SystemConsts import OperatingSystemDetection as OsD
@@ -45,7 +46,7 @@ class Disk(Entity):
         try:
             # Get partision info for extra attributes:
             self.disk_partition = next(
-                (d for d in psutil.disk_partitions() if d.mountpoint == self.configuredPath))
+                (d for d in PsutilSnapshot().DiskPartitions() if d.mountpoint == self.configuredPath))
         except StopIteration:
             raise Exception(f"Device not found: {self.configuredPath}")
 
@@ -80,7 +81,7 @@ class Disk(Entity):
         """UpdateMethod, psutil does not need separate behaviour on any os
         """
 
-        usage = psutil.disk_usage(self.configuredPath)
+        usage = PsutilSnapshot().DiskUsage(self.configuredPath)
 
         self.SetEntitySensorValue(
             key=KEY_USED_PERCENTAGE,
@@ -1,6 +1,7 @@
 import psutil
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 from IoTuring.Entity.ValueFormat import ValueFormatterOptions
 from IoTuring.MyApp.SystemConsts import OperatingSystemDetection as OsD
 
@@ -35,7 +36,7 @@ class Fanspeed(Entity):
 
     def InitLinux(self) -> None:
         """OS dependant Init for Linux"""
-        sensors = psutil.sensors_fans()
+        sensors = PsutilSnapshot().SensorsFans()
         self.Log(self.LOG_DEBUG, f"fancontrollers found:{sensors}")
 
         for i, controller in enumerate(sensors):
@@ -64,7 +65,7 @@ class Fanspeed(Entity):
 
     def UpdateLinux(self) -> None:
         """Updatemethod for Linux"""
-        for controller, fans in psutil.sensors_fans().items():
+        for controller, fans in PsutilSnapshot().SensorsFans().items():
             # get all fanspeed in a list and find max
             highest_fan = max([fan.current for fan in fans])
             # find higest fanspeed and assign the entity state
@@ -9,7 +9,7 @@ class Hostname(Entity):
     NAME = "Hostname"
 
     def Initialize(self):
-        self.RegisterEntitySensor(EntitySensor(self, KEY_HOSTNAME))
+        self.RegisterEntitySensor(EntitySensor(self, KEY_HOSTNAME, static=True))
         # The value for this sensor is static for the entire script run time
         self.SetEntitySensorValue(KEY_HOSTNAME, self.GetHostname())
 
@@ -15,7 +15,7 @@ class OperatingSystem(Entity):
 
     def Initialize(self):
         self.RegisterEntitySensor(EntitySensor(
-            self, KEY_OS, supportsExtraAttributes=True))
+            self, KEY_OS, supportsExtraAttributes=True, static=True))
 
         # The value for this sensor is static for the entire script run time
         self.SetEntitySensorValue(KEY_OS, OsD.GetOs())
@@ -1,6 +1,6 @@
-import psutil
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 from IoTuring.Entity.ValueFormat import ValueFormatter, ValueFormatterOptions
 
 # Sensor: Virtual memory
@@ -29,19 +29,23 @@ class Ram(Entity):
         self.RegisterEntitySensor(EntitySensor(self, KEY_SWAP_PERCENTAGE, valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_PERCENTAGE, supportsExtraAttributes=True))
 
     def Update(self):
+        snapshot = PsutilSnapshot()
+        virtual_memory = snapshot.VirtualMemory()
+        swap_memory = snapshot.SwapMemory()
+
         # Virtual memory
-        self.SetEntitySensorValue(KEY_MEMORY_PERCENTAGE, psutil.virtual_memory()[2])
+        self.SetEntitySensorValue(KEY_MEMORY_PERCENTAGE, virtual_memory[2])
 
         # Extra
-        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_TOTAL, psutil.virtual_memory()[0], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
-        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_USED, psutil.virtual_memory()[3], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
-        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_AVAILABLE, psutil.virtual_memory()[1], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
-        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_FREE, psutil.virtual_memory()[4], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_TOTAL, virtual_memory[0], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_USED, virtual_memory[3], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_AVAILABLE, virtual_memory[1], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_MEMORY_PERCENTAGE, EXTRA_KEY_MEMORY_FREE, virtual_memory[4], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
         
         # Swap memory
-        self.SetEntitySensorValue(KEY_SWAP_PERCENTAGE, psutil.swap_memory()[3])
+        self.SetEntitySensorValue(KEY_SWAP_PERCENTAGE, swap_memory[3])
         
         # Extra
-        self.SetEntitySensorExtraAttribute(KEY_SWAP_PERCENTAGE, EXTRA_KEY_SWAP_TOTAL, psutil.swap_memory()[0], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
-        self.SetEntitySensorExtraAttribute(KEY_SWAP_PERCENTAGE, EXTRA_KEY_SWAP_USED, psutil.swap_memory()[1], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
-        self.SetEntitySensorExtraAttribute(KEY_SWAP_PERCENTAGE, EXTRA_KEY_SWAP_FREE, psutil.swap_memory()[2], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_SWAP_PERCENTAGE, EXTRA_KEY_SWAP_TOTAL, swap_memory[0], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_SWAP_PERCENTAGE, EXTRA_KEY_SWAP_USED, swap_memory[1], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
+        self.SetEntitySensorExtraAttribute(KEY_SWAP_PERCENTAGE, EXTRA_KEY_SWAP_FREE, swap_memory[2], valueFormatterOptions=VALUEFORMATOPTIONS_MEMORY_MB)
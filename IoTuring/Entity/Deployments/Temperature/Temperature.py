@@ -1,6 +1,6 @@
-import psutil
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 from IoTuring.Entity.ValueFormat import ValueFormatter, ValueFormatterOptions
 from IoTuring.MyApp.SystemConsts import OperatingSystemDetection as OsD # don't name Os as could be a problem with old configurations that used the Os entity
 
@@ -89,7 +89,7 @@ class Temperature(Entity):
     # I don't register packages that do not have Current temperature, so I store the registered in a list which is then checked during update
     def InitLinux(self):
         self.registeredPackages = []
-        sensors = psutil.sensors_temperatures()
+        sensors = PsutilSnapshot().SensorsTemperatures()
         index = 1
         for pkgName, data in sensors.items():
             if pkgName == None or pkgName == "":
@@ -102,7 +102,7 @@ class Temperature(Entity):
             index += 1
             
     def UpdateLinux(self):
-        sensors = psutil.sensors_temperatures()
+        sensors = PsutilSnapshot().SensorsTemperatures()
         index = 1
         for pkgName, data in sensors.items():
             if pkgName == None or pkgName == "":
@@ -1,7 +1,7 @@
-import psutil
 import time
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntitySensor
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
 from IoTuring.Entity.ValueFormat import ValueFormatter, ValueFormatterOptions
 
 KEY = 'uptime'
@@ -14,4 +14,4 @@ class UpTime(Entity):
         self.RegisterEntitySensor(EntitySensor(self, KEY, valueFormatterOptions=ValueFormatterOptions(ValueFormatterOptions.TYPE_TIME, 0, "m")))
 
     def Update(self):
-        self.SetEntitySensorValue(KEY, time.time() - psutil.boot_time())
+        self.SetEntitySensorValue(KEY, time.time() - PsutilSnapshot().BootTime())
@@ -9,7 +9,7 @@ class Username(Entity):
     NAME = "Username"
 
     def Initialize(self):
-        self.RegisterEntitySensor(EntitySensor(self, KEY_USERNAME))
+        self.RegisterEntitySensor(EntitySensor(self, KEY_USERNAME, static=True))
         self.SetEntitySensorValue(KEY_USERNAME, self.GetUsername())
 
 
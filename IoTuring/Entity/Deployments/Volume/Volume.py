@@ -1,9 +1,11 @@
 import re
 
+from IoTuring.Configurator.MenuPreset import MenuPreset
 from IoTuring.Entity.Entity import Entity
 from IoTuring.Entity.EntityData import EntityCommand, EntitySensor
 from IoTuring.Entity.ValueFormat import ValueFormatterOptions
 from IoTuring.MyApp.SystemConsts import OperatingSystemDetection as OsD
+from IoTuring.Scheduler.Coalescer import CoalescingPolicy, COALESCE_THROTTLE
 
 KEY_STATE = 'volume_state'
 KEY_CMD = 'volume'
@@ -22,6 +24,9 @@ commands = {
 
 UNMUTE_PREFIX_LINUX = 'pactl set-sink-mute @DEFAULT_SINK@ 0'
 
+# A slider sends many values while moving, set at most 4 of them each second, always the last one:
+DEFAULT_COALESCING = CoalescingPolicy(COALESCE_THROTTLE, 0.25)
+
 
 class Volume(Entity):
     NAME = "Volume"
@@ -34,7 +39,8 @@ class Volume(Entity):
             supportsExtraAttributes=True,
             valueFormatterOptions=VALUEFORMATTEROPTIONS_PERCENTAGE_ROUND0))
         self.RegisterEntityCommand(EntityCommand(
-            self, KEY_CMD, self.Callback, KEY_STATE))
+            self, KEY_CMD, self.Callback, KEY_STATE,
+            coalescing=CoalescingPolicy.FromConfigurations(self)))
 
     def Update(self):
         if OsD.IsMacos():
@@ -102,6 +108,12 @@ class Volume(Entity):
         self.SetEntitySensorExtraAttribute(
             KEY_STATE, EXTRA_KEY_MUTED_OUTPUT, output_muted)
 
+    @classmethod
+    def ConfigurationPreset(cls) -> MenuPreset:
+        preset = MenuPreset()
+        CoalescingPolicy.AddConfigurationEntries(preset, DEFAULT_COALESCING)
+        return preset
+
     @classmethod
     def CheckSystemSupport(cls):
         if OsD.IsLinux():
@@ -3,14 +3,15 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from IoTuring.Configurator.Configuration import SingleConfiguration
     from IoTuring.Entity.EntityData import EntityData, EntitySensor, EntityCommand, ExtraAttribute
+    from IoTuring.Scheduler.Scheduler import Tick
 
 
-import time
 import subprocess
 
 from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
 from IoTuring.Logger.LogObject import LogObject
 from IoTuring.Exceptions.Exceptions import UnknownEntityKeyException
+from IoTuring.Entity.EntityManager import EntityManager
 
 from IoTuring.MyApp.SystemConsts import OperatingSystemDetection as OsD
 
@@ -28,12 +29,15 @@ class Entity(ConfiguratorObject, LogObject):
 
         self.tag = self.GetConfigurations().GetTag()
 
-        # When I update the values this number changes (randomly) so each warehouse knows I have updated
+        # When I update the values this number changes so each warehouse knows I have updated
         self.valuesID = 0
 
         self.updateTimeout = int(
             AppSettings.GetFromSettingsConfigurations(CONFIG_KEY_UPDATE_INTERVAL))
 
+        # Timing of the running update, set by the scheduler:
+        self.lastTick = None
+
     def Initialize(self):
         """ Must be implemented in sub-classes, may be useful here to use the configuration """
         pass
@@ -51,8 +55,13 @@ class Entity(ConfiguratorObject, LogObject):
             return False
         return True
 
-    def CallUpdate(self):  # Call the Update method safely
-        """ Safe method to run the Update function """
+    def CallUpdate(self, tick: Tick | None = None):  # Call the Update method safely
+        """ Safe method to run the Update function. The tick is passed by the scheduler """
+        if tick:
+            self.lastTick = tick
+            if tick.missed:
+                self.Log(self.LOG_WARNING,
+                         f"Update is slower than the update interval, skipped {tick.missed} updates")
         try:
             self.Update()
         except Exception as exc:
@@ -92,21 +101,30 @@ class Entity(ConfiguratorObject, LogObject):
         self.GetEntitySensorByKey(sensorDataKey).SetExtraAttribute(
             attributeKey, attributeValue, valueFormatterOptions)
 
+    def NotifyValuesChanged(self, entitySensor: EntitySensor) -> None:
+        """ Called by the entity sensors when their value or extra attributes change """
+        self.valuesID += 1
+        EntityManager().NotifyValuesChanged(entitySensor)
+
     def SetUpdateTimeout(self, timeout) -> None:
         """ Set how much time to wait between 2 updates """
         self.updateTimeout = timeout
 
+    def GetUpdateTimeout(self) -> float:
+        """ Return how much time to wait between 2 updates """
+        return self.updateTimeout
+
+    def GetLastTick(self) -> Tick | None:
+        """ Return the Tick of the last update: its deadline and how late it started, useful for rates """
+        return self.lastTick
+
     def ShouldUpdate(self) -> bool:
-        """ Wait the correct timeout time and then the update will run """
-        time.sleep(self.updateTimeout)
+        """ Called by the scheduler when the update is due: return False to skip this update """
         return True
 
-    def LoopThread(self) -> None:
-        """ Entry point of Entity thread, will run the Update function periodically """
-        self.CallUpdate()  # first call
-        while (True):
-            if self.ShouldUpdate():
-                self.CallUpdate()
+    def HasUpdate(self) -> bool:
+        """ True if the Update method is implemented by this entity """
+        return not type(self).Update is Entity.Update
 
     def RegisterEntitySensor(self, entitySensor: EntitySensor):
         """ Add EntitySensor to the Entity. This action must be in Initialize """
@@ -174,7 +192,8 @@ class Entity(ConfiguratorObject, LogObject):
                    log_errors: bool = True,
                    shell: bool = False,
                    **kwargs) -> subprocess.CompletedProcess:
-        """Safely call a subprocess. Kwargs are other Subprocess options
+        """Safely call a subprocess. Kwargs are other Subprocess options.
+        Shell commands without other options run in the shell worker pool, if enabled
 
         Args:
             command (str | list): The command to call
@@ -208,8 +227,13 @@ class Entity(ConfiguratorObject, LogObject):
             else:
                 command_name = self.NAME
 
-            p = subprocess.run(
-                runcommand, shell=shell, **kwargs)
+            shellWorkerPool = EntityManager().GetShellWorkerPool()
+            if shell and isinstance(runcommand, str) and kwargs == defaults \
+                    and shellWorkerPool and shellWorkerPool.IsEnabled():
+                p = shellWorkerPool.Run(runcommand)
+            else:
+                p = subprocess.run(
+                    runcommand, shell=shell, **kwargs)
 
             self.Log(self.LOG_DEBUG, f"Called {command_name} command: {p}")
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from IoTuring.Entity.Entity import Entity
+    from IoTuring.Scheduler.Coalescer import CoalescingPolicy
 
 from IoTuring.Logger.LogObject import LogObject
 from IoTuring.Entity.ValueFormat import ValueFormatter
@@ -42,19 +43,29 @@ class EntitySensor(EntityData):
     def __init__(self, entity, key,
                  valueFormatterOptions=None,
                  supportsExtraAttributes=False,
-                 customPayload={}):
+                 customPayload={},
+                 static=False):
         """
         If supportsExtraAttributes is True, the entity sensor can have extra attributes.
+        If static is True, the value never changes while running (e.g. the hostname).
         valueFormatterOptions is a IoTuring.Entity.ValueFormat.ValueFormatterOptions object.
         CustomPayload overrides HomeAssistant discovery configuration
         """
         EntityData.__init__(self, entity, key, customPayload)
         self.supportsExtraAttributes = supportsExtraAttributes
         self.valueFormatterOptions = valueFormatterOptions
+        self.static = static
+
+        # Increased every time the value or an extra attribute changes
+        self.version = 0
 
     def DoesSupportExtraAttributes(self) -> bool:
         return self.supportsExtraAttributes
 
+    def IsStatic(self) -> bool:
+        """ True if the value never changes while running """
+        return self.static
+
     def GetValueFormatterOptions(self):
         return self.valueFormatterOptions
 
@@ -66,7 +77,19 @@ class EntitySensor(EntityData):
 
     def SetValue(self, value) -> None:
         self.Log(self.LOG_DEBUG, "Set to " + str(value))
+        changed = not self.HasValue() or self.value != value
         self.value = value
+        if changed:
+            self.SetAsChanged()
+
+    def GetVersion(self) -> int:
+        """ Number that changes every time the value or an extra attribute changes """
+        return self.version
+
+    def SetAsChanged(self) -> None:
+        """ Increase the version and notify the entity """
+        self.version += 1
+        self.GetEntity().NotifyValuesChanged(self)
 
     def HasValue(self) -> bool:
         """ True if self.value isn't empty """
@@ -111,26 +134,35 @@ class EntitySensor(EntityData):
         if not extraAttributeObj:
             self.extraAttributes.append(ExtraAttribute(
                 attribute_name, attribute_value, valueFormatterOptions))
-        else:
+            self.SetAsChanged()
+        elif extraAttributeObj.GetValue() != attribute_value:
             extraAttributeObj.SetValue(attribute_value)
+            self.SetAsChanged()
 
 
 class EntityCommand(EntityData):
 
     def __init__(self, entity, key, callbackFunction,
-                 connectedEntitySensorKey=None, customPayload={}):
+                 connectedEntitySensorKey=None, customPayload={},
+                 coalescing: CoalescingPolicy | None = None):
         """
         If a key for the entity sensor is passed, warehouses that support it use this command as a switch with state.
         Better to register the sensor before this command to avoud unexpected behaviours.
-        CustomPayload overrides HomeAssistant discovery configuration
+        CustomPayload overrides HomeAssistant discovery configuration.
+        Coalescing drops the commands replaced by newer ones before running the callback (e.g. for sliders)
         """
         EntityData.__init__(self, entity, key, customPayload)
         self.callbackFunction = callbackFunction
         self.connectedEntitySensorKey = connectedEntitySensorKey
+        self.coalescing = coalescing
 
     def SupportsState(self):
         return self.connectedEntitySensorKey is not None
 
+    def GetCoalescingPolicy(self) -> CoalescingPolicy | None:
+        """ Return how commands arriving close together are coalesced, None to run all of them """
+        return self.coalescing
+
     def GetConnectedEntitySensor(self) -> EntitySensor:
         """ Returns the entity sensor connected to this command, if this command supports state.
             Otherwise returns None. """
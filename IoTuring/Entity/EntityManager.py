@@ -2,10 +2,19 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from IoTuring.Entity.Entity import Entity
+    from IoTuring.Entity.EntityData import EntitySensor
+
+from typing import Callable
 
-from threading import Thread
 from IoTuring.Logger.LogObject import LogObject
 from IoTuring.Logger.Logger import Singleton
+from IoTuring.Scheduler.Scheduler import Scheduler, ScheduledJob
+from IoTuring.Scheduler.KeyedExecutor import KeyedExecutor
+from IoTuring.Scheduler.PhaseOffset import PhaseOffset
+from IoTuring.Entity.ShellWorkerPool import ShellWorkerPool
+
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, \
+    CONFIG_KEY_UPDATE_WORKERS, CONFIG_KEY_COMMAND_WORKERS, CONFIG_KEY_COMMAND_QUEUE_SIZE
 
 
 class EntityManager(LogObject, metaclass=Singleton):
@@ -15,6 +24,18 @@ class EntityManager(LogObject, metaclass=Singleton):
         # Where I store the entities that update periodically that have an active behaviour: can send and receive data
         self.activeEntities = []
 
+        # Runs the Update of every entity, with a fixed number of threads
+        self.scheduler = Scheduler()
+
+        # Functions to call when a sensor value changes, so warehouses can publish it
+        self.valuesChangedListeners = []
+
+        # Runs the received commands, one at a time for each entity
+        self.commandExecutor = KeyedExecutor("Commands")
+
+        # Shells reused by the shell commands of the entities, created at the start after the settings are loaded
+        self.shellWorkerPool = None
+
     @staticmethod
     def EntityNameToClass(name):  # TODO Implement
         """ Get entity name and return its class """
@@ -24,9 +45,34 @@ class EntityManager(LogObject, metaclass=Singleton):
         """ Pass an entity instance, add to list of active entities """
         self.activeEntities.append(entity)
 
+    def AddValuesChangedListener(self, callback: Callable[[EntitySensor], None]) -> None:
+        """ The callback will be called with the entity sensor every time its value or extra attributes change.
+            It runs in the thread of the update, so it must return quickly """
+        self.valuesChangedListeners.append(callback)
+
+    def NotifyValuesChanged(self, entitySensor: EntitySensor) -> None:
+        """ Tell the listeners that the entity sensor changed """
+        for callback in self.valuesChangedListeners:
+            try:
+                callback(entitySensor)
+            except Exception as e:
+                self.Log(self.LOG_ERROR,
+                         f"Error while notifying the change of {entitySensor.GetId()}: {str(e)}")
+
+    def GetCommandExecutor(self) -> KeyedExecutor:
+        """ Executor shared by the warehouses to run the commands out of their network threads """
+        return self.commandExecutor
+
+    def GetShellWorkerPool(self) -> ShellWorkerPool | None:
+        """ Pool to run the shell commands of the entities, None before the start """
+        return self.shellWorkerPool
+
     def Start(self):
+        # Before the entities initialization, that may run commands:
+        self.shellWorkerPool = ShellWorkerPool()
         self.InitializeEntities()
         self.ManageUpdates()
+        self.ManageCommands()
 
     def GetEntities(self) -> list[Entity]:
         """ 
@@ -48,12 +94,27 @@ class EntityManager(LogObject, metaclass=Singleton):
                 self.UnloadEntity(entity) # if errors, unload
 
     def ManageUpdates(self):
-        """ Start a thread for each entity in which it will update periodically """
+        """ Schedule the periodic update of each entity and start the scheduler.
+            The first update is shifted by the phase offset, like the warehouse loops """
+        phaseOffset = PhaseOffset.FromSettings()
+
         for entity in self.GetEntities():
-            
-            # Only start threads for entities with Update() method:
-            if not entity.Update.__qualname__ == "Entity.Update":
-                thread = Thread(target=entity.LoopThread)
-                thread.daemon = True
-                thread.start()
 
+            # Only schedule entities with Update() method:
+            if entity.HasUpdate():
+                self.scheduler.AddJob(ScheduledJob(
+                    name=entity.GetEntityId(),
+                    callback=entity.CallUpdate,
+                    intervalFunction=entity.GetUpdateTimeout,
+                    shouldRunFunction=entity.ShouldUpdate),
+                    delay=phaseOffset.GetDelay(entity.GetUpdateTimeout()))
+
+        self.scheduler.Start(workers=int(
+            AppSettings.GetFromSettingsConfigurations(CONFIG_KEY_UPDATE_WORKERS)))
+
+    def ManageCommands(self):
+        """ Start the workers that run the commands """
+        self.commandExecutor.SetMaxQueueSize(int(
+            AppSettings.GetFromSettingsConfigurations(CONFIG_KEY_COMMAND_QUEUE_SIZE)))
+        self.commandExecutor.Start(workers=int(
+            AppSettings.GetFromSettingsConfigurations(CONFIG_KEY_COMMAND_WORKERS)))
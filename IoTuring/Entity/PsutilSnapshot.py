@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import time
+from threading import Lock
+
+import psutil
+
+from IoTuring.Logger.LogObject import LogObject
+from IoTuring.Logger.Logger import Singleton
+
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, CONFIG_KEY_PSUTIL_CACHE_TTL
+
+
+class PsutilSnapshot(LogObject, metaclass=Singleton):
+    """ Process-wide cache of psutil results, shared by all the entities.
+
+    Each psutil function is called at most once every TTL for the same arguments,
+    so entities reading the same structure (or the same one many times in an update)
+    don't read and parse /proc or /sys again.
+    """
+
+    def __init__(self) -> None:
+        self.ttl = int(AppSettings.GetFromSettingsConfigurations(
+            CONFIG_KEY_PSUTIL_CACHE_TTL)) / 1000
+
+        # (function name, args) -> (monotonic time, result)
+        self.cache = {}
+
+        # One lock for each cache key, so slow calls don't block the others:
+        self.locks = {}
+        self.locksLock = Lock()
+
+    def SetTTL(self, ttl: float) -> None:
+        """ Set for how many seconds a result is reused """
+        self.ttl = ttl
+
+    def Get(self, functionName: str, *args):
+        """ Return the result of psutil.functionName(*args), from the cache if it's not older than the TTL """
+        key = (functionName, args)
+
+        with self.locksLock:
+            if key not in self.locks:
+                self.locks[key] = Lock()
+            keyLock = self.locks[key]
+
+        with keyLock:
+            now = time.monotonic()
+            if key in self.cache:
+                timestamp, result = self.cache[key]
+                if now - timestamp < self.ttl:
+                    return result
+
+            result = getattr(psutil, functionName)(*args)
+            self.cache[key] = (now, result)
+            return result
+
+    # Functions used by the entities:
+
+    def CpuPercent(self) -> float:
+        return self.Get("cpu_percent")
+
+    def CpuCount(self) -> int:
+        return self.Get("cpu_count")
+
+    def CpuTimes(self):
+        return self.Get("cpu_times")
+
+    def CpuStats(self):
+        return self.Get("cpu_stats")
+
+    def CpuFreq(self):
+        return self.Get("cpu_freq")
+
+    def LoadAvg(self) -> tuple:
+        return self.Get("getloadavg")
+
+    def VirtualMemory(self):
+        return self.Get("virtual_memory")
+
+    def SwapMemory(self):
+        return self.Get("swap_memory")
+
+    def DiskUsage(self, path: str):
+        return self.Get("disk_usage", path)
+
+    def DiskPartitions(self) -> list:
+        return self.Get("disk_partitions")
+
+    def SensorsTemperatures(self) -> dict:
+        return self.Get("sensors_temperatures")
+
+    def SensorsFans(self) -> dict:
+        return self.Get("sensors_fans")
+
+    def BootTime(self) -> float:
+        return self.Get("boot_time")
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import os
+import queue
+import shlex
+import subprocess
+import uuid
+from threading import Lock, Thread
+
+from IoTuring.Logger.LogObject import LogObject
+from IoTuring.Logger.Logger import Singleton
+
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, CONFIG_KEY_SHELL_WORKERS
+
+
+SHELL_PATH = "/bin/sh"
+
+# Seconds between the checks for a free worker, a worker that exited can be replaced meanwhile:
+WORKER_WAIT_INTERVAL = 1
+
+
+class ShellWorker(LogObject):
+    """ A long-lived shell running commands written to its stdin.
+
+    Each command is run with eval, so it can't break the framing, in a subshell with stdin
+    from /dev/null. After it, the shell prints a marker with the exit code on stdout and a marker
+    on stderr: the output is read until the markers. The subshell is a fork of the running shell,
+    without a new exec: like with a new shell, the changes of a command to the shell state
+    (e.g. cd, variables, set -e, exit) don't reach the next ones. If the shell dies anyway,
+    its exit code is returned and the worker is not used anymore.
+    """
+
+    def __init__(self) -> None:
+        # Never printed by a command by chance:
+        self.marker = f"__iot_{uuid.uuid4().hex}__"
+        self.process = subprocess.Popen(
+            [SHELL_PATH], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        # stderr is read by another thread, so a command writing a lot on it doesn't block:
+        self.stderrQueue = queue.Queue()
+        thread = Thread(target=self.StderrThread)
+        thread.daemon = True
+        thread.start()
+
+    def IsAlive(self) -> bool:
+        return self.process.poll() is None
+
+    def Run(self, command: str) -> subprocess.CompletedProcess:
+        """ Run the command in the shell, return its output and exit code """
+        self.process.stdin.write(
+            f"(eval {shlex.quote(command)}) </dev/null; "
+            f"printf '\\n%s %d\\n' {self.marker} \"$?\"; "
+            f"printf '\\n%s\\n' {self.marker} >&2\n".encode())
+        self.process.stdin.flush()
+
+        stdout = b""
+        returncode = None
+        markerPrefix = f"{self.marker} ".encode()
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                # The command killed the shell:
+                returncode = self.process.wait()
+                break
+            if line.startswith(markerPrefix):
+                returncode = int(line[len(markerPrefix):])
+                break
+            stdout += line
+
+        stderr = self.stderrQueue.get()
+
+        return subprocess.CompletedProcess(
+            args=command, returncode=returncode,
+            stdout=self.Decode(stdout), stderr=self.Decode(stderr))
+
+    def StderrThread(self) -> None:
+        """ Read stderr, put the output of each command in the queue when its marker arrives """
+        stderr = b""
+        marker = f"{self.marker}\n".encode()
+        for line in self.process.stderr:
+            if line == marker:
+                self.stderrQueue.put(stderr)
+                stderr = b""
+            else:
+                stderr += line
+        # Closed by the shell:
+        self.stderrQueue.put(stderr)
+
+    @staticmethod
+    def Decode(output: bytes) -> str:
+        """ Text of the output, without the newline printed before the marker """
+        if output.endswith(b"\n"):
+            output = output[:-1]
+        return output.decode(errors="replace").replace("\r\n", "\n")
+
+    def Close(self) -> None:
+        """ Stop the shell """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+
+class ShellWorkerPool(LogObject, metaclass=Singleton):
+    """ Process-wide pool of shells, to run shell commands without starting a new shell each time.
+
+    Writing a command to a running shell costs a pipe write and a fork of the shell instead of starting a new one,
+    useful with many entities running small commands often (e.g. Terminal sensors).
+    Workers are started when needed, up to the configured number; commands wait for a free one.
+    """
+
+    def __init__(self) -> None:
+        self.size = int(AppSettings.GetFromSettingsConfigurations(
+            CONFIG_KEY_SHELL_WORKERS) or 0)
+        if os.name != "posix" or not os.path.exists(SHELL_PATH):
+            self.size = 0
+
+        # Workers not running a command:
+        self.idleWorkers = queue.Queue()
+        self.workersCount = 0
+        self.lock = Lock()
+
+    def IsEnabled(self) -> bool:
+        """ Return False if every command must start its own shell """
+        return self.size > 0
+
+    def SetSize(self, size: int) -> None:
+        """ Set the maximum number of workers, 0 to disable the pool. Extra idle workers are stopped """
+        self.size = size
+        while self.workersCount > self.size:
+            try:
+                worker = self.idleWorkers.get_nowait()
+            except queue.Empty:
+                # The busy ones are stopped when their command ends:
+                return
+            self.RemoveWorker(worker)
+
+    def Run(self, command: str) -> subprocess.CompletedProcess:
+        """ Run the shell command in a free worker, like subprocess.run with shell, capture_output and text """
+        worker = self.GetWorker()
+        try:
+            result = worker.Run(command)
+        except Exception:
+            self.RemoveWorker(worker)
+            raise
+
+        if not worker.IsAlive():
+            self.Log(self.LOG_DEBUG, "Shell worker exited, it will be replaced")
+            self.RemoveWorker(worker)
+        elif self.workersCount > self.size:
+            # The size was lowered meanwhile:
+            self.RemoveWorker(worker)
+        else:
+            self.idleWorkers.put(worker)
+        return result
+
+    def GetWorker(self) -> ShellWorker:
+        """ Return a free worker, start one if there are less than the size, otherwise wait for one """
+        while True:
+            try:
+                return self.idleWorkers.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self.lock:
+                start = self.workersCount < self.size
+                if start:
+                    self.workersCount += 1
+
+            if start:
+                try:
+                    return ShellWorker()
+                except Exception:
+                    with self.lock:
+                        self.workersCount -= 1
+                    raise
+
+            try:
+                return self.idleWorkers.get(timeout=WORKER_WAIT_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def RemoveWorker(self, worker: ShellWorker) -> None:
+        with self.lock:
+            self.workersCount -= 1
+        try:
+            worker.Close()
+        except Exception:
+            pass
@@ -1,23 +1,63 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Warehouse.OfflineQueue import OfflineQueue
+
 import sys
+import time
+import random
+from threading import Lock, Thread, Event, Condition
 
 from IoTuring.Logger.LogObject import LogObject
 from IoTuring.MyApp.App import App
 import paho.mqtt.client as MqttClient
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
 
 try:
     import paho.mqtt.enums as mqttEnums
 except ModuleNotFoundError:
-    sys.exit("paho.mqtt.enums not found! Update paho-mqtt package to 2.0.0! Exiting...")
+    sys.exit("paho.mqtt.enums not found! Update paho-mqtt package to 2.1.0! Exiting...")
 
 
 from IoTuring.Protocols.MQTTClient.TopicCallback import TopicCallback
+from IoTuring.Protocols.MQTTClient.TopicIndex import TopicIndex
+from IoTuring.Protocols.MQTTClient.PublishQueue import PublishQueue, OutgoingMessage
+from IoTuring.Protocols.MQTTClient.TopicAliases import TopicAliases
+from IoTuring.Protocols.MQTTClient.MQTTTransport import MQTTTransport
+from IoTuring.Protocols.MQTTClient.MQTTSession import MQTTSession
+from IoTuring.Scheduler.KeyedExecutor import KeyedExecutor
+from IoTuring.Scheduler.Coalescer import CoalescingPolicy
+
+# Maximum number of topics in a single SUBSCRIBE packet:
+SUBSCRIBE_BATCH_SIZE = 50
+
+# Default reconnection backoff, in seconds:
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 120
+
+# Protocol versions that can be chosen in the configurations:
+MQTT_VERSION_311 = "3.1.1"
+MQTT_VERSION_5 = "5"
+PROTOCOL_VERSIONS = {
+    MQTT_VERSION_311: MqttClient.MQTTv311,
+    MQTT_VERSION_5: MqttClient.MQTTv5
+}
+MQTT_VERSION_CHOICES = [{"name": "3.1.1", "value": MQTT_VERSION_311},
+                        {"name": "5", "value": MQTT_VERSION_5}]
+
+# Maximum number of messages passed to paho and not written to the socket yet:
+MAX_UNSENT_PUBLISHES = 100
+
+# Maximum seconds a batch holds its messages, if not flushed before:
+MAX_BATCH_HOLD = 5
 
 """
 
 MQTTClient Operations:
 - Init
 - AsyncConnect
-- SendTopicData
+- SendTopicData (through the PublishQueue), between StartBatch and FlushBatch to publish them together
 - AddNewTopicToSubscribeTo
 
 """
@@ -26,20 +66,79 @@ MQTTClient Operations:
 class MQTTClient(LogObject):
     client = None
     connected = False
+    # Increased on every successful connection:
+    connectionsCount = 0
 
     # After the init, you have to connect with AsyncConnect !
-    def __init__(self, address, port=1883, name=None, username="", password=""):
+    def __init__(self, address, port=1883, name=None, username="", password="", protocolVersion=MQTT_VERSION_311,
+                 transport: MQTTTransport | None = None, session: MQTTSession | None = None):
+        """ transport: TCP, TLS or Unix socket (the address is the socket path), default TCP.
+            session: if the broker keeps the session between the connections, default not """
         self.address = address
         self.port = int(port)
         self.name = name
         self.username = username
         self.password = password
+        self.transport = transport or MQTTTransport()
+        self.session = session or MQTTSession()
+
+        if protocolVersion not in PROTOCOL_VERSIONS:
+            raise Exception(
+                f"Configuration error: Invalid MQTT version: {protocolVersion}")
+        self.protocolVersion = protocolVersion
 
         if self.name == None:
             self.name = App.getName()
 
         # List of TopicCallback objects, which I use to call callbacks, compare topics, keep subscribed state
         self.topicCallbacks = []
+        # The same TopicCallbacks, indexed to find the ones matching an incoming topic
+        self.topicIndex = TopicIndex()
+
+        # SUBSCRIBE message id -> list of (topic, TopicCallbacks of the topic) waiting for the SUBACK
+        self.pendingSubscriptions = {}
+        self.subscriptionsLock = Lock()
+
+        # If set, callbacks run in its threads instead of the network thread
+        self.callbacksExecutor = None
+
+        # If set, messages sent while disconnected are stored and sent after the reconnection
+        self.offlineQueue = None
+        # True while the queued messages are being sent, the new ones are queued after them
+        self.draining = False
+
+        # (topic, payload) of the last will, None if not set
+        self.lwt = None
+        self.connectStarted = False
+
+        # Reconnection backoff: the delay is random, up to base * 2^attempts, capped at max
+        self.reconnectBaseDelay = RECONNECT_BASE_DELAY
+        self.reconnectMaxDelay = RECONNECT_MAX_DELAY
+        self.reconnectAttempts = 0
+
+        # Set while connected, to wait for the connection:
+        self.connectedEvent = Event()
+
+        # Messages to publish, sent by the publish thread at the configured rate
+        self.publishQueue = None
+        # Message id -> OutgoingMessage passed to paho, until it's written to the socket (QoS 0) or acknowledged:
+        self.unsentPublishes = {}
+        # Message ids written before publish() returned:
+        self.earlyPublishes = set()
+        # Number of publish() calls not returned yet, only their message ids can be early:
+        self.publishingCount = 0
+        self.publishCondition = Condition()
+
+        # MQTT 5 topic aliases of the current connection:
+        self.topicAliases = TopicAliases()
+        # Held while passing a message to paho, so the message setting an alias is sent before the ones using it,
+        # and while resetting the aliases, so a message never uses an alias of the previous connection:
+        self.publishLock = Lock()
+
+        # Number of open batches, their messages are published when all of them are flushed:
+        self.batchDepth = 0
+        self.batchStartTime = 0.0
+        self.batchCondition = Condition()
 
         self.Log(self.LOG_INFO, 'Preparing MQTT client')
         self.SetupClient()
@@ -48,8 +147,79 @@ class MQTTClient(LogObject):
         """ Return True if client is currently connected """
         return self.connected
 
+    def IsMQTT5(self) -> bool:
+        """ Return True if the client uses MQTT 5, which supports message properties like expiry """
+        return self.protocolVersion == MQTT_VERSION_5
+
+    def WaitForConnection(self, timeout: float | None = None) -> bool:
+        """ Wait until the client is connected, at most timeout seconds. Return True if connected """
+        return self.connectedEvent.wait(timeout)
+
+    def SetReconnectBackoff(self, baseDelay: float, maxDelay: float) -> None:
+        """ Set the seconds of the reconnection delay: it doubles on each failed attempt
+            starting from baseDelay, up to maxDelay. The real delay is random between 0 and that
+            value, so many clients disconnected together don't reconnect at the same time """
+        self.reconnectBaseDelay = baseDelay
+        self.reconnectMaxDelay = maxDelay
+
+    def SetCallbacksExecutor(self, executor: KeyedExecutor) -> None:
+        """ Run the callbacks of the received messages with this executor, so slow callbacks
+            don't block the network thread (keepalives, publishes, other messages) """
+        self.callbacksExecutor = executor
+
+    def SetOfflineQueue(self, offlineQueue: OfflineQueue) -> None:
+        """ Store the messages sent while disconnected in this queue.
+            If the client is shared and already has a queue, that one is kept """
+        if self.offlineQueue:
+            if self.offlineQueue.GetKey() != offlineQueue.GetKey():
+                self.Log(self.LOG_WARNING,
+                         "The connection is shared: the offline queue settings of the first warehouse are used")
+            return
+        self.offlineQueue = offlineQueue
+
+    def HasOfflineQueue(self) -> bool:
+        return self.offlineQueue is not None
+
+    def SetPublishQueue(self, publishQueue: PublishQueue) -> None:
+        """ Publish the messages with this queue size and rate limits.
+            If the client is shared and already has a queue, that one is kept """
+        if self.publishQueue:
+            if self.publishQueue.GetKey() != publishQueue.GetKey():
+                self.Log(self.LOG_WARNING,
+                         "The connection is shared: the publish queue settings of the first warehouse are used")
+            return
+        self.publishQueue = publishQueue
+
+    def GetSession(self) -> MQTTSession:
+        return self.session
+
+    def GetTopicAliases(self) -> TopicAliases:
+        """ Return the topic aliases, to read how many bytes they saved """
+        return self.topicAliases
+
+    def GetPublishQueue(self) -> PublishQueue:
+        """ Return the publish queue, with the default limits if not set. Its metrics can be read from here """
+        if not self.publishQueue:
+            self.publishQueue = PublishQueue()
+        return self.publishQueue
+
+    def GetConnectionsCount(self) -> int:
+        """ Return the number of successful connections, to know if the client reconnected """
+        return self.connectionsCount
+
     def SetupClient(self) -> None:
-        self.client = MqttClient.Client(callback_api_version=mqttEnums.CallbackAPIVersion.VERSION2, client_id=self.name)
+        clientArgs = {}
+        if not self.IsMQTT5():
+            # With MQTT 5 it's set at the connection:
+            clientArgs["clean_session"] = not self.session.IsPersistent()
+
+        self.client = MqttClient.Client(callback_api_version=mqttEnums.CallbackAPIVersion.VERSION2, client_id=self.name,
+                                        protocol=PROTOCOL_VERSIONS[self.protocolVersion],
+                                        transport=self.transport.GetPahoTransport(),
+                                        **clientArgs)
+
+        if self.transport.IsTLS():
+            self.client.tls_set_context(self.transport.GetSSLContext())
 
         if self.username != "" and self.password != "":
             self.client.username_pw_set(self.username, self.password)
@@ -58,80 +228,419 @@ class MQTTClient(LogObject):
         self.client.on_connect = self.Event_OnClientConnect
         self.client.on_disconnect = self.Event_OnClientDisconnect
         self.client.on_message = self.Event_OnMessageReceive
+        self.client.on_subscribe = self.Event_OnSubscribe
+        self.client.on_connect_fail = self.Event_OnConnectFail
+        self.client.on_publish = self.Event_OnPublish
+
+    def IsConnectStarted(self) -> bool:
+        """ Return True if AsyncConnect was called, so the last will can't change anymore """
+        return self.connectStarted
 
     def AsyncConnect(self) -> None:
-        """ Connect async to the broker """
+        """ Connect async to the broker, only the first call has effect """
+        if self.connectStarted:
+            return
+        self.connectStarted = True
         self.Log(self.LOG_INFO, 'MQTT Client ready to connect to the broker')
+        connectArgs = {}
+        if self.IsMQTT5() and self.session.IsPersistent():
+            properties = Properties(PacketTypes.CONNECT)
+            properties.SessionExpiryInterval = self.session.GetExpiry()
+            connectArgs = {"clean_start": False, "properties": properties}
+
         # If broker is not reachable wait till he's reachable
-        self.client.connect_async(self.address, port=self.port)
+        self.client.connect_async(self.address, port=self.port, **connectArgs)
         self.client.loop_start()
 
+        self.GetPublishQueue()
+        thread = Thread(target=self.PublishThread)
+        thread.daemon = True
+        thread.start()
+
     # EVENTS
 
     def Event_OnClientConnect(self, client, userdata, flags, reason_code, properties)-> None:
         if reason_code==0:  # Connections is OK
             self.Log(self.LOG_INFO, "Connection established")
+            if self.transport.IsTLS():
+                if self.transport.SaveSession(self.client.socket()):
+                    self.Log(self.LOG_DEBUG, "TLS session resumed")
             self.connected = True
+            self.connectionsCount += 1
+            self.reconnectAttempts = 0
+            # Aliases accepted by the broker on this connection:
+            with self.publishLock:
+                self.topicAliases.Reset(
+                    getattr(properties, "TopicAliasMaximum", 0) if self.IsMQTT5() and properties else 0)
+            self.connectedEvent.set()
+            self.RestoreSubscriptions(flags.session_present)
             self.SubscribeToAllTopics()
+            self.StartDrainingOfflineQueue()
         else:
+            # paho closes the connection and calls on_disconnect, that schedules the next attempt:
             self.Log(self.LOG_ERROR, "Connection error: code " + str(reason_code))
 
+    def Event_OnConnectFail(self, client, userdata) -> None:
+        self.Log(self.LOG_WARNING, "Can't reach the broker")
+        self.ScheduleReconnect()
+
     def Event_OnClientDisconnect(self, client, userdata, flags, reason_code, properties)-> None:
         self.Log(self.LOG_ERROR, "Connection lost")
         self.connected = False
-
-        for topicCallback in self.topicCallbacks:
-            topicCallback.SetAsNotSubscribed()
+        self.connectedEvent.clear()
+        self.ScheduleReconnect()
+        with self.publishLock:
+            self.topicAliases.Reset()
+
+        # paho discards the QoS 0 messages not written yet, the others are sent again after the reconnection:
+        with self.publishCondition:
+            self.unsentPublishes = {mid: message for mid, message in self.unsentPublishes.items()
+                                    if message.qos}
+            self.publishCondition.notify_all()
+
+        with self.subscriptionsLock:
+            self.pendingSubscriptions = {}
+            for topicCallback in self.topicCallbacks:
+                # With a persistent session the broker keeps the subscriptions, checked at the reconnection:
+                if not self.session.IsPersistent() or not topicCallback.GetSubscriptionState():
+                    topicCallback.SetAsNotSubscribed()
+
+    def RestoreSubscriptions(self, sessionPresent: bool) -> None:
+        """ After the connection: if the broker resumed the session the subscriptions are still
+            active and are not sent again, otherwise all the topics have to be subscribed """
+        if self.session.IsPersistent() and sessionPresent:
+            self.Log(self.LOG_DEBUG, "Session resumed, subscriptions kept")
+            return
+        with self.subscriptionsLock:
+            for topicCallback in self.topicCallbacks:
+                topicCallback.SetAsNotSubscribed()
+
+    def GetReconnectDelay(self, attempt: int) -> float:
+        """ Exponential backoff with full jitter """
+        return random.uniform(0, min(self.reconnectMaxDelay,
+                                     self.reconnectBaseDelay * 2 ** min(attempt, 32)))
+
+    def ScheduleReconnect(self) -> None:
+        """ Set the delay before the next reconnection attempt """
+        delay = self.GetReconnectDelay(self.reconnectAttempts)
+        self.reconnectAttempts += 1
+        # The network thread waits this delay before reconnecting:
+        self.client.reconnect_delay_set(delay, delay)
+        self.Log(self.LOG_DEBUG,
+                 f"Next connection attempt in {delay:.1f} seconds")
+
+    def Event_OnSubscribe(self, client, userdata, mid, reason_code_list, properties) -> None:
+        """ SUBACK received: set the subscription state of each topic from its result """
+        with self.subscriptionsLock:
+            subscriptions = self.pendingSubscriptions.pop(mid, [])
+            for (topic, topicCallbacks), reason_code in zip(subscriptions, reason_code_list):
+                if reason_code.is_failure:
+                    self.Log(self.LOG_ERROR,
+                             f"Subscription to {topic} refused: {reason_code}")
+                for topicCallback in topicCallbacks:
+                    if reason_code.is_failure:
+                        topicCallback.SetAsNotSubscribed()
+                    else:
+                        topicCallback.SetAsSubscribed()
+        self.Log(self.LOG_DEBUG,
+                 f"Subscribed to {len(subscriptions)} topics")
 
     def Event_OnMessageReceive(self, client, userdata, message) -> None:
-        # TODO QoS also here
         try:
-            topicCallback = self.GetTopicCallback(message.topic)
-            topicCallback.Call_Callback(message)
+            topicCallbacks = self.topicIndex.Match(message.topic)
+            if not topicCallbacks:
+                raise Exception(
+                    "Can't find any matching TopicCallback for " + message.topic)
+            for topicCallback in topicCallbacks:
+                coalescer = topicCallback.GetCoalescer()
+                if coalescer:
+                    # It submits the call only for the last of the messages close together:
+                    coalescer.Put(message, lambda function, key=topicCallback.GetSerialKey():
+                                  self.SubmitCallback(key, function))
+                else:
+                    self.SubmitCallback(
+                        topicCallback.GetSerialKey(), topicCallback.Call_Callback, message)
         except Exception as e:
             self.Log(self.LOG_WARNING, "Error in message receive: " + str(e))
 
+    def SubmitCallback(self, serialKey, function, *args) -> bool:
+        """ Run the function with the callbacks executor if set, otherwise now.
+            Return False if the executor queue is full and the function was discarded """
+        if self.callbacksExecutor:
+            return self.callbacksExecutor.Submit(serialKey, function, *args)
+        function(*args)
+        return True
+
     # OUTCOMING MESSAGES PART
 
-    def SendTopicData(self, topic, data) -> None:
-        self.client.publish(topic, data)
+    def SendTopicData(self, topic, data, retain=False, qos=0, expiry=0, onPublished=None) -> None:
+        """ Queue the message, it's published by the publish thread.
+            expiry: seconds after which the message is stale and is not delivered anymore, 0 for never.
+            The broker drops expired messages only with MQTT 5, the client always does.
+            onPublished: called by the publish thread when paho accepted the message; not called if the
+            message is dropped by the full queue, expires or is stored in the offline queue """
+        if self.offlineQueue:
+            with self.offlineQueue.lock:
+                # Also while draining, to keep the order of the messages:
+                if not self.connected or self.draining:
+                    self.offlineQueue.Put(topic, data, retain, qos, expiry)
+                    return
+        publishQueue = self.GetPublishQueue()
+        publishQueue.Put(topic, data, retain, qos, expiry, onPublished)
+        if publishQueue.IsFull():
+            # Publish the held messages, before the next ones replace or drop them:
+            with self.batchCondition:
+                self.batchCondition.notify_all()
+
+    def StartBatch(self) -> None:
+        """ Hold the messages sent from now, until FlushBatch: they are then published one after the other.
+            Batches can overlap, e.g. of warehouses sharing the client: messages are held until all
+            of them are flushed. If the publish queue fills up, its messages are published
+            without waiting for the flush, so none is replaced or dropped because of the batch """
+        with self.batchCondition:
+            if not self.batchDepth:
+                self.batchStartTime = time.monotonic()
+            self.batchDepth += 1
+
+    def FlushBatch(self) -> None:
+        """ Close the batch opened by StartBatch, publish its messages if it was the last open one """
+        with self.batchCondition:
+            self.batchDepth = max(0, self.batchDepth - 1)
+            if not self.batchDepth:
+                self.batchCondition.notify_all()
+
+    def WaitForBatchEnd(self) -> None:
+        """ Wait until no batch is open, at most MAX_BATCH_HOLD seconds from its start.
+            Returns earlier if the publish queue is full """
+        with self.batchCondition:
+            while self.batchDepth and not self.publishQueue.IsFull():
+                remaining = self.batchStartTime + MAX_BATCH_HOLD - time.monotonic()
+                if remaining <= 0:
+                    return
+                self.batchCondition.wait(remaining)
+
+    def PublishThread(self) -> None:
+        """ Publish the queued messages, within the rate limits and while connected.
+            Waits if paho has too many messages not written to the socket yet """
+        while True:
+            self.publishQueue.WaitForMessage()
+            self.WaitForBatchEnd()
+            message = self.publishQueue.Pop()
+            if not message:
+                continue
+
+            # The tokens are taken for the message really sent:
+            delay = self.publishQueue.GetRateDelay(message)
+            if delay > 0:
+                time.sleep(delay)
+
+            self.connectedEvent.wait()
+            with self.publishCondition:
+                while len(self.unsentPublishes) >= MAX_UNSENT_PUBLISHES:
+                    self.publishCondition.wait()
+
+            self.Publish(message)
+
+    def Publish(self, message: OutgoingMessage) -> int:
+        """ Pass the message to paho, return its result code. Expired messages are discarded """
+        properties = None
+        remainingExpiry = message.GetRemainingExpiry()
+        if remainingExpiry is not None:
+            if remainingExpiry <= 0:
+                self.GetPublishQueue().SetAsExpired(message)
+                return MqttClient.MQTT_ERR_SUCCESS
+            if self.IsMQTT5():
+                properties = Properties(PacketTypes.PUBLISH)
+                properties.MessageExpiryInterval = max(1, int(remainingExpiry))
+
+        with self.publishLock:
+            topic = message.topic
+            alias, newAlias = None, False
+            # paho sends QoS 1 and 2 messages again after a reconnection, when the alias is not valid anymore:
+            if self.IsMQTT5() and message.qos == 0:
+                alias, newAlias = self.topicAliases.GetAlias(message.topic)
+                if alias:
+                    properties = properties or Properties(PacketTypes.PUBLISH)
+                    properties.TopicAlias = alias
+                    if not newAlias:
+                        # The broker already knows the topic of this alias:
+                        topic = ""
+
+            with self.publishCondition:
+                self.publishingCount += 1
+            try:
+                info = self.client.publish(
+                    topic, message.payload, qos=message.qos,
+                    retain=message.retain, properties=properties)
+            except Exception as e:
+                self.Log(self.LOG_ERROR,
+                         f"Error while publishing to {message.topic}: {str(e)}")
+                info = None
+
+            if newAlias and (info is None or info.rc != MqttClient.MQTT_ERR_SUCCESS):
+                self.topicAliases.Forget(message.topic)
+
+        published = info is not None and info.rc == MqttClient.MQTT_ERR_SUCCESS
+        with self.publishCondition:
+            self.publishingCount -= 1
+            if published:
+                if info.mid in self.earlyPublishes:
+                    self.earlyPublishes.remove(info.mid)
+                    self.GetPublishQueue().SetAsPublished(message)
+                else:
+                    self.unsentPublishes[info.mid] = message
+            if not self.publishingCount:
+                # Not from a publish() in progress, e.g. of a message sent before a restart:
+                self.earlyPublishes.clear()
+
+        if info is None:
+            return MqttClient.MQTT_ERR_UNKNOWN
+
+        if info.rc != MqttClient.MQTT_ERR_SUCCESS:
+            self.Log(self.LOG_DEBUG,
+                     f"Can't publish to {message.topic}: {MqttClient.error_string(info.rc)}")
+        elif message.onPublished:
+            message.onPublished()
+        return info.rc
+
+    def Event_OnPublish(self, client, userdata, mid, reason_code, properties) -> None:
+        """ The message was written to the socket """
+        with self.publishCondition:
+            message = self.unsentPublishes.pop(mid, None)
+            if message is None:
+                if self.publishingCount:
+                    # publish() didn't return yet:
+                    self.earlyPublishes.add(mid)
+                return
+            self.publishCondition.notify_all()
+        self.GetPublishQueue().SetAsPublished(message)
+
+    def StartDrainingOfflineQueue(self) -> None:
+        """ Start sending the queued messages, if there are any """
+        if not self.offlineQueue:
+            return
+        with self.offlineQueue.lock:
+            if self.draining or self.offlineQueue.IsEmpty():
+                return
+            self.draining = True
+            self.Log(self.LOG_INFO,
+                     f"Sending {self.offlineQueue.GetSize()} messages stored while disconnected")
+
+        thread = Thread(target=self.DrainOfflineQueueThread)
+        thread.daemon = True
+        thread.start()
+
+    def DrainOfflineQueueThread(self) -> None:
+        """ Send the queued messages at the drain rate, stop when empty or disconnected.
+            They also take the tokens of the publish queue, so its rate limits are kept """
+        while True:
+            with self.offlineQueue.lock:
+                message = self.offlineQueue.Peek()
+                if not self.connected or message is None:
+                    self.draining = False
+                    return
+
+            outgoingMessage = OutgoingMessage(
+                message.topic, message.payload, message.retain, message.qos, message.expiry,
+                queuedTime=time.monotonic() - message.GetAge())
+            delay = self.GetPublishQueue().GetRateDelay(outgoingMessage)
+            if delay > 0:
+                time.sleep(delay)
+
+            result = self.Publish(outgoingMessage)
+            if result != MqttClient.MQTT_ERR_SUCCESS:
+                with self.offlineQueue.lock:
+                    self.draining = False
+                self.Log(self.LOG_WARNING,
+                         f"Stopped sending stored messages: {MqttClient.error_string(result)}")
+                return
+
+            with self.offlineQueue.lock:
+                self.offlineQueue.Remove(message)
+
+            time.sleep(self.offlineQueue.GetDrainInterval())
 
     def LwtSet(self, topic, payload) -> None:
         # Sets Lwt message data
+        self.lwt = (topic, payload)
         self.client.will_set(topic, payload=payload, retain=False)
 
+    def GetLwt(self) -> tuple | None:
+        """ Return (topic, payload) of the last will, None if not set """
+        return self.lwt
+
     # INCOMING MESSAGES PART / SUBSCRIBE
 
-    def AddNewTopicToSubscribeTo(self, topic, callbackFunction) -> TopicCallback:
-        topicCallback = TopicCallback(topic, callbackFunction)
-        self.topicCallbacks.append(topicCallback)
-        if self.connected:
-            topicCallback.SubscribeTopic(self.client)
-        return TopicCallback
+    def AddNewTopicToSubscribeTo(self, topic, callbackFunction, qos=0, serialKey=None,
+                                 coalescing: CoalescingPolicy | None = None) -> TopicCallback:
+        """ Subscribe to the topic, it can be a filter with + and # wildcards.
+            The callback receives the message, whose topic is the complete one.
+            Callbacks with the same serialKey (default: the topic) run one at a time, in order.
+            With coalescing, messages replaced by newer ones don't call the callback """
+        topicCallback = TopicCallback(
+            topic, callbackFunction, self.session.GetSubscriptionQoS(qos), serialKey, coalescing)
+        with self.subscriptionsLock:
+            self.topicCallbacks.append(topicCallback)
+            self.topicIndex.Add(topicCallback)
+        self.SubscribeToAllTopics()
+        return topicCallback
 
     def SubscribeToAllTopics(self) -> None:
-        """ Subscribe all TopicCallback using the MQTT client, if client is connected """
-        if self.connected:
+        """ Subscribe all the TopicCallbacks not subscribed yet, if client is connected.
+            Topics are grouped in SUBSCRIBE packets of SUBSCRIBE_BATCH_SIZE topics """
+        if not self.connected:
+            return
+
+        with self.subscriptionsLock:
+            # Topic -> TopicCallbacks, each topic is subscribed once:
+            toSubscribe = {}
             for topicCallback in self.topicCallbacks:
-                topicCallback.SubscribeTopic(self.client)
+                if topicCallback.NeedsSubscription():
+                    toSubscribe.setdefault(
+                        topicCallback.GetTopic(), []).append(topicCallback)
+
+            topics = list(toSubscribe.items())
+            for i in range(0, len(topics), SUBSCRIBE_BATCH_SIZE):
+                batch = topics[i:i + SUBSCRIBE_BATCH_SIZE]
+                result, mid = self.client.subscribe(
+                    [(topic, max(tc.GetQoS() for tc in topicCallbacks))
+                     for topic, topicCallbacks in batch])
+
+                if result != MqttClient.MQTT_ERR_SUCCESS:
+                    self.Log(self.LOG_ERROR,
+                             f"Error while subscribing: {MqttClient.error_string(result)}")
+                    continue
+
+                self.pendingSubscriptions[mid] = batch
+                for topic, topicCallbacks in batch:
+                    for topicCallback in topicCallbacks:
+                        topicCallback.SetAsPending()
 
     def UnsubscribeFromTopic(self, topic) -> None:
         try:
-            topicCallback = self.GetTopicCallback(topic)
-            topicCallback.UnsubscribeTopic(self.client)
-            self.topicCallbacks.remove(topicCallback)
+            self.RemoveTopicCallback(self.GetTopicCallback(topic))
         except Exception as e:
             self.Log(self.LOG_ERROR, "Error in topic unsubscription: " + str(e))
 
+    def RemoveTopicCallback(self, topicCallback: TopicCallback) -> None:
+        """ Remove the callback, unsubscribe from its topic if no other callback uses it
+            (e.g. another warehouse sharing this client) """
+        with self.subscriptionsLock:
+            self.topicCallbacks.remove(topicCallback)
+            self.topicIndex.Remove(topicCallback)
+            if not self.topicIndex.GetByTopic(topicCallback.GetTopic()):
+                topicCallback.UnsubscribeTopic(self.client)
+
     def GetTopicCallbacks(self) -> list:
         """ Return (safely) a list with topics to which the client should be subscribed when everything is working correctly"""
         return self.topicCallbacks.copy()
 
     def GetTopicCallback(self, topic) -> TopicCallback:
-        for topicCallback in self.topicCallbacks:
-            if topicCallback.CompareTopic(topic):
-                return topicCallback
-        raise Exception("Can't find any matching TopicCallback for " + topic)
+        """ Return the TopicCallback registered with this topic (or filter) """
+        topicCallbacks = self.topicIndex.GetByTopic(topic)
+        if topicCallbacks:
+            return topicCallbacks[0]
+        raise Exception("Can't find any TopicCallback for " + topic)
 
     # LOG
     def LogSource(self) -> str:
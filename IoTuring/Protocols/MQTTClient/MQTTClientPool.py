@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from threading import Lock
+
+from IoTuring.Logger.LogObject import LogObject
+from IoTuring.Logger.Logger import Singleton
+from IoTuring.Protocols.MQTTClient.MQTTClient import MQTTClient, MQTT_VERSION_311
+from IoTuring.Protocols.MQTTClient.MQTTTransport import MQTTTransport
+from IoTuring.Protocols.MQTTClient.MQTTSession import MQTTSession
+
+
+class MQTTClientPool(LogObject, metaclass=Singleton):
+    """ Hands out MQTT clients, so warehouses using the same broker share a connection.
+
+    Clients are shared between warehouses with the same address, port, credentials, MQTT version, transport and session settings.
+    A connection has a single last will, set before connecting: a warehouse that needs a different one gets its own client.
+    So a warehouse with a last will shares a connection only if it gets it before it connects, i.e. if it starts first.
+    """
+
+    def __init__(self) -> None:
+        # Broker key -> list of MQTTClients
+        self.clients = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def MakeBrokerKey(address, port, username, password, protocolVersion=MQTT_VERSION_311,
+                      transport: MQTTTransport | None = None, session: MQTTSession | None = None) -> tuple:
+        return (str(address).lower(), int(port), username or "", password or "", protocolVersion,
+                (transport or MQTTTransport()).GetKey(), (session or MQTTSession()).GetKey())
+
+    @staticmethod
+    def CanShare(client: MQTTClient, lwt: tuple | None) -> bool:
+        """ True if the client can also send the last will lwt """
+        if lwt is None or client.GetLwt() == lwt:
+            return True
+        # The will is sent with the connection, it can be set only before connecting:
+        return client.GetLwt() is None and not client.IsConnectStarted()
+
+    def GetClient(self, address, port=1883, name=None, username="", password="",
+                  lwt: tuple | None = None, shared: bool = True,
+                  protocolVersion: str = MQTT_VERSION_311,
+                  transport: MQTTTransport | None = None,
+                  session: MQTTSession | None = None) -> MQTTClient:
+        """ Return a client connected to the broker, with lwt (topic, payload) as last will if passed.
+            If shared is False, or no client can be shared, a new client is created """
+        key = self.MakeBrokerKey(
+            address, port, username, password, protocolVersion, transport, session)
+
+        with self.lock:
+            if shared:
+                for client in self.clients.get(key, []):
+                    if self.CanShare(client, lwt):
+                        if lwt and client.GetLwt() is None:
+                            client.LwtSet(*lwt)
+                        self.Log(self.LOG_INFO,
+                                 f"Sharing the connection to {address}:{port}")
+                        return client
+
+            client = MQTTClient(address, port, name,
+                                username, password, protocolVersion, transport, session)
+            if lwt:
+                client.LwtSet(*lwt)
+            if shared:
+                self.clients.setdefault(key, []).append(client)
+            return client
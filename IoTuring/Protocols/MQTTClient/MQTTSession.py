@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+
+
+CONFIG_KEY_PERSISTENT_SESSION = "persistent_session"
+CONFIG_KEY_SESSION_EXPIRY = "session_expiry"
+
+DEFAULT_SESSION_EXPIRY = 3600
+
+# Commands are kept by the broker for a disconnected client only with QoS 1 or 2:
+PERSISTENT_SESSION_MIN_QOS = 1
+
+
+class MQTTSession():
+    """ If the broker keeps the session of the client between the connections.
+
+    With a persistent session the broker keeps the subscriptions and stores the QoS 1 and 2
+    messages arriving while the client is disconnected, to deliver them after the reconnection.
+    The client id (the client name) must not change between the connections.
+    """
+
+    def __init__(self, persistent: bool = False, expiry: int = DEFAULT_SESSION_EXPIRY) -> None:
+        """
+        - persistent: True to keep the session between the connections
+        - expiry: seconds the broker keeps the session after a disconnection. Only with MQTT 5,
+                  with MQTT 3.1.1 it's decided by the broker
+        """
+        self.persistent = persistent
+        self.expiry = expiry
+
+    def IsPersistent(self) -> bool:
+        return self.persistent
+
+    def GetExpiry(self) -> int:
+        return self.expiry
+
+    def GetKey(self) -> tuple:
+        """ Clients can be shared only with the same session settings """
+        return (self.persistent, self.expiry if self.persistent else 0)
+
+    def GetSubscriptionQoS(self, qos: int) -> int:
+        """ QoS to subscribe with, so messages sent while disconnected are kept if the session is persistent """
+        if self.persistent:
+            return max(qos, PERSISTENT_SESSION_MIN_QOS)
+        return qos
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject) -> MQTTSession:
+        """ Create the session settings from the configurations of the warehouse """
+        return cls(
+            persistent=configuratorObject.GetTrueOrFalseFromConfigurations(
+                CONFIG_KEY_PERSISTENT_SESSION),
+            expiry=int(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_SESSION_EXPIRY)))
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset) -> None:
+        """ Add the session questions to a warehouse preset """
+        preset.AddEntry("Keep the session on the broker between the connections", CONFIG_KEY_PERSISTENT_SESSION,
+                        default="N", question_type="yesno",
+                        instruction="Commands sent while disconnected are received after the reconnection, subscribed with QoS 1 at least")
+        preset.AddEntry("Seconds the broker keeps the session after a disconnection", CONFIG_KEY_SESSION_EXPIRY,
+                        default=DEFAULT_SESSION_EXPIRY, question_type="integer",
+                        instruction="Only with MQTT 5, otherwise it's decided by the broker",
+                        display_if_key_value={CONFIG_KEY_PERSISTENT_SESSION: "Y"})
@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+
+import ssl
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+
+
+CONFIG_KEY_TRANSPORT = "transport"
+CONFIG_KEY_TLS_CA_CERTS = "tls_ca_certs"
+CONFIG_KEY_TLS_CERTFILE = "tls_certfile"
+CONFIG_KEY_TLS_KEYFILE = "tls_keyfile"
+
+TRANSPORT_TCP = "tcp"
+TRANSPORT_TLS = "tls"
+# The address is the path of the socket:
+TRANSPORT_UNIX = "unix"
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """ SSL context that resumes the TLS session of the previous connection, if set,
+    so reconnections skip the full handshake when the broker accepts it """
+
+    session: ssl.SSLSession | None = None
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        if self.session is not None:
+            kwargs.setdefault("session", self.session)
+        return super().wrap_socket(sock, *args, **kwargs)
+
+
+class MQTTTransport():
+    """ How the client reaches the broker: plain TCP, TLS or a Unix socket for a broker on the same machine """
+
+    def __init__(self, transport: str = TRANSPORT_TCP,
+                 caCerts: str = "", certFile: str = "", keyFile: str = "") -> None:
+        """
+        - transport: TRANSPORT_TCP, TRANSPORT_TLS or TRANSPORT_UNIX
+        - caCerts: TLS certificate authorities file, the system ones if empty
+        - certFile, keyFile: TLS client certificate and its key, if the broker requires them
+        """
+        if transport not in [TRANSPORT_TCP, TRANSPORT_TLS, TRANSPORT_UNIX]:
+            raise Exception(
+                f"Configuration error: Invalid transport: {transport}")
+        self.transport = transport
+        self.caCerts = caCerts or ""
+        self.certFile = certFile or ""
+        self.keyFile = keyFile or ""
+
+        # Created at the first use, it keeps the TLS session between the connections:
+        self.sslContext = None
+
+    def GetTransport(self) -> str:
+        return self.transport
+
+    def IsTLS(self) -> bool:
+        return self.transport == TRANSPORT_TLS
+
+    def IsUnix(self) -> bool:
+        return self.transport == TRANSPORT_UNIX
+
+    def GetPahoTransport(self) -> str:
+        """ Transport argument of the paho client """
+        return "unix" if self.IsUnix() else "tcp"
+
+    def GetKey(self) -> tuple:
+        """ Clients can be shared only with the same transport """
+        return (self.transport, self.caCerts, self.certFile, self.keyFile)
+
+    def GetSSLContext(self) -> ResumingSSLContext:
+        """ SSL context verifying the broker certificate, with the client certificate if set """
+        if not self.sslContext:
+            context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            if self.caCerts:
+                context.load_verify_locations(cafile=self.caCerts)
+            else:
+                context.load_default_certs()
+            if self.certFile:
+                context.load_cert_chain(self.certFile, self.keyFile or None)
+            self.sslContext = context
+        return self.sslContext
+
+    def SaveSession(self, sslSocket) -> bool:
+        """ Keep the TLS session of the connected socket, to resume it at the next connection.
+            Return True if this connection resumed the previous session """
+        if not self.sslContext or not isinstance(sslSocket, ssl.SSLSocket):
+            return False
+        if sslSocket.session is not None:
+            self.sslContext.session = sslSocket.session
+        return sslSocket.session_reused
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject) -> MQTTTransport:
+        """ Create the transport from the configurations of the warehouse """
+        return cls(
+            transport=configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_TRANSPORT),
+            caCerts=configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_TLS_CA_CERTS),
+            certFile=configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_TLS_CERTFILE),
+            keyFile=configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_TLS_KEYFILE))
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset) -> None:
+        """ Add the transport questions to a warehouse preset """
+        preset.AddEntry("Connection to the broker", CONFIG_KEY_TRANSPORT,
+                        default=TRANSPORT_TCP, question_type="select",
+                        choices=[{"name": "TCP", "value": TRANSPORT_TCP},
+                                 {"name": "TLS, with session resumption on reconnection", "value": TRANSPORT_TLS},
+                                 {"name": "Unix socket, for a broker on this machine", "value": TRANSPORT_UNIX}],
+                        instruction="With a Unix socket, the address is the path of the socket and the port is not used")
+        preset.AddEntry("Certificate authorities file", CONFIG_KEY_TLS_CA_CERTS,
+                        question_type="filepath",
+                        instruction="Leave empty to use the ones of the system",
+                        display_if_key_value={CONFIG_KEY_TRANSPORT: TRANSPORT_TLS})
+        preset.AddEntry("Client certificate file", CONFIG_KEY_TLS_CERTFILE,
+                        question_type="filepath",
+                        instruction="Only if the broker requires it",
+                        display_if_key_value={CONFIG_KEY_TRANSPORT: TRANSPORT_TLS})
+        preset.AddEntry("Client key file", CONFIG_KEY_TLS_KEYFILE,
+                        question_type="filepath",
+                        instruction="Leave empty if the key is in the certificate file",
+                        display_if_key_value={CONFIG_KEY_TRANSPORT: TRANSPORT_TLS})
@@ -0,0 +1,246 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+
+import collections
+import time
+from threading import Condition
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+from IoTuring.Logger.LogObject import LogObject
+
+
+CONFIG_KEY_PUBLISH_QUEUE_SIZE = "publish_queue_size"
+CONFIG_KEY_PUBLISH_RATE = "publish_rate"
+CONFIG_KEY_PUBLISH_BYTE_RATE = "publish_byte_rate"
+
+DEFAULT_QUEUE_SIZE = 1000
+# 0 for no limit:
+DEFAULT_PUBLISH_RATE = 0
+DEFAULT_PUBLISH_BYTE_RATE = 0
+
+# Weight of the last publish in the average latency:
+LATENCY_AVERAGE_WEIGHT = 0.1
+
+
+class OutgoingMessage():
+    """ A message waiting to be published, with the time it was queued """
+
+    def __init__(self, topic: str, payload, retain: bool = False,
+                 qos: int = 0, expiry: float = 0, queuedTime: float | None = None,
+                 onPublished: Callable[[], None] | None = None) -> None:
+        """
+        - expiry: seconds after which the message is stale and must not be sent, 0 for never
+        - queuedTime: monotonic time the message was created, default now
+        - onPublished: called when paho accepted the message, not if it's dropped or expired
+        """
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+        self.qos = qos
+        self.expiry = expiry
+        self.time = queuedTime if queuedTime is not None else time.monotonic()
+        self.onPublished = onPublished
+
+    def GetRemainingExpiry(self) -> float | None:
+        """ Seconds before the message expires, None if it never expires """
+        if not self.expiry:
+            return None
+        return self.expiry - (time.monotonic() - self.time)
+
+    def GetSize(self) -> int:
+        """ Bytes of the payload """
+        if self.payload is None:
+            return 0
+        if isinstance(self.payload, (bytes, bytearray)):
+            return len(self.payload)
+        return len(str(self.payload).encode("utf-8"))
+
+
+class TokenBucket():
+    """ Limits a rate: tokens are added at rate per second, up to capacity.
+    Taking more tokens than available is allowed, the debt is paid by waiting """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """ rate: tokens per second, 0 for no limit. capacity: default one second of tokens """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.lastTime = time.monotonic()
+
+    def Take(self, amount: float) -> float:
+        """ Take the tokens, return the seconds to wait before using them """
+        if self.rate <= 0:
+            return 0
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.lastTime) * self.rate)
+        self.lastTime = now
+
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+class PublishQueue(LogObject):
+    """ Bounded queue of the messages to publish, sent by the client at a limited rate.
+
+    Messages are sent in order. When the queue is full, a message for a topic already
+    in the queue replaces the queued payload (only the latest value is sent); a message
+    for a new topic drops the oldest queued message.
+    """
+
+    def __init__(self, maxSize: int = DEFAULT_QUEUE_SIZE,
+                 messageRate: float = DEFAULT_PUBLISH_RATE,
+                 byteRate: float = DEFAULT_PUBLISH_BYTE_RATE) -> None:
+        """
+        - maxSize: maximum number of waiting messages
+        - messageRate: maximum messages per second, 0 for no limit
+        - byteRate: maximum payload bytes per second, 0 for no limit
+        """
+        self.maxSize = max(1, maxSize)
+        self.messageBucket = TokenBucket(messageRate)
+        self.byteBucket = TokenBucket(byteRate)
+
+        self.messages = collections.deque()
+        # Topic -> last queued OutgoingMessage of the topic:
+        self.lastMessages = {}
+        # Notified when a message is queued:
+        self.condition = Condition()
+
+        # Metrics:
+        self.maxQueueDepth = 0
+        self.droppedCount = 0
+        self.coalescedCount = 0
+        self.expiredCount = 0
+        self.publishedCount = 0
+        self.averageLatency = 0.0
+        self.maxLatency = 0.0
+
+    def GetKey(self) -> tuple:
+        """ Settings of the queue, to compare the queues of warehouses sharing a client """
+        return (self.maxSize, self.messageBucket.rate, self.byteBucket.rate)
+
+    def GetSize(self) -> int:
+        return len(self.messages)
+
+    def IsFull(self) -> bool:
+        """ True if the next message replaces or drops a queued one """
+        return len(self.messages) >= self.maxSize
+
+    def Put(self, topic: str, payload, retain: bool = False, qos: int = 0, expiry: float = 0,
+            onPublished: Callable[[], None] | None = None) -> None:
+        """ Queue a message, replacing or dropping a queued one if full.
+            onPublished: called when paho accepted the message """
+        with self.condition:
+            if len(self.messages) >= self.maxSize:
+                if topic in self.lastMessages:
+                    message = self.lastMessages[topic]
+                    message.payload = payload
+                    message.retain = retain
+                    message.qos = qos
+                    message.expiry = expiry
+                    message.time = time.monotonic()
+                    message.onPublished = onPublished
+                    self.coalescedCount += 1
+                    return
+
+                dropped = self.messages.popleft()
+                self.ForgetMessage(dropped)
+                if not self.droppedCount:
+                    self.Log(self.LOG_WARNING,
+                             f"Publish queue full ({self.maxSize} messages), dropping the oldest ones")
+                self.droppedCount += 1
+
+            message = OutgoingMessage(topic, payload, retain, qos, expiry,
+                                      onPublished=onPublished)
+            self.messages.append(message)
+            self.lastMessages[topic] = message
+            self.maxQueueDepth = max(self.maxQueueDepth, len(self.messages))
+            self.condition.notify()
+
+    def ForgetMessage(self, message: OutgoingMessage) -> None:
+        """ Remove the message from the last messages of its topic, if it's there """
+        if self.lastMessages.get(message.topic) is message:
+            del self.lastMessages[message.topic]
+
+    def WaitForMessage(self) -> OutgoingMessage:
+        """ Wait until a message is queued, return it without removing it """
+        with self.condition:
+            while not self.messages:
+                self.condition.wait()
+            return self.messages[0]
+
+    def GetRateDelay(self, message: OutgoingMessage) -> float:
+        """ Take the tokens to send the message, return the seconds to wait before sending it """
+        return max(self.messageBucket.Take(1),
+                   self.byteBucket.Take(message.GetSize()))
+
+    def Pop(self) -> OutgoingMessage | None:
+        """ Remove and return the first message, None if empty """
+        with self.condition:
+            if not self.messages:
+                return None
+            message = self.messages.popleft()
+            self.ForgetMessage(message)
+            return message
+
+    # METRICS
+
+    def SetAsPublished(self, message: OutgoingMessage) -> None:
+        """ The message was written to the socket: update the latency """
+        latency = time.monotonic() - message.time
+        with self.condition:
+            self.publishedCount += 1
+            self.maxLatency = max(self.maxLatency, latency)
+            if self.publishedCount == 1:
+                self.averageLatency = latency
+            else:
+                self.averageLatency += LATENCY_AVERAGE_WEIGHT * \
+                    (latency - self.averageLatency)
+
+    def SetAsExpired(self, message: OutgoingMessage) -> None:
+        """ The message was not sent because it expired """
+        with self.condition:
+            self.expiredCount += 1
+
+    def GetMetrics(self) -> dict:
+        """ Queue depth, drops and publish latency in seconds, from queued to written """
+        with self.condition:
+            return {
+                "queue_depth": len(self.messages),
+                "max_queue_depth": self.maxQueueDepth,
+                "dropped": self.droppedCount,
+                "coalesced": self.coalescedCount,
+                "expired": self.expiredCount,
+                "published": self.publishedCount,
+                "average_latency": self.averageLatency,
+                "max_latency": self.maxLatency
+            }
+
+    # CONFIGURATION
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject) -> PublishQueue:
+        """ Create the queue from the configurations of the warehouse """
+        return cls(
+            maxSize=int(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_PUBLISH_QUEUE_SIZE)),
+            messageRate=float(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_PUBLISH_RATE)),
+            byteRate=float(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_PUBLISH_BYTE_RATE)))
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset) -> None:
+        """ Add the publish queue questions to a warehouse preset """
+        preset.AddEntry("Maximum number of messages waiting to be published", CONFIG_KEY_PUBLISH_QUEUE_SIZE,
+                        default=DEFAULT_QUEUE_SIZE, question_type="integer",
+                        instruction="When full, only the last value of each sensor is kept")
+        preset.AddEntry("Maximum messages published each second", CONFIG_KEY_PUBLISH_RATE,
+                        default=DEFAULT_PUBLISH_RATE, question_type="integer",
+                        instruction="0 for no limit")
+        preset.AddEntry("Maximum bytes published each second", CONFIG_KEY_PUBLISH_BYTE_RATE,
+                        default=DEFAULT_PUBLISH_BYTE_RATE, question_type="integer",
+                        instruction="0 for no limit")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from threading import Lock
+
+# A topic gets an alias only after this number of publishes:
+MIN_PUBLISHES_FOR_ALIAS = 2
+# A topic takes the alias of a less published one only if published this many times more:
+ALIAS_STEAL_FACTOR = 2
+
+
+class TopicAliases():
+    """ Assigns the MQTT 5 topic aliases of a connection to the most published topics.
+
+    The broker tells in the CONNACK how many aliases it accepts. The first publish with an
+    alias sends the complete topic to set it, the next ones send only the alias number.
+    Aliases are valid only for the connection, so they are reset after every connection;
+    the publish counts are kept, so the same hot topics get an alias again.
+    """
+
+    def __init__(self) -> None:
+        # Aliases accepted by the broker on this connection, 0 if not supported:
+        self.maximum = 0
+        # Topic -> alias, and alias -> topic
+        self.aliases = {}
+        self.topics = {}
+        # Topic -> number of publishes
+        self.counts = {}
+        # Bytes of topics not sent thanks to the aliases:
+        self.savedBytes = 0
+        self.lock = Lock()
+
+    def Reset(self, maximum: int = 0) -> None:
+        """ Forget the aliases, for a new connection accepting maximum aliases """
+        with self.lock:
+            self.maximum = maximum
+            self.aliases = {}
+            self.topics = {}
+
+    def GetMaximum(self) -> int:
+        return self.maximum
+
+    def GetSavedBytes(self) -> int:
+        """ Bytes of topics not sent thanks to the aliases """
+        return self.savedBytes
+
+    def GetAlias(self, topic: str) -> tuple:
+        """ Count a publish to the topic and return (alias, True if the alias is new and the topic must be sent).
+            alias is None if the topic has no alias """
+        with self.lock:
+            count = self.counts.get(topic, 0) + 1
+            self.counts[topic] = count
+
+            if topic in self.aliases:
+                self.savedBytes += len(topic.encode("utf-8"))
+                return self.aliases[topic], False
+
+            if not self.maximum or count < MIN_PUBLISHES_FOR_ALIAS:
+                return None, False
+
+            if len(self.aliases) < self.maximum:
+                # The first free alias:
+                alias = next(alias for alias in range(1, self.maximum + 1)
+                             if alias not in self.topics)
+            else:
+                # Take the alias of the least published topic, if this one is much hotter:
+                coldest = min(self.aliases, key=lambda t: self.counts[t])
+                if count <= self.counts[coldest] * ALIAS_STEAL_FACTOR:
+                    return None, False
+                alias = self.aliases.pop(coldest)
+
+            self.aliases[topic] = alias
+            self.topics[alias] = topic
+            return alias, True
+
+    def Forget(self, topic: str) -> None:
+        """ The publish setting the alias of the topic failed: the alias is not set on the broker """
+        with self.lock:
+            alias = self.aliases.pop(topic, None)
+            if alias is not None:
+                del self.topics[alias]
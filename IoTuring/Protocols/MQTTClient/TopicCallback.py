@@ -1,11 +1,14 @@
+from __future__ import annotations
+
 from IoTuring.Logger.LogObject import LogObject
+from IoTuring.Scheduler.Coalescer import Coalescer, CoalescingPolicy
 
 import paho.mqtt.client as mqtt
 
 
 class TopicCallback(LogObject):
 
-    def __init__(self, topic, callback) -> None:
+    def __init__(self, topic, callback, qos=0, serialKey=None, coalescing: CoalescingPolicy | None = None) -> None:
         super().__init__()
         if topic is None or callback is None:
             self.Log(self.LOG_ERROR, "Topic/Callback can't be null\nTopic: " +
@@ -13,11 +16,23 @@ class TopicCallback(LogObject):
             return
         self.topic = topic
         self.callback = callback
+        self.qos = qos
+        # Callbacks with the same key never run at the same time:
+        self.serialKey = serialKey if serialKey is not None else topic
+        # If set, messages arriving close together are coalesced before calling the callback:
+        self.coalescer = Coalescer(coalescing, self.Call_Callback) \
+            if coalescing and coalescing.IsEnabled() else None
         self.imSubscribed = False
+        # True between the SUBSCRIBE and its SUBACK:
+        self.imPending = False
+
+    def GetTopic(self) -> str:
+        """ Return my topic, it may be a filter with wildcards """
+        return self.topic
 
     def CompareTopic(self, wantedTopic):
-        """ Return true if the passed topic equals to my topic """
-        return self.topic == wantedTopic  # TODO Wildcard check maybe
+        """ Return true if the passed topic matches my topic, also using MQTT wildcards """
+        return mqtt.topic_matches_sub(self.topic, wantedTopic)
 
     def Call_Callback(self, message):
         """ Call callback, need also the topic because may be used a wildcard in self.topic, so I want the complete topic ALWAYS """
@@ -27,23 +42,43 @@ class TopicCallback(LogObject):
             self.Log(self.LOG_ERROR, "Error in callback call\n --> Topic: " + message.topic +
                      "\n --> Payload: " + str(message.payload) + "\nError: " + str(e))
 
+    def GetSerialKey(self):
+        """ Return the key used to run my callbacks in order """
+        return self.serialKey
+
+    def GetCoalescer(self) -> Coalescer | None:
+        """ Return the coalescer of the messages, None if every message calls the callback """
+        return self.coalescer
+
+    def GetQoS(self) -> int:
+        """ Return the QoS to use for the subscription """
+        return self.qos
+
     def SetAsSubscribed(self):
-        """ Set subscribed status to False """
+        """ Set subscribed status to True """
         self.imSubscribed = True
+        self.imPending = False
 
     def SetAsNotSubscribed(self):
         """ Reset subscribed status to False """
         self.imSubscribed = False
+        self.imPending = False
+
+    def SetAsPending(self):
+        """ Subscription sent, waiting for the broker answer """
+        self.imPending = True
 
     def GetSubscriptionState(self):
         """ Return True if I'm subscribed currently """
         return self.imSubscribed
 
-    def SubscribeTopic(self, mqttClient: mqtt.Client):
-        """ Subscribe to the topic using the passed MQTT client (if not already subscribed to) """
-        if not self.GetSubscriptionState():
-            mqttClient.subscribe(self.topic, 0)  # TODO QoS settings
-            self.SetAsSubscribed()
+    def IsPending(self) -> bool:
+        """ Return True if the subscription was sent but not acknowledged yet """
+        return self.imPending
+
+    def NeedsSubscription(self) -> bool:
+        """ Return True if not subscribed and not waiting for a subscription """
+        return not self.imSubscribed and not self.imPending
 
     def UnsubscribeTopic(self, mqttClient: mqtt.Client):
         """ Unubscribe from the topic using the passed MQTT client """
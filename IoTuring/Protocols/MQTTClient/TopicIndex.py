@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Protocols.MQTTClient.TopicCallback import TopicCallback
+
+TOPIC_LEVEL_SEPARATOR = "/"
+WILDCARD_SINGLE_LEVEL = "+"
+WILDCARD_MULTI_LEVEL = "#"
+# Topics starting with this aren't matched by wildcards in the first level:
+SYSTEM_TOPIC_PREFIX = "$"
+
+
+class TopicTrieNode():
+    """ A level of the wildcard subscriptions tree """
+
+    def __init__(self) -> None:
+        # Topic level -> TopicTrieNode
+        self.children = {}
+        # TopicCallbacks whose topic ends at this level:
+        self.topicCallbacks = []
+
+    def IsEmpty(self) -> bool:
+        return not self.children and not self.topicCallbacks
+
+
+class TopicIndex():
+    """ Finds the TopicCallbacks matching an incoming topic.
+
+    Topics without wildcards are in a dict, so they are found in constant time.
+    Topics with MQTT wildcards are in a tree with a level of the topic in each node:
+    finding them depends on the number of levels of the topic, not on the number of callbacks.
+    """
+
+    def __init__(self) -> None:
+        self.exactTopics = {}
+        self.wildcardsRoot = TopicTrieNode()
+
+    @staticmethod
+    def IsWildcardTopic(topic: str) -> bool:
+        """ True if the topic is a filter with MQTT wildcards """
+        return WILDCARD_SINGLE_LEVEL in topic or WILDCARD_MULTI_LEVEL in topic
+
+    def Add(self, topicCallback: TopicCallback) -> None:
+        topic = topicCallback.GetTopic()
+        if self.IsWildcardTopic(topic):
+            node = self.wildcardsRoot
+            for level in topic.split(TOPIC_LEVEL_SEPARATOR):
+                node = node.children.setdefault(level, TopicTrieNode())
+            node.topicCallbacks.append(topicCallback)
+        else:
+            self.exactTopics.setdefault(topic, []).append(topicCallback)
+
+    def Remove(self, topicCallback: TopicCallback) -> None:
+        topic = topicCallback.GetTopic()
+        if self.IsWildcardTopic(topic):
+            # Keep the path to remove the nodes left empty:
+            path = [self.wildcardsRoot]
+            for level in topic.split(TOPIC_LEVEL_SEPARATOR):
+                path.append(path[-1].children[level])
+            path[-1].topicCallbacks.remove(topicCallback)
+
+            levels = topic.split(TOPIC_LEVEL_SEPARATOR)
+            for level, parent, node in zip(reversed(levels), reversed(path[:-1]), reversed(path[1:])):
+                if not node.IsEmpty():
+                    break
+                del parent.children[level]
+        else:
+            self.exactTopics[topic].remove(topicCallback)
+            if not self.exactTopics[topic]:
+                del self.exactTopics[topic]
+
+    def GetByTopic(self, topic: str) -> list[TopicCallback]:
+        """ Return the TopicCallbacks registered exactly with this topic (or filter) """
+        if self.IsWildcardTopic(topic):
+            node = self.wildcardsRoot
+            for level in topic.split(TOPIC_LEVEL_SEPARATOR):
+                if level not in node.children:
+                    return []
+                node = node.children[level]
+            return node.topicCallbacks.copy()
+        return self.exactTopics.get(topic, []).copy()
+
+    def Match(self, topic: str) -> list[TopicCallback]:
+        """ Return the TopicCallbacks whose topic matches the passed one, exact matches first """
+        matches = self.exactTopics.get(topic, []).copy()
+        if self.wildcardsRoot.children:
+            self.MatchNode(self.wildcardsRoot,
+                           topic.split(TOPIC_LEVEL_SEPARATOR), 0, matches)
+        return matches
+
+    def MatchNode(self, node: TopicTrieNode, levels: list[str], index: int, matches: list) -> None:
+        """ Add to matches the callbacks under this node that match the levels from index """
+        wildcardsAllowed = not (
+            index == 0 and levels[0].startswith(SYSTEM_TOPIC_PREFIX))
+
+        # "#" matches this level, the following ones and also the parent level:
+        if wildcardsAllowed and WILDCARD_MULTI_LEVEL in node.children:
+            matches.extend(
+                node.children[WILDCARD_MULTI_LEVEL].topicCallbacks)
+
+        if index == len(levels):
+            matches.extend(node.topicCallbacks)
+            return
+
+        level = levels[index]
+        if level in node.children:
+            self.MatchNode(node.children[level], levels, index + 1, matches)
+
+        if wildcardsAllowed and WILDCARD_SINGLE_LEVEL in node.children:
+            self.MatchNode(
+                node.children[WILDCARD_SINGLE_LEVEL], levels, index + 1, matches)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+
+import time
+from threading import Lock, Timer
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+from IoTuring.Logger.LogObject import LogObject
+
+
+CONFIG_KEY_COALESCING = "command_coalescing"
+CONFIG_KEY_COALESCING_WINDOW = "command_coalescing_window_ms"
+
+# Every message runs the callback:
+COALESCE_NONE = "none"
+# A message waiting to run is replaced by a newer one:
+COALESCE_LATEST = "latest"
+# The callback runs with the last message, when no message arrived for the window:
+COALESCE_DEBOUNCE = "debounce"
+# The callback runs at most once per window: the first message at once, the last one at the end of the window:
+COALESCE_THROTTLE = "throttle"
+
+COALESCING_CHOICES = [{"name": "Run every command", "value": COALESCE_NONE},
+                      {"name": "Latest wins: skip the commands replaced by newer ones",
+                          "value": COALESCE_LATEST},
+                      {"name": "Debounce: run the last command when no other arrives for the window",
+                          "value": COALESCE_DEBOUNCE},
+                      {"name": "Throttle: run at most one command per window, always the last one",
+                          "value": COALESCE_THROTTLE}]
+
+
+class CoalescingPolicy():
+    """ How the messages of a command arriving close together are coalesced """
+
+    def __init__(self, mode: str = COALESCE_NONE, window: float = 0) -> None:
+        """
+        - mode: COALESCE_NONE, COALESCE_LATEST, COALESCE_DEBOUNCE or COALESCE_THROTTLE
+        - window: seconds of the debounce or throttle window
+        """
+        if mode not in [COALESCE_NONE, COALESCE_LATEST, COALESCE_DEBOUNCE, COALESCE_THROTTLE]:
+            raise Exception(
+                f"Configuration error: Invalid command coalescing: {mode}")
+        self.mode = mode
+        self.window = max(0.0, float(window))
+
+    def GetMode(self) -> str:
+        return self.mode
+
+    def GetWindow(self) -> float:
+        return self.window
+
+    def IsEnabled(self) -> bool:
+        return self.mode != COALESCE_NONE
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject) -> CoalescingPolicy:
+        """ Create the policy from the configurations of the entity """
+        return cls(
+            mode=configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_COALESCING),
+            window=int(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_COALESCING_WINDOW)) / 1000)
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset, default: CoalescingPolicy | None = None) -> None:
+        """ Add the coalescing questions to an entity preset, with the default of the entity """
+        default = default or CoalescingPolicy()
+        preset.AddEntry("Commands arriving close together", CONFIG_KEY_COALESCING,
+                        default=default.GetMode(), question_type="select", choices=COALESCING_CHOICES,
+                        instruction="E.g. from a slider, that sends many values while moving")
+        preset.AddEntry("Milliseconds of the coalescing window", CONFIG_KEY_COALESCING_WINDOW,
+                        default=int(default.GetWindow() * 1000), question_type="integer",
+                        instruction="Only used by debounce and throttle")
+
+
+class Coalescer(LogObject):
+    """ Coalesces the messages of a callback following a CoalescingPolicy.
+
+    Only the last received message is kept: the messages it replaced are dropped
+    without running the callback. The callback runs through the submit function passed
+    with the messages (e.g. in an executor), a timer waits the end of the window.
+    """
+
+    def __init__(self, policy: CoalescingPolicy, callback: Callable) -> None:
+        self.policy = policy
+        self.callback = callback
+
+        # Last message not run yet, None if there isn't:
+        self.pendingMessage = None
+        # Monotonic time from which the pending message can run:
+        self.readyTime = 0.0
+        # Monotonic time of the start of the last run:
+        self.lastRunTime = None
+
+        # A run was submitted and didn't start yet:
+        self.submitted = False
+        self.timer = None
+        self.submitFunction = None
+        self.lock = Lock()
+
+        self.droppedCount = 0
+
+    def GetDroppedCount(self) -> int:
+        """ Number of messages replaced by a newer one before running """
+        return self.droppedCount
+
+    def Put(self, message, submitFunction: Callable[[Callable], bool | None]) -> None:
+        """ A message arrived: the callback will run with it, unless a newer one replaces it.
+            submitFunction(function) must run function, now or later in another thread,
+            and return False if it discarded it """
+        with self.lock:
+            self.submitFunction = submitFunction
+            if self.pendingMessage is not None:
+                self.droppedCount += 1
+            self.pendingMessage = message
+
+            now = time.monotonic()
+            if self.policy.GetMode() == COALESCE_DEBOUNCE:
+                self.readyTime = now + self.policy.GetWindow()
+            elif self.policy.GetMode() == COALESCE_THROTTLE and self.lastRunTime is not None:
+                self.readyTime = max(
+                    now, self.lastRunTime + self.policy.GetWindow())
+            else:
+                self.readyTime = now
+
+            submit = not self.submitted and not self.timer and self.Schedule()
+        # Outside the lock, the submit function may run the callback now:
+        if submit:
+            self.Submit(submitFunction)
+
+    def Schedule(self) -> bool:
+        """ Called with the lock: return True if the pending message is ready and the run must be
+            submitted, otherwise start the timer to wait for it """
+        delay = self.readyTime - time.monotonic()
+        if delay > 0:
+            self.StartTimer(delay)
+            return False
+        self.submitted = True
+        return True
+
+    def StartTimer(self, delay: float) -> None:
+        """ Check the pending message again after delay seconds. Called with the lock """
+        self.timer = Timer(delay, self.OnTimer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def OnTimer(self) -> None:
+        with self.lock:
+            self.timer = None
+            submit = self.pendingMessage is not None and not self.submitted and self.Schedule()
+        if submit:
+            self.Submit(self.submitFunction)
+
+    def Submit(self, submitFunction: Callable[[Callable], bool | None]) -> None:
+        """ Submit the run, called without the lock. If the run is discarded,
+            the pending message is submitted again with the next message """
+        try:
+            accepted = submitFunction(self.Run) is not False
+        except Exception as e:
+            self.Log(self.LOG_ERROR, f"Error while submitting coalesced callback: {str(e)}")
+            accepted = False
+        if not accepted:
+            with self.lock:
+                self.submitted = False
+
+    def Run(self) -> None:
+        """ Run the callback with the last message, if it's still ready """
+        with self.lock:
+            self.submitted = False
+            message = self.pendingMessage
+            if message is None:
+                return
+            delay = self.readyTime - time.monotonic()
+            if delay > 0:
+                # A newer message moved the end of the window, wait for it:
+                if not self.timer:
+                    self.StartTimer(delay)
+                return
+            self.pendingMessage = None
+            self.lastRunTime = time.monotonic()
+
+        try:
+            self.callback(message)
+        except Exception as e:
+            self.Log(self.LOG_ERROR, f"Error in coalesced callback: {str(e)}")
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import Callable, Hashable
+
+import collections
+import queue
+from threading import Thread, Lock
+
+from IoTuring.Logger.LogObject import LogObject
+
+
+class KeyedExecutor(LogObject):
+    """ Runs functions on a bounded pool of worker threads.
+
+    Functions submitted with the same key run one at a time, in the order they were
+    submitted; functions with different keys run in parallel, up to the number of workers.
+    A key with pending functions is put back at the end of the ready keys after each run,
+    so a busy key doesn't starve the others.
+    """
+
+    def __init__(self, name: str = "Executor", maxQueueSize: int = 0) -> None:
+        """
+        - name: used for logging and for the threads names
+        - maxQueueSize: maximum number of waiting functions, 0 for no limit
+        """
+        self.name = name
+        self.maxQueueSize = maxQueueSize
+
+        # key -> deque of (function, args) waiting to run; a key is here while it has work to do
+        self.keyQueues = {}
+        # Keys with waiting functions and no function running:
+        self.readyKeys = queue.Queue()
+        self.lock = Lock()
+
+        # Functions waiting to run, and the highest number seen:
+        self.queueDepth = 0
+        self.maxQueueDepth = 0
+
+        self.workers = []
+
+    def LogSource(self):
+        return self.name
+
+    def SetMaxQueueSize(self, maxQueueSize: int) -> None:
+        self.maxQueueSize = maxQueueSize
+
+    def GetQueueDepth(self) -> int:
+        """ Number of functions waiting to run """
+        return self.queueDepth
+
+    def GetMaxQueueDepth(self) -> int:
+        """ Highest number of functions waiting to run at the same time """
+        return self.maxQueueDepth
+
+    def Start(self, workers: int) -> None:
+        """ Start the workers, functions submitted before are run now """
+        if self.workers:
+            return
+
+        for i in range(max(1, int(workers))):
+            thread = Thread(target=self.WorkerThread,
+                            name=f"{self.name}-{i}")
+            thread.daemon = True
+            thread.start()
+            self.workers.append(thread)
+
+        self.Log(self.LOG_DEBUG, f"Started with {len(self.workers)} workers")
+
+    def Submit(self, key: Hashable, function: Callable, *args) -> bool:
+        """ Run function(*args) after the other functions of the same key.
+            Return False if the queue is full and the function was discarded """
+        with self.lock:
+            if self.maxQueueSize and self.queueDepth >= self.maxQueueSize:
+                self.Log(self.LOG_WARNING,
+                         f"Queue full ({self.queueDepth} waiting), discarding a call for {key}")
+                return False
+
+            self.queueDepth += 1
+            self.maxQueueDepth = max(self.maxQueueDepth, self.queueDepth)
+
+            if key in self.keyQueues:
+                # Already ready or running, the worker will get to it:
+                self.keyQueues[key].append((function, args))
+            else:
+                self.keyQueues[key] = collections.deque([(function, args)])
+                self.readyKeys.put(key)
+
+        return True
+
+    def WorkerThread(self) -> None:
+        """ Run one function of a ready key, then put the key back if it has more """
+        while True:
+            key = self.readyKeys.get()
+            with self.lock:
+                function, args = self.keyQueues[key].popleft()
+                self.queueDepth -= 1
+
+            try:
+                function(*args)
+            except Exception as e:
+                self.Log(self.LOG_ERROR,
+                         f"Error while running a call for {key}: {str(e)}")
+
+            with self.lock:
+                if self.keyQueues[key]:
+                    self.readyKeys.put(key)
+                else:
+                    del self.keyQueues[key]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import socket
+
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, \
+    CONFIG_KEY_PHASE_OFFSET, PHASE_OFFSET_NONE, PHASE_OFFSET_NAME, PHASE_OFFSET_RANDOM
+
+
+class PhaseOffset():
+    """ Shifts the start of periodic jobs inside their interval.
+
+    Hosts started together with the same intervals would run their jobs (and publish)
+    at the same time. With an offset derived from a name, e.g. the computer name, each
+    host gets its own position in the interval, the same after every restart.
+    """
+
+    def __init__(self, mode: str = PHASE_OFFSET_NONE, seed: str = "") -> None:
+        """
+        - mode: PHASE_OFFSET_NONE, PHASE_OFFSET_NAME or PHASE_OFFSET_RANDOM
+        - seed: the name the offset is derived from, with PHASE_OFFSET_NAME
+        """
+        if mode == PHASE_OFFSET_NAME:
+            digest = hashlib.sha256(seed.encode("utf-8")).digest()
+            self.fraction = int.from_bytes(digest[:8], "big") / 2 ** 64
+        elif mode == PHASE_OFFSET_RANDOM:
+            self.fraction = random.random()
+        elif mode == PHASE_OFFSET_NONE:
+            self.fraction = 0.0
+        else:
+            raise Exception(
+                f"Configuration error: Invalid phase offset: {mode}")
+
+    def GetFraction(self) -> float:
+        """ Position in the interval, between 0 and 1 """
+        return self.fraction
+
+    def GetDelay(self, interval: float) -> float:
+        """ Seconds to wait before the first run of a job with this interval """
+        return self.fraction * interval
+
+    @classmethod
+    def FromSettings(cls) -> PhaseOffset:
+        """ Create the offset with the mode in the app settings, derived from the computer name.
+            Entity updates and warehouse loops use the same one """
+        return cls(AppSettings.GetFromSettingsConfigurations(CONFIG_KEY_PHASE_OFFSET),
+                   socket.gethostname())
@@ -0,0 +1,197 @@
+from __future__ import annotations
+from typing import Callable
+
+import heapq
+import itertools
+import queue
+import time
+from threading import Thread, Condition
+
+from IoTuring.Logger.LogObject import LogObject
+
+
+class Tick():
+    """ Information about a single run of a periodic job """
+
+    def __init__(self, deadline: float, missed: int = 0) -> None:
+        # Monotonic time at which the run should have started:
+        self.deadline = deadline
+        # Monotonic time at which the run really started:
+        self.time = time.monotonic()
+        # Seconds between the deadline and the real start:
+        self.lateness = max(0.0, self.time - self.deadline)
+        # Number of deadlines skipped before this one because the previous run was too long:
+        self.missed = missed
+
+
+class Ticker():
+    """ Keeps the deadlines of a periodic job on a fixed grid of the monotonic clock.
+
+    The next deadline is the previous deadline plus the interval, so the time spent
+    running the job doesn't add up to the period. If a run lasts more than an interval,
+    the deadlines already passed are coalesced in a single late one and counted as missed.
+    """
+
+    def __init__(self, delay: float = 0) -> None:
+        self.deadline = time.monotonic() + delay
+        self.missed = 0
+
+    def GetDeadline(self) -> float:
+        return self.deadline
+
+    def NextDeadline(self, interval: float) -> float:
+        """ Move to the next deadline and return it """
+        now = time.monotonic()
+        self.deadline += interval
+        self.missed = 0
+
+        if self.deadline < now:
+            if interval > 0:
+                # Move to the last deadline already passed, the others are skipped:
+                self.missed = int((now - self.deadline) // interval)
+                self.deadline += self.missed * interval
+            else:
+                self.deadline = now
+
+        return self.deadline
+
+    def MakeTick(self) -> Tick:
+        """ Tick for a run starting now """
+        return Tick(self.deadline, self.missed)
+
+    def Wait(self, interval: float) -> Tick:
+        """ Sleep until the next deadline, then return its Tick """
+        delay = self.NextDeadline(interval) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return self.MakeTick()
+
+
+class ScheduledJob():
+    """ A periodic job run by the Scheduler """
+
+    def __init__(self,
+                 name: str,
+                 callback: Callable[[Tick], None],
+                 intervalFunction: Callable[[], float],
+                 shouldRunFunction: Callable[[], bool] | None = None) -> None:
+        """
+        - name: used for logging
+        - callback: the function to run periodically, receives the Tick of the run
+        - intervalFunction: returns the seconds to wait between two runs, read again after each run
+        - shouldRunFunction: called when the job is due, if it returns False this run is skipped
+        """
+        self.name = name
+        self.callback = callback
+        self.intervalFunction = intervalFunction
+        self.shouldRunFunction = shouldRunFunction
+
+        # Deadlines of the runs:
+        self.ticker = Ticker()
+
+    def GetName(self) -> str:
+        return self.name
+
+    def GetInterval(self) -> float:
+        return float(self.intervalFunction())
+
+    def ShouldRun(self) -> bool:
+        if self.shouldRunFunction:
+            return self.shouldRunFunction()
+        return True
+
+    def Run(self) -> None:
+        """ Run the callback if the job should run """
+        if self.ShouldRun():
+            self.callback(self.ticker.MakeTick())
+
+
+class Scheduler(LogObject):
+    """ Runs periodic jobs using a single dispatcher thread and a bounded pool of workers.
+
+    Jobs are kept in a heap ordered by their next deadline: the dispatcher sleeps until
+    the first deadline, then hands the job to a worker. A job is put back in the heap only
+    when its run is finished, so the same job never runs twice at the same time.
+    """
+
+    def __init__(self) -> None:
+        # Heap of (deadline, insertion number, job); the number keeps the ordering stable
+        self.jobsHeap = []
+        self.jobsCounter = itertools.count()
+        self.condition = Condition()
+
+        # Jobs ready to run, waiting for a free worker:
+        self.readyJobs = queue.Queue()
+
+        self.workers = []
+        self.started = False
+
+    def AddJob(self, job: ScheduledJob, delay: float = 0) -> None:
+        """ Add a job, its first run will be after delay seconds """
+        job.ticker = Ticker(delay)
+        self.PushJob(job)
+
+    def PushJob(self, job: ScheduledJob) -> None:
+        """ Put the job in the heap with its current deadline and wake up the dispatcher """
+        with self.condition:
+            heapq.heappush(self.jobsHeap,
+                           (job.ticker.GetDeadline(), next(self.jobsCounter), job))
+            self.condition.notify()
+
+    def GetJobsCount(self) -> int:
+        with self.condition:
+            return len(self.jobsHeap)
+
+    def Start(self, workers: int) -> None:
+        """ Start the dispatcher thread and the workers """
+        if self.started:
+            return
+        self.started = True
+
+        workers = max(1, int(workers))
+
+        for i in range(workers):
+            thread = Thread(target=self.WorkerThread)
+            thread.daemon = True
+            thread.start()
+            self.workers.append(thread)
+
+        thread = Thread(target=self.DispatcherThread)
+        thread.daemon = True
+        thread.start()
+
+        self.Log(self.LOG_DEBUG, f"Started with {workers} workers")
+
+    def DispatcherThread(self) -> None:
+        """ Wait for the first deadline in the heap, then pass the job to the workers """
+        while True:
+            with self.condition:
+                while not self.jobsHeap:
+                    self.condition.wait()
+
+                deadline, _, job = self.jobsHeap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    # Woken up earlier if a job with a closer deadline is added
+                    self.condition.wait(delay)
+                    continue
+
+                heapq.heappop(self.jobsHeap)
+
+            self.readyJobs.put(job)
+
+    def WorkerThread(self) -> None:
+        """ Run the jobs that are due, then schedule their next run """
+        while True:
+            job = self.readyJobs.get()
+            try:
+                job.Run()
+            except Exception as e:
+                self.Log(self.LOG_ERROR,
+                         f"Error while running {job.GetName()}: {str(e)}")
+            self.RescheduleJob(job)
+
+    def RescheduleJob(self, job: ScheduledJob) -> None:
+        """ Schedule the next run of the job, on its fixed grid of deadlines """
+        job.ticker.NextDeadline(job.GetInterval())
+        self.PushJob(job)
@@ -4,8 +4,21 @@ from IoTuring.Settings.Settings import Settings
 
 CONFIG_KEY_UPDATE_INTERVAL = "update_interval"
 CONFIG_KEY_RETRY_INTERVAL = "retry_interval"
+CONFIG_KEY_RETRY_MAX_INTERVAL = "retry_max_interval"
+CONFIG_KEY_UPDATE_WORKERS = "update_workers"
+CONFIG_KEY_PUBLISH_ON_CHANGE = "publish_on_change"
+CONFIG_KEY_CHANGE_COALESCE_DELAY = "change_coalesce_delay"
+CONFIG_KEY_PSUTIL_CACHE_TTL = "psutil_cache_ttl"
+CONFIG_KEY_COMMAND_WORKERS = "command_workers"
+CONFIG_KEY_COMMAND_QUEUE_SIZE = "command_queue_size"
+CONFIG_KEY_PHASE_OFFSET = "phase_offset"
+CONFIG_KEY_SHELL_WORKERS = "shell_workers"
 # CONFIG_KEY_SLOW_INTERVAL = "slow_interval"
 
+PHASE_OFFSET_NONE = "none"
+PHASE_OFFSET_NAME = "name"
+PHASE_OFFSET_RANDOM = "random"
+
 
 class AppSettings(Settings):
     """Class that stores AppSettings, not related to a specifuc Entity or Warehouse """
@@ -19,11 +32,59 @@ class AppSettings(Settings):
                         key=CONFIG_KEY_UPDATE_INTERVAL, mandatory=True,
                         question_type="integer", default=10)
 
+        preset.AddEntry(name="Shift of the updates inside the update interval",
+                        instruction="Hosts started together publish at different times instead of all at once",
+                        key=CONFIG_KEY_PHASE_OFFSET, mandatory=True,
+                        question_type="select", default=PHASE_OFFSET_NONE,
+                        choices=[{"name": "Derived from the computer name, the same after every restart", "value": PHASE_OFFSET_NAME},
+                                 {"name": "Random at every start", "value": PHASE_OFFSET_RANDOM},
+                                 {"name": "None, start immediately", "value": PHASE_OFFSET_NONE}])
+
         preset.AddEntry(name="Connection retry interval in seconds",
-                        instruction="If broker is not available retry after this amount of time passed",
+                        instruction="If broker is not available retry after this amount of time passed, doubled on each failed attempt",
                         key=CONFIG_KEY_RETRY_INTERVAL, mandatory=True,
                         question_type="integer", default=1)
 
+        preset.AddEntry(name="Maximum connection retry interval in seconds",
+                        instruction="Retry intervals are random up to the doubled interval, so many clients don't reconnect together",
+                        key=CONFIG_KEY_RETRY_MAX_INTERVAL, mandatory=True,
+                        question_type="integer", default=120)
+
+        preset.AddEntry(name="Maximum number of entity updates running at the same time",
+                        instruction="Entity updates are scheduled centrally and run by this number of threads",
+                        key=CONFIG_KEY_UPDATE_WORKERS, mandatory=True,
+                        question_type="integer", default=4)
+
+        preset.AddEntry(name="Send values to warehouses as soon as they change",
+                        instruction="Otherwise values are sent only every update interval",
+                        key=CONFIG_KEY_PUBLISH_ON_CHANGE,
+                        question_type="yesno", default="N")
+
+        preset.AddEntry(name="Milliseconds to wait after a change to collect other changes",
+                        key=CONFIG_KEY_CHANGE_COALESCE_DELAY, mandatory=True,
+                        question_type="integer", default=100,
+                        display_if_key_value={CONFIG_KEY_PUBLISH_ON_CHANGE: "Y"})
+
+        preset.AddEntry(name="Milliseconds to reuse system statistics read by entities",
+                        instruction="Entities reading the same statistics share them, keep it lower than the update interval",
+                        key=CONFIG_KEY_PSUTIL_CACHE_TTL, mandatory=True,
+                        question_type="integer", default=1000)
+
+        preset.AddEntry(name="Maximum number of commands running at the same time",
+                        instruction="Commands of the same entity always run one at a time, in the order they arrived",
+                        key=CONFIG_KEY_COMMAND_WORKERS, mandatory=True,
+                        question_type="integer", default=2)
+
+        preset.AddEntry(name="Maximum number of commands waiting to run",
+                        instruction="Commands received when the queue is full are discarded, 0 for no limit",
+                        key=CONFIG_KEY_COMMAND_QUEUE_SIZE, mandatory=True,
+                        question_type="integer", default=100)
+
+        preset.AddEntry(name="Number of shells kept running for shell commands",
+                        instruction="Commands of entities like Terminal run in them instead of starting a new shell each time. "
+                        "Commands share the shell state, e.g. the directory after a cd. 0 to start a new shell for every command",
+                        key=CONFIG_KEY_SHELL_WORKERS, mandatory=True,
+                        question_type="integer", default=0)
 
         # preset.AddEntry(name="Secondary update interval in minutes",
         #                 key=CONFIG_KEY_SLOW_INTERVAL, mandatory=True,
@@ -1,22 +1,32 @@
 from __future__ import annotations
 import os
 import json
+import hashlib
+import copy
 import yaml
 import re
-import time
-from typing import Callable
+from typing import Callable, TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Entity.Entity import Entity
 
 from IoTuring.Configurator.MenuPreset import MenuPreset
 from IoTuring.Entity.EntityData import EntityCommand, EntityData, EntitySensor
 from IoTuring.Logger.LogObject import LogObject
-from IoTuring.Protocols.MQTTClient.MQTTClient import MQTTClient
+from IoTuring.Protocols.MQTTClient.MQTTClient import MQTTClient, MQTT_VERSION_311, MQTT_VERSION_CHOICES
+from IoTuring.Protocols.MQTTClient.MQTTClientPool import MQTTClientPool
+from IoTuring.Protocols.MQTTClient.MQTTTransport import MQTTTransport
+from IoTuring.Protocols.MQTTClient.MQTTSession import MQTTSession
 from IoTuring.Warehouse.Warehouse import Warehouse
+from IoTuring.Entity.EntityManager import EntityManager
+from IoTuring.Warehouse.PublishFilter import PublishFilter
+from IoTuring.Warehouse.OfflineQueue import OfflineQueue
+from IoTuring.Protocols.MQTTClient.PublishQueue import PublishQueue
+from IoTuring.Warehouse.PublishPolicy import PublishPolicy, MessagePolicy
+from IoTuring.Warehouse.PublishRecord import PublishRecord
 from IoTuring.MyApp.App import App
 from IoTuring.Logger import consts
 from IoTuring.Entity.ValueFormat import ValueFormatter
 
-from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, CONFIG_KEY_UPDATE_INTERVAL
-
 
 INCLUDE_UNITS_IN_SENSORS = False
 INCLUDE_UNITS_IN_EXTRA_ATTRIBUTES = True
@@ -25,19 +35,29 @@ INCLUDE_UNITS_IN_EXTRA_ATTRIBUTES = True
 # That stands for: App name, Client name, EntityData Id
 TOPIC_DATA_FORMAT = "{}/{}HomeAssistant/{}"
 TOPIC_DATA_EXTRA_ATTRIBUTES_SUFFIX = "_extraattributes"
+# Appended to the entity id, for the topic with the values of all the entity sensors:
+TOPIC_ENTITY_STATE_SUFFIX = "_state"
 # That stands for: Entity data type, App name, EntityData Id
 # to send configuration data
 TOPIC_AUTODISCOVERY_FORMAT = "homeassistant/{}/{}/{}/config"
+# That stands for: App name and client name, to send the configuration of all the entities together
+TOPIC_DEVICE_AUTODISCOVERY_FORMAT = "homeassistant/device/{}_{}/config"
 
 CONFIG_KEY_ADDRESS = "address"
 CONFIG_KEY_PORT = "port"
 CONFIG_KEY_NAME = "name"
+CONFIG_KEY_MQTT_VERSION = "mqtt_version"
 CONFIG_KEY_USERNAME = "username"
 CONFIG_KEY_PASSWORD = "password"
 CONFIG_KEY_ADD_NAME_TO_ENTITY = "add_name"
 CONFIG_KEY_USE_TAG_AS_ENTITY_NAME = "use_tag"
+CONFIG_KEY_DEVICE_DISCOVERY = "device_discovery"
+CONFIG_KEY_ENTITY_STATE_TOPIC = "entity_state_topic"
+CONFIG_KEY_SHARE_CONNECTION = "share_connection"
 
-CONFIGURATION_SEND_LOOP_SKIP_NUMBER = 10
+# Home Assistant publishes its birth message here when it starts, discovery must be sent again:
+HOMEASSISTANT_STATUS_TOPIC = "homeassistant/status"
+HOMEASSISTANT_STATUS_ONLINE = "online"
 
 EXTERNAL_ENTITY_DATA_CONFIGURATION_FILE_FILENAME = "entities.yaml"
 
@@ -85,14 +105,7 @@ class HomeAssistantEntityBase(LogObject):
         self.SetDiscoveryPayloadName()
 
         # Set device info:
-        device_info = {}
-        device_info['name'] = self.wh.clientName
-        device_info['model'] = self.wh.clientName
-        device_info['identifiers'] = self.wh.clientName
-        device_info['manufacturer'] = App.getName() + " by " + App.getVendor()
-        device_info['sw_version'] = App.getVersion()
-
-        self.discovery_payload['device'] = device_info
+        self.discovery_payload['device'] = self.wh.device_info
         self.discovery_payload['unique_id'] = self.unique_id
 
     def SetDefaultDataType(self, data_type: str) -> None:
@@ -128,8 +141,33 @@ class HomeAssistantEntityBase(LogObject):
         # Add to the discovery payload:
         self.discovery_payload[topic_name] = topic_path
 
-    def SendTopicData(self, topic, data) -> None:
-        self.wh.client.SendTopicData(topic, data)
+    def SendTopicData(self, topic, data, policy: MessagePolicy | None = None) -> None:
+        """ Send the data with the QoS, retain and expiry of the policy, default QoS 0 not retained """
+        if policy:
+            self.wh.client.SendTopicData(
+                topic, data, policy.IsRetained(), policy.GetQoS(), policy.GetExpiry())
+        else:
+            self.wh.client.SendTopicData(topic, data)
+
+    def SendValueIfChanged(self, topic, value, payload, policy: MessagePolicy | None = None) -> None:
+        """ Send the payload to the topic, only if the warehouse publish filter lets it pass """
+        if self.wh.publishFilter.ShouldPublish(topic, value, payload, self.id):
+            self.SendTopicData(topic, payload, policy)
+            self.wh.publishFilter.SetAsPublished(topic, value, payload)
+
+    def GetDiscoveryMessage(self) -> bytes:
+        """ Discovery payload serialized to JSON """
+        return json.dumps(self.discovery_payload).encode("utf-8")
+
+    def GetComponentPayload(self) -> dict:
+        """ Discovery payload as a component of the device discovery: without the device, with the platform """
+        component_payload = {key: value for key, value in self.discovery_payload.items()
+                             if key != "device"}
+        component_payload["platform"] = self.data_type
+        return component_payload
+
+    def GetComponentId(self) -> str:
+        return self.unique_id.replace(".", "_")
 
     def SetDiscoveryTopic(self) -> None:
         """ Set the discovery topic attribute"""
@@ -138,25 +176,68 @@ class HomeAssistantEntityBase(LogObject):
 
     def GetEntityDataCustomConfigurations(self, entityDataName) -> dict:
         """ Add custom info to the entity data, reading it from external file and accessing the information using the entity data name """
+        return self.wh.entityDataConfigurations.Get(entityDataName)
+
+
+class EntityDataConfigurations(LogObject):
+    """ Custom configurations of the entity data, from the external file.
+
+    The file is parsed once in an index: a dict for exact names and the compiled regexes in file order.
+    The configuration found for each name is remembered, and everything is read again if the file changes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.mtime = None
+
+        # Name -> configuration
+        self.exactConfigurations = {}
+        # (compiled regex, configuration), in file order
+        self.regexConfigurations = []
+        # Name -> configuration found
+        self.resolvedConfigurations = {}
+
+    def Get(self, entityDataName: str) -> dict:
+        """ Configuration for the entity data name, a copy that can be changed """
+        self.ReloadIfChanged()
+
+        if entityDataName not in self.resolvedConfigurations:
+            self.resolvedConfigurations[entityDataName] = self.Resolve(
+                entityDataName)
+        return copy.deepcopy(self.resolvedConfigurations[entityDataName])
+
+    def Resolve(self, entityDataName: str) -> dict:
+        # Try exact match:
+        if entityDataName in self.exactConfigurations:
+            return self.exactConfigurations[entityDataName]
+
+        # No exact match, try regex:
+        for pattern, entityDataConfiguration in self.regexConfigurations:
+            # entityData may be the correct name, or a regex expression that should return something applied to the real name
+            if pattern.search(entityDataName):
+                return entityDataConfiguration
+        return {}  # if nothing found
 
-        # if resource_file:
-        config_path = os.path.join(os.path.dirname(os.path.abspath(
-            __file__)), EXTERNAL_ENTITY_DATA_CONFIGURATION_FILE_FILENAME)
-        with open(config_path) as yaml_data:
+    def ReloadIfChanged(self) -> None:
+        """ Parse the file if it changed since the last time """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return
 
-            data = yaml.safe_load(yaml_data.read())
+        with open(self.path) as yaml_data:
+            data = yaml.safe_load(yaml_data.read()) or {}
 
-            # Try exact match:
+        self.exactConfigurations = data
+        self.regexConfigurations = []
+        for entityData, entityDataConfiguration in data.items():
             try:
-                return data[entityDataName]
-            except KeyError:
-                # No exact match, try regex:
-                for entityData, entityDataConfiguration in data.items():
-                    # entityData may be the correct name, or a regex expression that should return something applied to the real name
-                    if re.search(entityData, entityDataName):
-                        # merge payload and additional configurations
-                        return entityDataConfiguration
-        return {}  # if nothing found
+                self.regexConfigurations.append(
+                    (re.compile(entityData), entityDataConfiguration))
+            except re.error as e:
+                self.Log(self.LOG_WARNING,
+                         f"Invalid regex {entityData} in {self.path}: {str(e)}")
+        self.resolvedConfigurations = {}
+        self.mtime = mtime
 
 
 class HomeAssistantEntity(HomeAssistantEntityBase):
@@ -231,6 +312,7 @@ class HomeAssistantSensor(HomeAssistantEntity):
 
         self.entitySensor = entityData
         self.supports_extra_attributes = self.entitySensor.DoesSupportExtraAttributes()
+        self.policy = self.wh.publishPolicy.GetSensorPolicy(self.entitySensor)
 
         # Default data type:
         self.SetDefaultDataType("sensor")
@@ -241,30 +323,114 @@ class HomeAssistantSensor(HomeAssistantEntity):
         if self.supports_extra_attributes:
             self.AddTopic("json_attributes_topic")
 
-        # Make sure expire_after is greater than the loop timeout:
-        loop_timeout = int(AppSettings.GetFromSettingsConfigurations(
-            CONFIG_KEY_UPDATE_INTERVAL))
-        sensor_expire_seconds = 600 if loop_timeout < 600 else int(
-            loop_timeout * 1.5)
-        self.discovery_payload['expire_after'] = sensor_expire_seconds
+        self.discovery_payload['expire_after'] = self.wh.GetSensorExpireAfter()
+
+        # Set if the values are sent together with the other sensors of the entity:
+        self.entity_state = None
+
+        # Formatted payloads, reused until the sensor changes:
+        self.state_record = PublishRecord(
+            self.entitySensor, self.state_topic, self.FormatState)
+        if self.supports_extra_attributes:
+            self.json_attributes_record = PublishRecord(
+                self.entitySensor, self.json_attributes_topic, self.FormatExtraAttributes)
+
+    @staticmethod
+    def FormatState(entitySensor: EntitySensor) -> tuple:
+        raw_value = entitySensor.GetValue()
+        return raw_value, ValueFormatter.FormatValue(
+            raw_value,
+            entitySensor.GetValueFormatterOptions(),
+            INCLUDE_UNITS_IN_SENSORS)
+
+    @staticmethod
+    def FormatExtraAttributes(entitySensor: EntitySensor) -> tuple:
+        formattedExtraAttributes = json.dumps(entitySensor.GetFormattedExtraAtributes(
+            INCLUDE_UNITS_IN_EXTRA_ATTRIBUTES))
+        return formattedExtraAttributes, formattedExtraAttributes
+
+    def SendRecord(self, publishRecord: PublishRecord) -> None:
+        """ Send the payload of the record, if the publish filter lets it pass """
+        value, payload = publishRecord.GetValueAndPayload()
+        self.SendValueIfChanged(
+            publishRecord.GetTopic(), value, payload, self.policy)
+
+    def SetEntityState(self, entity_state: HomeAssistantEntityState) -> None:
+        """ Read the value and the extra attributes from the JSON state of the entity """
+        self.entity_state = entity_state
+        key = json.dumps(self.entitySensor.GetKey())
+        self.AddTopic("state_topic", entity_state.state_topic)
+        self.discovery_payload["value_template"] = f"{{{{ value_json[{key}] }}}}"
+
+        if self.supports_extra_attributes:
+            attributes_key = json.dumps(
+                self.entitySensor.GetKey() + TOPIC_DATA_EXTRA_ATTRIBUTES_SUFFIX)
+            self.AddTopic("json_attributes_topic", entity_state.state_topic)
+            self.discovery_payload["json_attributes_template"] = \
+                f"{{{{ value_json[{attributes_key}] | tojson }}}}"
 
     def SendValues(self):
         """ Send values of the sensor to the state topic """
-        if self.entitySensor.HasValue():
-            sensor_value = ValueFormatter.FormatValue(
-                self.entitySensor.GetValue(),
-                self.entitySensor.GetValueFormatterOptions(),
-                INCLUDE_UNITS_IN_SENSORS)
+        if self.entity_state:
+            # Sent by the entity state
+            return
 
-            self.SendTopicData(self.state_topic, sensor_value)
+        if self.entitySensor.HasValue():
+            self.SendRecord(self.state_record)
 
             if self.supports_extra_attributes and \
                     self.entitySensor.HasExtraAttributes():
-                formattedExtraAttributes = self.entitySensor.GetFormattedExtraAtributes(
-                    INCLUDE_UNITS_IN_EXTRA_ATTRIBUTES)
-                self.SendTopicData(
-                    self.json_attributes_topic,
-                    json.dumps(formattedExtraAttributes))
+                self.SendRecord(self.json_attributes_record)
+
+
+class HomeAssistantEntityState(LogObject):
+    """ Values and extra attributes of all the sensors of an entity, sent in a single JSON message """
+
+    def __init__(self, entity: Entity, wh: "HomeAssistantWarehouse") -> None:
+        self.entity = entity
+        self.wh = wh
+        self.state_topic = self.wh.MakeValuesTopic(
+            self.entity.GetEntityId() + TOPIC_ENTITY_STATE_SUFFIX)
+        self.policy = self.wh.publishPolicy.GetEntityPolicy(self.entity)
+        self.hasssensors = []
+
+        # Sensors versions of the cached payload:
+        self.versions = None
+        self.payload = b""
+
+    def AddSensor(self, hasssensor: HomeAssistantSensor) -> None:
+        self.hasssensors.append(hasssensor)
+        hasssensor.SetEntityState(self)
+
+    def SendValues(self):
+        """ Send the values of the sensors, making the JSON again only if a sensor changed """
+        # Read the versions first: if a sensor changes meanwhile, the next call makes the JSON again
+        versions = tuple(hasssensor.entitySensor.GetVersion()
+                         for hasssensor in self.hasssensors)
+
+        if versions != self.versions:
+            document = {}
+            for hasssensor in self.hasssensors:
+                entitySensor = hasssensor.entitySensor
+                if not entitySensor.HasValue():
+                    continue
+                _, payload = hasssensor.state_record.GetValueAndPayload()
+                document[entitySensor.GetKey()] = payload.decode("utf-8")
+                if hasssensor.supports_extra_attributes and entitySensor.HasExtraAttributes():
+                    document[entitySensor.GetKey() + TOPIC_DATA_EXTRA_ATTRIBUTES_SUFFIX] = \
+                        entitySensor.GetFormattedExtraAtributes(
+                            INCLUDE_UNITS_IN_EXTRA_ATTRIBUTES)
+
+            if not document:
+                return
+            self.payload = json.dumps(document).encode("utf-8")
+            self.versions = versions
+
+        if self.wh.publishFilter.ShouldPublish(self.state_topic, self.payload, self.payload):
+            self.wh.client.SendTopicData(self.state_topic, self.payload, self.policy.IsRetained(),
+                                         self.policy.GetQoS(), self.policy.GetExpiry())
+            self.wh.publishFilter.SetAsPublished(
+                self.state_topic, self.payload, self.payload)
 
 
 class HomeAssistantCommand(HomeAssistantEntity):
@@ -309,8 +475,13 @@ class HomeAssistantCommand(HomeAssistantEntity):
                     if self.connected_sensor.entitySensor.HasValue():
                         self.Log(self.LOG_DEBUG, "Switch callback: sending state to " +
                                  self.connected_sensor.state_topic)
+                        state = message.payload.decode('utf-8')
                         self.SendTopicData(
-                            self.connected_sensor.state_topic, message.payload.decode('utf-8'))
+                            self.connected_sensor.state_topic, message.payload,
+                            self.connected_sensor.policy)
+                        # So the next loop sends the real state if it's different:
+                        self.wh.publishFilter.SetAsPublished(
+                            self.connected_sensor.state_topic, state, message.payload)
         return CommandCallback
 
 
@@ -331,7 +502,8 @@ class LwtSensor(HomeAssistantEntityBase):
         self.SetDiscoveryTopic()
 
     def SendValues(self):
-        self.SendTopicData(self.state_topic, LWT_PAYLOAD_ONLINE)
+        self.SendValueIfChanged(
+            self.state_topic, LWT_PAYLOAD_ONLINE, LWT_PAYLOAD_ONLINE)
 
 
 class HomeAssistantWarehouse(Warehouse):
@@ -340,14 +512,27 @@ class HomeAssistantWarehouse(Warehouse):
     def Start(self):
         #  I configure my Warehouse with configurations
         self.clientName = self.GetFromConfigurations(CONFIG_KEY_NAME)
-        self.client = MQTTClient(self.GetFromConfigurations(CONFIG_KEY_ADDRESS),
-                                 self.GetFromConfigurations(CONFIG_KEY_PORT),
-                                 self.GetFromConfigurations(CONFIG_KEY_NAME),
-                                 self.GetFromConfigurations(
-                                     CONFIG_KEY_USERNAME),
-                                 self.GetFromConfigurations(CONFIG_KEY_PASSWORD))
-        self.client.LwtSet(self.MakeValuesTopic(
-            LWT_TOPIC_SUFFIX), LWT_PAYLOAD_OFFLINE)
+        self.client = MQTTClientPool().GetClient(
+            self.GetFromConfigurations(CONFIG_KEY_ADDRESS),
+            self.GetFromConfigurations(CONFIG_KEY_PORT),
+            self.GetFromConfigurations(CONFIG_KEY_NAME),
+            self.GetFromConfigurations(CONFIG_KEY_USERNAME),
+            self.GetFromConfigurations(CONFIG_KEY_PASSWORD),
+            lwt=(self.MakeValuesTopic(LWT_TOPIC_SUFFIX), LWT_PAYLOAD_OFFLINE),
+            shared=self.GetTrueOrFalseFromConfigurations(CONFIG_KEY_SHARE_CONNECTION),
+            protocolVersion=self.GetFromConfigurations(CONFIG_KEY_MQTT_VERSION),
+            transport=MQTTTransport.FromConfigurations(self),
+            session=MQTTSession.FromConfigurations(self))
+        self.client.SetReconnectBackoff(
+            self.retry_interval, self.retry_max_interval)
+        # Commands run in the shared executor, not in the network thread:
+        self.client.SetCallbacksExecutor(EntityManager().GetCommandExecutor())
+
+        offlineQueue = OfflineQueue.FromConfigurations(
+            self, f"{self.GetWarehouseName()}_{self.clientName}")
+        if offlineQueue:
+            self.client.SetOfflineQueue(offlineQueue)
+        self.client.SetPublishQueue(PublishQueue.FromConfigurations(self))
 
         self.client.AsyncConnect()
 
@@ -357,18 +542,49 @@ class HomeAssistantWarehouse(Warehouse):
         self.useTagAsEntityName = self.GetTrueOrFalseFromConfigurations(
             CONFIG_KEY_USE_TAG_AS_ENTITY_NAME)
 
+        # Custom discovery configurations of the entities:
+        self.entityDataConfigurations = EntityDataConfigurations(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), EXTERNAL_ENTITY_DATA_CONFIGURATION_FILE_FILENAME))
+
+        # One discovery message for all the entities:
+        self.deviceDiscovery = self.GetTrueOrFalseFromConfigurations(
+            CONFIG_KEY_DEVICE_DISCOVERY)
+        self.device_info = self.MakeDeviceInfo()
+
+        # Values of all the sensors of an entity in a single message:
+        self.useEntityStateTopic = self.GetTrueOrFalseFromConfigurations(
+            CONFIG_KEY_ENTITY_STATE_TOPIC)
+
+        # Publish only changes, but often enough to never reach the expire_after of the sensors.
+        # A value is sent at the first loop after the heartbeat, so keep a loop of margin:
+        self.publishFilter = PublishFilter.FromConfigurations(self)
+        self.publishFilter.SetHeartbeat(max(0, min(
+            self.publishFilter.heartbeat,
+            self.GetSensorExpireAfter() - 2 * self.GetLoopTimeout())))
+        # To publish everything again after a reconnection:
+        self.publishedConnectionsCount = 0
+
+        # QoS, retain and expiry of each kind of message:
+        self.publishPolicy = PublishPolicy.FromConfigurations(self)
+
         # Entities store:
         self.homeAssistantEntities = {
             "commands": [],
             "sensors": [],
-            "connected_sensors": []
+            "connected_sensors": [],
+            "entity_states": []
         }
 
         self.CollectEntityData()
 
         self.RegisterEntityCommands()
 
-        self.loopCounter = 0
+        # Discovery topic -> hash of the last discovery message sent:
+        self.sentDiscoveryHashes = {}
+        # Set when Home Assistant restarts:
+        self.discoveryRequested = False
+        self.client.AddNewTopicToSubscribeTo(
+            HOMEASSISTANT_STATUS_TOPIC, self.OnHomeAssistantStatus)
 
         super().Start()  # Then run other inits (start the Loop method for example)
 
@@ -380,6 +596,12 @@ class HomeAssistantWarehouse(Warehouse):
 
         # Add real entities:
         for entity in self.GetEntities():
+            entity_state = None
+            if self.useEntityStateTopic and entity.GetEntitySensors():
+                entity_state = HomeAssistantEntityState(entity, self)
+                self.homeAssistantEntities["entity_states"].append(
+                    entity_state)
+
             for entityData in entity.GetAllUnconnectedEntityData():
 
                 # It's a command:
@@ -392,8 +614,10 @@ class HomeAssistantWarehouse(Warehouse):
 
                 # It's a sensor:
                 elif isinstance(entityData, EntitySensor):
-                    self.homeAssistantEntities["sensors"].append(
-                        HomeAssistantSensor(entityData, self))
+                    hasssensor = HomeAssistantSensor(entityData, self)
+                    if entity_state:
+                        entity_state.AddSensor(hasssensor)
+                    self.homeAssistantEntities["sensors"].append(hasssensor)
 
                 else:
                     raise Exception(f"Unkown EntityData! {entityData}")
@@ -402,34 +626,115 @@ class HomeAssistantWarehouse(Warehouse):
         """ Add EntityCommands to the MQTT client (subscribe to them) """
         for hasscommand in self.homeAssistantEntities["commands"]:
             self.client.AddNewTopicToSubscribeTo(
-                hasscommand.command_topic, hasscommand.command_callback)
+                hasscommand.command_topic, hasscommand.command_callback,
+                qos=self.publishPolicy.GetCommandQoS(),
+                serialKey=hasscommand.entityCommand.GetEntity().GetEntityId(),
+                coalescing=hasscommand.entityCommand.GetCoalescingPolicy())
             self.Log(
                 self.LOG_DEBUG, f"{hasscommand.id} subscribed to {hasscommand.command_topic}")
 
     def Loop(self):
-
-        while (not self.client.IsConnected()):
-            time.sleep(self.retry_interval)
-
-        # Mechanism to call the function to send discovery data every CONFIGURATION_SEND_LOOP_SKIP_NUMBER loop
-        if self.loopCounter == 0:
+        if not self.client.IsConnected() and not self.client.HasOfflineQueue():
+            # Nothing to do until the reconnection, send as soon as it happens:
+            if not self.client.WaitForConnection(self.GetTimeUntilNextLoop()):
+                return
+
+        # Messages of this loop are published together at its end:
+        self.client.StartBatch()
+        try:
+            self.SendLoopData()
+        finally:
+            self.client.FlushBatch()
+
+    def SendLoopData(self):
+        """ Send the values of this loop """
+        if self.publishedConnectionsCount != self.client.GetConnectionsCount():
+            self.publishFilter.Reset()
+            self.publishedConnectionsCount = self.client.GetConnectionsCount()
+            # New connection, send the whole discovery again:
+            self.sentDiscoveryHashes = {}
+
+        if self.discoveryRequested:
+            self.discoveryRequested = False
+            # Home Assistant lost the states too:
+            self.publishFilter.Reset()
+            self.sentDiscoveryHashes = {}
+
+        # Discovery is retained, send it only after a (re)connection or if it changed:
+        if self.client.IsConnected():
             self.SendEntityDataConfigurations()
 
-        # Every time I send data, every X also configurations
-        self.loopCounter = (
-            self.loopCounter+1) % CONFIGURATION_SEND_LOOP_SKIP_NUMBER
-
         # Send sensor values:
         for hasssensor in self.homeAssistantEntities["sensors"] + self.homeAssistantEntities["connected_sensors"]:
             hasssensor.SendValues()
 
+        for entity_state in self.homeAssistantEntities["entity_states"]:
+            entity_state.SendValues()
+
+    def MakeDeviceInfo(self) -> dict:
+        """ Device of all the entities of this warehouse """
+        device_info = {}
+        device_info['name'] = self.clientName
+        device_info['model'] = self.clientName
+        device_info['identifiers'] = self.clientName
+        device_info['manufacturer'] = App.getName() + " by " + App.getVendor()
+        device_info['sw_version'] = App.getVersion()
+        return device_info
+
     def SendEntityDataConfigurations(self):
-        """ Send discovery """
-        for hassentity in self.homeAssistantEntities["commands"] + self.homeAssistantEntities["sensors"]:
-            topic = hassentity.discovery_topic
-            payload = hassentity.discovery_payload
+        """ Send the discovery messages not sent yet or changed since the last send """
+        if self.deviceDiscovery:
+            self.SendDeviceConfiguration()
+            return
 
-            self.client.SendTopicData(topic, json.dumps(payload))
+        for hassentity in self.homeAssistantEntities["commands"] + self.homeAssistantEntities["sensors"]:
+            self.SendDiscoveryMessage(
+                hassentity.discovery_topic, hassentity.GetDiscoveryMessage())
+
+    def SendDeviceConfiguration(self):
+        """ Send a single discovery message with the device and all the entities as its components """
+        hassentities = self.homeAssistantEntities["commands"] + \
+            self.homeAssistantEntities["sensors"]
+        topic = self.NormalizeTopic(TOPIC_DEVICE_AUTODISCOVERY_FORMAT.format(
+            App.getName(), self.clientName))
+
+        payload = {
+            "device": self.device_info,
+            "origin": {
+                "name": App.getName(),
+                "sw_version": App.getVersion(),
+                "support_url": App.getUrlHomepage()
+            },
+            "components": {hassentity.GetComponentId(): hassentity.GetComponentPayload()
+                           for hassentity in hassentities}
+        }
+        self.SendDiscoveryMessage(topic, json.dumps(payload).encode("utf-8"))
+
+    def SendDiscoveryMessage(self, topic: str, message: bytes) -> None:
+        """ Send the discovery message if it changed since the last one sent to the topic.
+            It counts as sent once paho accepted it: if the full publish queue drops it, it's sent at the next loop """
+        discovery_hash = hashlib.sha256(message).hexdigest()
+        if self.sentDiscoveryHashes.get(topic) == discovery_hash:
+            return
+        self.client.SendTopicData(topic, message, retain=True,
+                                  qos=self.publishPolicy.GetDiscoveryPolicy().GetQoS(),
+                                  onPublished=lambda: self.SetDiscoveryAsSent(topic, discovery_hash))
+
+    def SetDiscoveryAsSent(self, topic: str, discovery_hash: str) -> None:
+        """ Called by the publish thread when paho accepted the discovery message """
+        self.sentDiscoveryHashes[topic] = discovery_hash
+
+    def OnHomeAssistantStatus(self, message) -> None:
+        """ Home Assistant birth message: send discovery and values again at the next loop """
+        if message.payload.decode("utf-8") == HOMEASSISTANT_STATUS_ONLINE:
+            self.Log(self.LOG_INFO, "Home Assistant started, sending discovery")
+            self.discoveryRequested = True
+            self.valuesChanged.set()
+
+    def GetSensorExpireAfter(self) -> int:
+        """ Seconds after which Home Assistant sets a sensor as unavailable, greater than the loop timeout """
+        loop_timeout = int(self.GetLoopTimeout())
+        return 600 if loop_timeout < 600 else int(loop_timeout * 1.5)
 
     def MakeValuesTopic(self, topic_suffix: str) -> str:
         """ Prepares a topic, including the app name, the client name and finally a passed id """
@@ -448,11 +753,30 @@ class HomeAssistantWarehouse(Warehouse):
         preset.AddEntry("Home assistant MQTT broker address",
                         CONFIG_KEY_ADDRESS, mandatory=True)
         preset.AddEntry("Port", CONFIG_KEY_PORT, default=1883, question_type="integer")
+        MQTTTransport.AddConfigurationEntries(preset)
         preset.AddEntry("Client name", CONFIG_KEY_NAME, mandatory=True)
         preset.AddEntry("Username", CONFIG_KEY_USERNAME)
         preset.AddEntry("Password", CONFIG_KEY_PASSWORD, question_type="secret")
+        preset.AddEntry("MQTT version", CONFIG_KEY_MQTT_VERSION, default=MQTT_VERSION_311,
+                        question_type="select", choices=MQTT_VERSION_CHOICES)
+        MQTTSession.AddConfigurationEntries(preset)
+        preset.AddEntry("Share the connection with other warehouses using the same broker", CONFIG_KEY_SHARE_CONNECTION,
+                        default="N", question_type="yesno",
+                        instruction="The client name and the queue settings of the first warehouse are used. "
+                        "The last will is set when connecting, and warehouses start in the configuration order: "
+                        "the connection is shared only with the warehouses starting after this one, or using the same last will")
         preset.AddEntry("Add computer name to entity name",
                         CONFIG_KEY_ADD_NAME_TO_ENTITY, default="Y", question_type="yesno")
         preset.AddEntry("Use tag as entity name for multi instance entities",
                         CONFIG_KEY_USE_TAG_AS_ENTITY_NAME, default="N", question_type="yesno")
+        preset.AddEntry("Send the discovery of all the entities in a single message",
+                        CONFIG_KEY_DEVICE_DISCOVERY, default="N", question_type="yesno",
+                        instruction="Requires Home Assistant 2024.11 or newer")
+        preset.AddEntry("Send the values of all the sensors of an entity in a single message",
+                        CONFIG_KEY_ENTITY_STATE_TOPIC, default="N", question_type="yesno",
+                        instruction="Values are sent as JSON, Home Assistant reads them with value templates")
+        PublishFilter.AddConfigurationEntries(preset)
+        OfflineQueue.AddConfigurationEntries(preset)
+        PublishQueue.AddConfigurationEntries(preset)
+        PublishPolicy.AddConfigurationEntries(preset, discovery=True)
         return preset
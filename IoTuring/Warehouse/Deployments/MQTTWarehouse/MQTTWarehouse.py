@@ -1,12 +1,22 @@
+from __future__ import annotations
+
 from IoTuring.Configurator.MenuPreset import MenuPreset
-from IoTuring.Protocols.MQTTClient.MQTTClient import MQTTClient
+from IoTuring.Protocols.MQTTClient.MQTTClient import MQTTClient, MQTT_VERSION_311, MQTT_VERSION_CHOICES
+from IoTuring.Protocols.MQTTClient.MQTTClientPool import MQTTClientPool
+from IoTuring.Protocols.MQTTClient.MQTTTransport import MQTTTransport
+from IoTuring.Protocols.MQTTClient.MQTTSession import MQTTSession
 from IoTuring.Warehouse.Warehouse import Warehouse
+from IoTuring.Entity.EntityManager import EntityManager
+from IoTuring.Warehouse.PublishFilter import PublishFilter
+from IoTuring.Warehouse.OfflineQueue import OfflineQueue
+from IoTuring.Protocols.MQTTClient.PublishQueue import PublishQueue
+from IoTuring.Warehouse.PublishPolicy import PublishPolicy
+from IoTuring.Warehouse.PublishRecord import PublishRecord
 from IoTuring.MyApp.App import App
 from IoTuring.Entity.ValueFormat import ValueFormatter
 
 import inspect  # To get this folder path
 import os  # To get this folder path
-import time
 
 
 
@@ -17,9 +27,11 @@ OUTPUT_TOPICS_FILENAME = "commands_topic.txt"
 CONFIG_KEY_ADDRESS = "address"
 CONFIG_KEY_PORT = "port"
 CONFIG_KEY_NAME = "name"
+CONFIG_KEY_MQTT_VERSION = "mqtt_version"
 CONFIG_KEY_USERNAME = "username"
 CONFIG_KEY_PASSWORD = "password"
 CONFIG_KEY_ADD_UNITS = "add_units"
+CONFIG_KEY_SHARE_CONNECTION = "share_connection"
 
 
 class MQTTWarehouse(Warehouse):
@@ -28,13 +40,31 @@ class MQTTWarehouse(Warehouse):
     def Start(self):
         # I configure my Warehouse with configurations
         self.clientName = self.GetFromConfigurations(CONFIG_KEY_NAME)
-        self.client = MQTTClient(self.GetFromConfigurations(CONFIG_KEY_ADDRESS),
-                                 self.GetFromConfigurations(CONFIG_KEY_PORT),
-                                 self.GetFromConfigurations(CONFIG_KEY_NAME),
-                                 self.GetFromConfigurations(
-                                     CONFIG_KEY_USERNAME),
-                                 self.GetFromConfigurations(CONFIG_KEY_PASSWORD))
+        self.client = MQTTClientPool().GetClient(
+            self.GetFromConfigurations(CONFIG_KEY_ADDRESS),
+            self.GetFromConfigurations(CONFIG_KEY_PORT),
+            self.GetFromConfigurations(CONFIG_KEY_NAME),
+            self.GetFromConfigurations(CONFIG_KEY_USERNAME),
+            self.GetFromConfigurations(CONFIG_KEY_PASSWORD),
+            shared=self.GetTrueOrFalseFromConfigurations(CONFIG_KEY_SHARE_CONNECTION),
+            protocolVersion=self.GetFromConfigurations(CONFIG_KEY_MQTT_VERSION),
+            transport=MQTTTransport.FromConfigurations(self),
+            session=MQTTSession.FromConfigurations(self))
+        self.client.SetReconnectBackoff(
+            self.retry_interval, self.retry_max_interval)
+        # Commands run in the shared executor, not in the network thread:
+        self.client.SetCallbacksExecutor(EntityManager().GetCommandExecutor())
         self.addUnitsToValues = self.GetFromConfigurations(CONFIG_KEY_ADD_UNITS) # is a boolean
+        self.publishFilter = PublishFilter.FromConfigurations(self)
+        self.publishPolicy = PublishPolicy.FromConfigurations(self)
+        offlineQueue = OfflineQueue.FromConfigurations(
+            self, f"{self.GetWarehouseName()}_{self.clientName}")
+        if offlineQueue:
+            self.client.SetOfflineQueue(offlineQueue)
+        self.client.SetPublishQueue(PublishQueue.FromConfigurations(self))
+        # To publish everything again after a reconnection:
+        self.publishedConnectionsCount = 0
+        self.publishRecords = self.MakePublishRecords()
         self.client.AsyncConnect()
         self.RegisterEntityCommands()
 
@@ -45,22 +75,56 @@ class MQTTWarehouse(Warehouse):
         for entity in self.GetEntities():
             for entityCommand in entity.GetEntityCommands():
                 self.client.AddNewTopicToSubscribeTo(
-                    self.MakeTopic(entityCommand), entityCommand.CallCallback)
+                    self.MakeTopic(entityCommand), entityCommand.CallCallback,
+                    qos=self.publishPolicy.GetCommandQoS(),
+                    serialKey=entity.GetEntityId(),
+                    coalescing=entityCommand.GetCoalescingPolicy())
                 self.Log(self.LOG_DEBUG, entityCommand.GetId() +
                          " subscribed to " + self.MakeTopic(entityCommand))
         self.ExportCommandsTopics()
 
     def Loop(self):
-        while(not self.client.IsConnected()):
-            time.sleep(self.retry_interval)
-            
+        if not self.client.IsConnected() and not self.client.HasOfflineQueue():
+            # Nothing to do until the reconnection, send as soon as it happens:
+            if not self.client.WaitForConnection(self.GetTimeUntilNextLoop()):
+                return
+
+        # Messages of this loop are published together at its end:
+        self.client.StartBatch()
+        try:
+            self.SendLoopData()
+        finally:
+            self.client.FlushBatch()
+
+    def SendLoopData(self):
+        """ Send the values of this loop """
+        if self.publishedConnectionsCount != self.client.GetConnectionsCount():
+            self.publishFilter.Reset()
+            self.publishedConnectionsCount = self.client.GetConnectionsCount()
+
         # Here in Loop I send sensor's data (command callbacks are not managed here)
-        for entity in self.GetEntities():
-            for entitySensor in entity.GetEntitySensors():
-                if(entitySensor.HasValue()):
-                    value = ValueFormatter.FormatValue(entitySensor.GetValue(), entitySensor.GetValueFormatterOptions(), self.addUnitsToValues)
-                    self.client.SendTopicData(self.MakeTopic(
-                        entitySensor), value)
+        for publishRecord in self.publishRecords:
+            if publishRecord.HasValue():
+                rawValue, payload = publishRecord.GetValueAndPayload()
+                topic = publishRecord.GetTopic()
+                if self.publishFilter.ShouldPublish(topic, rawValue, payload, publishRecord.GetId()):
+                    policy = self.publishPolicy.GetSensorPolicy(
+                        publishRecord.GetEntitySensor())
+                    self.client.SendTopicData(topic, payload, policy.IsRetained(),
+                                              policy.GetQoS(), policy.GetExpiry())
+                    self.publishFilter.SetAsPublished(topic, rawValue, payload)
+
+    def MakePublishRecords(self) -> list[PublishRecord]:
+        """ Topics don't change after the start, so compute them once for each sensor """
+        return [PublishRecord(entitySensor, self.MakeTopic(entitySensor), self.FormatSensorValue)
+                for entity in self.GetEntities()
+                for entitySensor in entity.GetEntitySensors()]
+
+    def FormatSensorValue(self, entitySensor) -> tuple:
+        """ Return the raw value of the sensor and its formatted payload """
+        rawValue = entitySensor.GetValue()
+        return rawValue, ValueFormatter.FormatValue(
+            rawValue, entitySensor.GetValueFormatterOptions(), self.addUnitsToValues)
 
     def MakeTopic(self, entityData):
         return MQTTClient.NormalizeTopic(TOPIC_FORMAT.format(App.getName(), self.clientName, entityData.GetId()))
@@ -81,8 +145,21 @@ class MQTTWarehouse(Warehouse):
         preset = MenuPreset()
         preset.AddEntry("Address", CONFIG_KEY_ADDRESS, mandatory=True)
         preset.AddEntry("Port", CONFIG_KEY_PORT, default=1883, question_type="integer")
+        MQTTTransport.AddConfigurationEntries(preset)
         preset.AddEntry("Client name", CONFIG_KEY_NAME, default=App.getName())
         preset.AddEntry("Username", CONFIG_KEY_USERNAME)
         preset.AddEntry("Password", CONFIG_KEY_PASSWORD, question_type="secret")
+        preset.AddEntry("MQTT version", CONFIG_KEY_MQTT_VERSION, default=MQTT_VERSION_311,
+                        question_type="select", choices=MQTT_VERSION_CHOICES)
+        MQTTSession.AddConfigurationEntries(preset)
         preset.AddEntry("Add units to values", CONFIG_KEY_ADD_UNITS, default="Y", question_type="yesno")
+        preset.AddEntry("Share the connection with other warehouses using the same broker", CONFIG_KEY_SHARE_CONNECTION,
+                        default="N", question_type="yesno",
+                        instruction="The client name and the queue settings of the first warehouse are used. "
+                        "Warehouses start in the configuration order: one with a last will (e.g. Home Assistant) "
+                        "shares this connection only if it starts before this one")
+        PublishFilter.AddConfigurationEntries(preset)
+        OfflineQueue.AddConfigurationEntries(preset)
+        PublishQueue.AddConfigurationEntries(preset)
+        PublishPolicy.AddConfigurationEntries(preset)
         return preset
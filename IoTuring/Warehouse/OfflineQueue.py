@@ -0,0 +1,265 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+
+import collections
+import json
+import time
+from pathlib import Path
+from threading import Lock
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+from IoTuring.Configurator.ConfiguratorIO import ConfiguratorIO
+from IoTuring.Logger.LogObject import LogObject
+
+
+CONFIG_KEY_OFFLINE_QUEUE = "offline_queue"
+CONFIG_KEY_OFFLINE_QUEUE_SIZE = "offline_queue_size"
+CONFIG_KEY_OFFLINE_QUEUE_POLICY = "offline_queue_policy"
+CONFIG_KEY_OFFLINE_DRAIN_RATE = "offline_drain_rate"
+
+# Keep only the last message of each topic:
+POLICY_LATEST = "latest"
+# Keep every message, the oldest ones are dropped when the queue is full:
+POLICY_HISTORY = "history"
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_DRAIN_RATE = 20
+
+OFFLINE_QUEUE_FOLDER = "offline_queue"
+OFFLINE_QUEUE_FILE_EXTENSION = ".jsonl"
+
+
+class QueuedMessage():
+    """ A message that couldn't be sent, with the time it was created """
+
+    def __init__(self, topic: str, payload, retain: bool = False, timestamp: float | None = None,
+                 qos: int = 0, expiry: float = 0) -> None:
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.qos = qos
+        # Seconds after which the message is stale, 0 for never:
+        self.expiry = expiry
+
+    def GetAge(self) -> float:
+        """ Seconds since the message was created """
+        return max(0.0, time.time() - self.timestamp)
+
+    def ToJson(self) -> str:
+        return json.dumps({"time": self.timestamp, "topic": self.topic,
+                           "payload": self.payload, "retain": self.retain,
+                           "qos": self.qos, "expiry": self.expiry})
+
+    @classmethod
+    def FromJson(cls, line: str) -> QueuedMessage:
+        data = json.loads(line)
+        return cls(data["topic"], data["payload"], data.get("retain", False), data["time"],
+                   data.get("qos", 0), data.get("expiry", 0))
+
+
+class OfflineQueue(LogObject):
+    """ Stores the messages published while the broker is unreachable, to send them after the reconnection.
+
+    Messages are kept in memory and appended to a file, so they survive a restart.
+    The file is rewritten with only the queued messages when it grows to twice the queue size,
+    and emptied when all the messages are sent.
+    """
+
+    def __init__(self, filePath: Path | None = None,
+                 maxSize: int = DEFAULT_QUEUE_SIZE,
+                 policy: str = POLICY_LATEST,
+                 drainRate: float = DEFAULT_DRAIN_RATE) -> None:
+        """
+        - filePath: where the messages are stored, None to keep them only in memory
+        - maxSize: maximum number of queued messages
+        - policy: POLICY_LATEST or POLICY_HISTORY
+        - drainRate: messages per second sent after the reconnection
+        """
+        if policy not in [POLICY_LATEST, POLICY_HISTORY]:
+            raise Exception(
+                f"Configuration error: Invalid offline queue policy: {policy}")
+
+        self.filePath = filePath
+        self.maxSize = max(1, maxSize)
+        self.policy = policy
+        self.drainRate = drainRate
+
+        # Must be held while using the queue:
+        self.lock = Lock()
+
+        # History: deque of QueuedMessages; latest: topic -> QueuedMessage, oldest first
+        if self.policy == POLICY_HISTORY:
+            self.messages = collections.deque()
+        else:
+            self.messages = collections.OrderedDict()
+
+        self.droppedMessagesCount = 0
+
+        # Lines in the file, to know when to compact it:
+        self.fileLinesCount = 0
+
+        self.LoadFile()
+
+    def GetKey(self) -> tuple:
+        """ Settings of the queue, to compare the queues of warehouses sharing a client """
+        return (self.filePath is not None, self.maxSize, self.policy, self.drainRate)
+
+    def GetDrainInterval(self) -> float:
+        """ Seconds to wait between two messages while draining """
+        return 1 / self.drainRate if self.drainRate > 0 else 0
+
+    def GetSize(self) -> int:
+        return len(self.messages)
+
+    def IsEmpty(self) -> bool:
+        return not self.messages
+
+    def GetDroppedMessagesCount(self) -> int:
+        """ Number of messages dropped because the queue was full """
+        return self.droppedMessagesCount
+
+    def Put(self, topic: str, payload, retain: bool = False, qos: int = 0, expiry: float = 0) -> None:
+        """ Add a message at the end of the queue """
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+
+        message = QueuedMessage(topic, payload, retain, qos=qos, expiry=expiry)
+
+        if self.policy == POLICY_HISTORY:
+            if len(self.messages) >= self.maxSize:
+                self.messages.popleft()
+                self.droppedMessagesCount += 1
+            self.messages.append(message)
+        else:
+            self.messages.pop(topic, None)
+            if len(self.messages) >= self.maxSize:
+                self.messages.popitem(last=False)
+                self.droppedMessagesCount += 1
+            self.messages[topic] = message
+
+        self.AppendToFile(message)
+
+    def Peek(self) -> QueuedMessage | None:
+        """ Return the oldest message, without removing it """
+        if not self.messages:
+            return None
+        if self.policy == POLICY_HISTORY:
+            return self.messages[0]
+        return next(iter(self.messages.values()))
+
+    def Remove(self, message: QueuedMessage) -> None:
+        """ Remove a message returned by Peek, once sent. Nothing happens if it was already replaced """
+        if self.Peek() is not message:
+            return
+        if self.policy == POLICY_HISTORY:
+            self.messages.popleft()
+        else:
+            del self.messages[message.topic]
+
+        if not self.messages:
+            self.WriteFile()
+
+    # FILE
+
+    def LoadFile(self) -> None:
+        """ Queue the messages stored in the file by a previous run """
+        if not self.filePath:
+            return
+        try:
+            self.filePath.parent.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            self.Log(self.LOG_ERROR,
+                     f"Error while creating {self.filePath.parent}: {str(e)}")
+        if not self.filePath.exists():
+            return
+        try:
+            with open(self.filePath, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    message = QueuedMessage.FromJson(line)
+                    if self.policy == POLICY_HISTORY:
+                        self.messages.append(message)
+                    else:
+                        self.messages.pop(message.topic, None)
+                        self.messages[message.topic] = message
+            while len(self.messages) > self.maxSize:
+                if self.policy == POLICY_HISTORY:
+                    self.messages.popleft()
+                else:
+                    self.messages.popitem(last=False)
+            self.Log(self.LOG_INFO,
+                     f"Loaded {len(self.messages)} messages not sent yet")
+        except Exception as e:
+            self.Log(self.LOG_ERROR,
+                     f"Error while loading {self.filePath}: {str(e)}")
+        self.WriteFile()
+
+    def AppendToFile(self, message: QueuedMessage) -> None:
+        if not self.filePath:
+            return
+        if self.fileLinesCount >= 2 * self.maxSize:
+            # Replaced and dropped messages are still in the file:
+            self.WriteFile()
+            return
+        try:
+            with open(self.filePath, "a", encoding="utf-8") as f:
+                f.write(message.ToJson() + "\n")
+            self.fileLinesCount += 1
+        except Exception as e:
+            self.Log(self.LOG_ERROR,
+                     f"Error while writing {self.filePath}: {str(e)}")
+
+    def WriteFile(self) -> None:
+        """ Write the file again with only the queued messages """
+        if not self.filePath:
+            return
+        try:
+            messages = self.messages if self.policy == POLICY_HISTORY \
+                else self.messages.values()
+            with open(self.filePath, "w", encoding="utf-8") as f:
+                for message in messages:
+                    f.write(message.ToJson() + "\n")
+            self.fileLinesCount = len(self.messages)
+        except Exception as e:
+            self.Log(self.LOG_ERROR,
+                     f"Error while writing {self.filePath}: {str(e)}")
+
+    # CONFIGURATION
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject, name: str) -> OfflineQueue | None:
+        """ Create the queue from the configurations of the warehouse, None if it's disabled.
+            name is used for the file name, so it must be different for each warehouse """
+        if not configuratorObject.GetTrueOrFalseFromConfigurations(CONFIG_KEY_OFFLINE_QUEUE):
+            return None
+        return cls(
+            filePath=ConfiguratorIO().getFolderPath().joinpath(
+                OFFLINE_QUEUE_FOLDER, name + OFFLINE_QUEUE_FILE_EXTENSION),
+            maxSize=int(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_OFFLINE_QUEUE_SIZE)),
+            policy=configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_OFFLINE_QUEUE_POLICY),
+            drainRate=float(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_OFFLINE_DRAIN_RATE)))
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset) -> None:
+        """ Add the offline queue questions to a warehouse preset """
+        preset.AddEntry("Store messages on disk while the broker is unreachable", CONFIG_KEY_OFFLINE_QUEUE,
+                        default="N", question_type="yesno",
+                        instruction="They are sent after the reconnection")
+        preset.AddEntry("Maximum number of stored messages", CONFIG_KEY_OFFLINE_QUEUE_SIZE,
+                        default=DEFAULT_QUEUE_SIZE, question_type="integer",
+                        display_if_key_value={CONFIG_KEY_OFFLINE_QUEUE: "Y"})
+        preset.AddEntry("Messages to store", CONFIG_KEY_OFFLINE_QUEUE_POLICY,
+                        default=POLICY_LATEST, question_type="select",
+                        choices=[{"name": "Only the last value of each sensor", "value": POLICY_LATEST},
+                                 {"name": "Every value, the oldest are dropped when full", "value": POLICY_HISTORY}],
+                        display_if_key_value={CONFIG_KEY_OFFLINE_QUEUE: "Y"})
+        preset.AddEntry("Stored messages to send each second after the reconnection", CONFIG_KEY_OFFLINE_DRAIN_RATE,
+                        default=DEFAULT_DRAIN_RATE, question_type="integer",
+                        display_if_key_value={CONFIG_KEY_OFFLINE_QUEUE: "Y"})
@@ -0,0 +1,163 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+
+import re
+import time
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+from IoTuring.Logger.LogObject import LogObject
+
+
+CONFIG_KEY_PUBLISH_ONLY_CHANGES = "publish_only_changes"
+CONFIG_KEY_DEADBAND_ABSOLUTE = "deadband_absolute"
+CONFIG_KEY_DEADBAND_RELATIVE = "deadband_relative"
+CONFIG_KEY_DEADBAND_OVERRIDES = "deadband_overrides"
+CONFIG_KEY_HEARTBEAT = "heartbeat"
+
+DEFAULT_HEARTBEAT = 300
+
+# Overrides format: "<entity data id regex>=<absolute>[,<relative %>];..."
+DEADBAND_OVERRIDES_SEPARATOR = ";"
+DEADBAND_OVERRIDE_ASSIGNMENT = "="
+DEADBAND_VALUES_SEPARATOR = ","
+
+
+class Deadband():
+    """ Minimum change of a numeric value that is worth publishing """
+
+    def __init__(self, absolute: float = 0, relative: float = 0) -> None:
+        """ absolute is in the unit of the value, relative is a percentage of the last published value """
+        self.absolute = absolute
+        self.relative = relative
+
+    def IsExceeded(self, oldValue, newValue) -> bool:
+        """ True if the change from oldValue to newValue is greater than both the absolute and the relative deadband.
+            Values that are not numbers exceed it if they are different """
+        try:
+            oldNumber = float(oldValue)
+            newNumber = float(newValue)
+        except (TypeError, ValueError):
+            return oldValue != newValue
+
+        difference = abs(newNumber - oldNumber)
+        return difference > self.absolute and \
+            difference > abs(oldNumber) * self.relative / 100
+
+
+class PublishFilter(LogObject):
+    """ Decides which values a warehouse must publish: only the changed ones, if the
+    change is over the sensor deadband, and all of them once every heartbeat seconds """
+
+    def __init__(self,
+                 enabled: bool = True,
+                 deadband: Deadband | None = None,
+                 heartbeat: float = DEFAULT_HEARTBEAT,
+                 deadbandOverrides: list[tuple[str, Deadband]] | None = None) -> None:
+        """
+        - enabled: if False, every value is always published
+        - deadband: default deadband of numeric values
+        - heartbeat: maximum seconds without publishing a value
+        - deadbandOverrides: list of (entity data id regex, Deadband), the first match is used
+        """
+        self.enabled = enabled
+        self.deadband = deadband or Deadband()
+        self.heartbeat = heartbeat
+        self.deadbandOverrides = [(re.compile(pattern), overrideDeadband)
+                                  for pattern, overrideDeadband in deadbandOverrides or []]
+
+        # Resolved deadband for each entity data id:
+        self.sensorDeadbands = {}
+
+        # key -> (value, payload, monotonic time) of the last publish
+        self.published = {}
+
+    def SetHeartbeat(self, heartbeat: float) -> None:
+        self.heartbeat = heartbeat
+
+    def GetDeadband(self, entityDataId: str) -> Deadband:
+        """ Deadband of the entity data, from the overrides or the default one """
+        if entityDataId not in self.sensorDeadbands:
+            self.sensorDeadbands[entityDataId] = next(
+                (overrideDeadband for pattern, overrideDeadband in self.deadbandOverrides
+                 if pattern.search(entityDataId)), self.deadband)
+        return self.sensorDeadbands[entityDataId]
+
+    def ShouldPublish(self, key: str, value, payload, entityDataId: str = "") -> bool:
+        """ True if the value must be published.
+        - key: what is published, e.g. the topic
+        - value: the raw value, compared with the deadband
+        - payload: what is sent, a different payload is a change
+        - entityDataId: to look for the deadband of the sensor
+        """
+        if not self.enabled or key not in self.published:
+            return True
+
+        lastValue, lastPayload, lastTime = self.published[key]
+
+        if time.monotonic() - lastTime >= self.heartbeat:
+            return True
+
+        if payload == lastPayload:
+            return False
+
+        return self.GetDeadband(entityDataId).IsExceeded(lastValue, value)
+
+    def SetAsPublished(self, key: str, value, payload) -> None:
+        """ Remember the published value """
+        self.published[key] = (value, payload, time.monotonic())
+
+    def Reset(self) -> None:
+        """ Forget the published values, so all of them will be published again (e.g. after a reconnection) """
+        self.published = {}
+
+    @staticmethod
+    def ParseDeadbandOverrides(overrides: str) -> list[tuple[str, Deadband]]:
+        """ Parse overrides like "Cpu.used_percentage=2;Ram=0,5" to a list of (regex, Deadband) """
+        parsed = []
+        for override in overrides.split(DEADBAND_OVERRIDES_SEPARATOR):
+            if not override.strip():
+                continue
+            try:
+                pattern, values = override.rsplit(DEADBAND_OVERRIDE_ASSIGNMENT, 1)
+                numbers = [float(v) for v in values.split(DEADBAND_VALUES_SEPARATOR)]
+                parsed.append((pattern.strip(), Deadband(*numbers[:2])))
+            except Exception:
+                raise Exception(
+                    f"Configuration error: Invalid deadband override: {override}")
+        return parsed
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject) -> PublishFilter:
+        """ Create the filter from the configurations of the warehouse """
+        return cls(
+            enabled=configuratorObject.GetTrueOrFalseFromConfigurations(
+                CONFIG_KEY_PUBLISH_ONLY_CHANGES),
+            deadband=Deadband(
+                float(configuratorObject.GetFromConfigurations(
+                    CONFIG_KEY_DEADBAND_ABSOLUTE) or 0),
+                float(configuratorObject.GetFromConfigurations(
+                    CONFIG_KEY_DEADBAND_RELATIVE) or 0)),
+            heartbeat=int(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_HEARTBEAT)),
+            deadbandOverrides=cls.ParseDeadbandOverrides(
+                configuratorObject.GetFromConfigurations(CONFIG_KEY_DEADBAND_OVERRIDES) or ""))
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset) -> None:
+        """ Add the publish filter questions to a warehouse preset """
+        preset.AddEntry("Publish only values that changed", CONFIG_KEY_PUBLISH_ONLY_CHANGES,
+                        default="Y", question_type="yesno")
+        preset.AddEntry("Minimum change of numeric values to publish them", CONFIG_KEY_DEADBAND_ABSOLUTE,
+                        default="0", instruction="In the unit of the value",
+                        display_if_key_value={CONFIG_KEY_PUBLISH_ONLY_CHANGES: "Y"})
+        preset.AddEntry("Minimum change of numeric values to publish them, in percent", CONFIG_KEY_DEADBAND_RELATIVE,
+                        default="0", instruction="Percentage of the last published value",
+                        display_if_key_value={CONFIG_KEY_PUBLISH_ONLY_CHANGES: "Y"})
+        preset.AddEntry("Deadbands of single sensors", CONFIG_KEY_DEADBAND_OVERRIDES,
+                        instruction="Format: <sensor id regex>=<minimum change>[,<minimum change %>], separated by ; e.g. Cpu.used_percentage=2;Ram=0,5",
+                        display_if_key_value={CONFIG_KEY_PUBLISH_ONLY_CHANGES: "Y"})
+        preset.AddEntry("Maximum seconds without publishing a value", CONFIG_KEY_HEARTBEAT,
+                        default=DEFAULT_HEARTBEAT, question_type="integer",
+                        display_if_key_value={CONFIG_KEY_PUBLISH_ONLY_CHANGES: "Y"})
@@ -0,0 +1,131 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+    from IoTuring.Entity.Entity import Entity
+    from IoTuring.Entity.EntityData import EntitySensor
+
+from IoTuring.Configurator.MenuPreset import MenuPreset
+
+
+CONFIG_KEY_SENSOR_QOS = "sensor_qos"
+CONFIG_KEY_SENSOR_RETAIN = "sensor_retain"
+CONFIG_KEY_SENSOR_EXPIRY = "sensor_expiry"
+CONFIG_KEY_STATIC_QOS = "static_qos"
+CONFIG_KEY_STATIC_RETAIN = "static_retain"
+CONFIG_KEY_DISCOVERY_QOS = "discovery_qos"
+CONFIG_KEY_COMMAND_QOS = "command_qos"
+
+QOS_CHOICES = [{"name": "0: at most once", "value": 0},
+               {"name": "1: at least once", "value": 1},
+               {"name": "2: exactly once", "value": 2}]
+
+
+class MessagePolicy():
+    """ How a kind of message is published """
+
+    def __init__(self, qos: int = 0, retain: bool = False, expiry: int = 0) -> None:
+        """
+        - qos: MQTT QoS level
+        - retain: if the broker keeps the last message for the new subscribers
+        - expiry: seconds after which the broker drops the message if not delivered yet, 0 for never.
+                  Only with MQTT 5
+        """
+        self.qos = qos
+        self.retain = retain
+        self.expiry = expiry
+
+    def GetQoS(self) -> int:
+        return self.qos
+
+    def IsRetained(self) -> bool:
+        return self.retain
+
+    def GetExpiry(self) -> int:
+        return self.expiry
+
+
+class PublishPolicy():
+    """ QoS, retain and expiry of the messages of a warehouse, for each kind of data:
+
+    - sensors: values updated periodically, changing often
+    - static sensors: values that never change, of the sensors created with static=True
+    - discovery: configurations of the entities, always retained
+    - commands: QoS of the subscriptions to the command topics
+    """
+
+    def __init__(self,
+                 sensorPolicy: MessagePolicy | None = None,
+                 staticPolicy: MessagePolicy | None = None,
+                 discoveryPolicy: MessagePolicy | None = None,
+                 commandQoS: int = 0) -> None:
+        self.sensorPolicy = sensorPolicy or MessagePolicy()
+        self.staticPolicy = staticPolicy or MessagePolicy(retain=True)
+        self.discoveryPolicy = discoveryPolicy or MessagePolicy(qos=1, retain=True)
+        self.commandQoS = commandQoS
+
+    def GetEntityPolicy(self, entity: Entity) -> MessagePolicy:
+        """ Policy of the values of all the entity sensors together, static if all of them are """
+        entitySensors = entity.GetEntitySensors()
+        if entitySensors and all(entitySensor.IsStatic() for entitySensor in entitySensors):
+            return self.staticPolicy
+        return self.sensorPolicy
+
+    def GetSensorPolicy(self, entitySensor: EntitySensor) -> MessagePolicy:
+        if entitySensor.IsStatic():
+            return self.staticPolicy
+        return self.sensorPolicy
+
+    def GetDiscoveryPolicy(self) -> MessagePolicy:
+        return self.discoveryPolicy
+
+    def GetCommandQoS(self) -> int:
+        return self.commandQoS
+
+    @classmethod
+    def FromConfigurations(cls, configuratorObject: ConfiguratorObject) -> PublishPolicy:
+        """ Create the policy from the configurations of the warehouse """
+        discoveryPolicy = None
+        if configuratorObject.GetConfigurations().HasConfigKey(CONFIG_KEY_DISCOVERY_QOS):
+            discoveryPolicy = MessagePolicy(
+                qos=int(configuratorObject.GetFromConfigurations(
+                    CONFIG_KEY_DISCOVERY_QOS)),
+                retain=True)
+
+        return cls(
+            sensorPolicy=MessagePolicy(
+                qos=int(configuratorObject.GetFromConfigurations(
+                    CONFIG_KEY_SENSOR_QOS)),
+                retain=configuratorObject.GetTrueOrFalseFromConfigurations(
+                    CONFIG_KEY_SENSOR_RETAIN),
+                expiry=int(configuratorObject.GetFromConfigurations(
+                    CONFIG_KEY_SENSOR_EXPIRY))),
+            staticPolicy=MessagePolicy(
+                qos=int(configuratorObject.GetFromConfigurations(
+                    CONFIG_KEY_STATIC_QOS)),
+                retain=configuratorObject.GetTrueOrFalseFromConfigurations(
+                    CONFIG_KEY_STATIC_RETAIN)),
+            discoveryPolicy=discoveryPolicy,
+            commandQoS=int(configuratorObject.GetFromConfigurations(
+                CONFIG_KEY_COMMAND_QOS)))
+
+    @staticmethod
+    def AddConfigurationEntries(preset: MenuPreset, discovery: bool = False) -> None:
+        """ Add the publish policy questions to a warehouse preset, discovery if the warehouse sends it """
+        preset.AddEntry("QoS of the sensor values", CONFIG_KEY_SENSOR_QOS,
+                        default=0, question_type="select", choices=QOS_CHOICES)
+        preset.AddEntry("Retain the sensor values", CONFIG_KEY_SENSOR_RETAIN,
+                        default="N", question_type="yesno")
+        preset.AddEntry("Seconds after which the broker drops sensor values not delivered yet", CONFIG_KEY_SENSOR_EXPIRY,
+                        default=0, question_type="integer",
+                        instruction="So late subscribers don't get old values. 0 for never, requires MQTT 5")
+        preset.AddEntry("QoS of the values that never change", CONFIG_KEY_STATIC_QOS,
+                        default=0, question_type="select", choices=QOS_CHOICES,
+                        instruction="E.g. the hostname or the boot time")
+        preset.AddEntry("Retain the values that never change", CONFIG_KEY_STATIC_RETAIN,
+                        default="Y", question_type="yesno")
+        if discovery:
+            preset.AddEntry("QoS of the discovery messages", CONFIG_KEY_DISCOVERY_QOS,
+                            default=1, question_type="select", choices=QOS_CHOICES)
+        preset.AddEntry("QoS of the commands", CONFIG_KEY_COMMAND_QOS,
+                        default=0, question_type="select", choices=QOS_CHOICES)
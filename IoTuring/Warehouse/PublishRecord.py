@@ -0,0 +1,52 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from IoTuring.Entity.EntityData import EntitySensor
+
+
+class PublishRecord():
+    """ What a warehouse publishes for an entity sensor on a topic.
+
+    The topic is computed once, when the warehouse starts. The payload is formatted and
+    encoded only when the sensor version changes, otherwise the cached bytes are reused.
+    """
+
+    def __init__(self,
+                 entitySensor: EntitySensor,
+                 topic: str,
+                 formatFunction: Callable[[EntitySensor], tuple]) -> None:
+        """
+        - entitySensor: the sensor to publish
+        - topic: where to publish it
+        - formatFunction: receives the sensor, returns (value, payload string) to publish
+        """
+        self.entitySensor = entitySensor
+        self.topic = topic
+        self.formatFunction = formatFunction
+
+        # Sensor version of the cached payload, None if not formatted yet:
+        self.version = None
+        self.value = None
+        self.payload = b""
+
+    def GetTopic(self) -> str:
+        return self.topic
+
+    def GetEntitySensor(self) -> EntitySensor:
+        return self.entitySensor
+
+    def GetId(self) -> str:
+        return self.entitySensor.GetId()
+
+    def HasValue(self) -> bool:
+        return self.entitySensor.HasValue()
+
+    def GetValueAndPayload(self) -> tuple:
+        """ Return the value and the encoded payload, formatting them again only if the sensor changed """
+        # Read the version first: if the sensor changes meanwhile, the next call formats it again
+        version = self.entitySensor.GetVersion()
+        if version != self.version:
+            self.value, payload = self.formatFunction(self.entitySensor)
+            self.payload = str(payload).encode("utf-8")
+            self.version = version
+        return self.value, self.payload
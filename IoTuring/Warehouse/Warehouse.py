@@ -3,15 +3,18 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from IoTuring.Entity.Entity import Entity
     from IoTuring.Configurator.Configuration import SingleConfiguration
+    from IoTuring.Entity.EntityData import EntitySensor
 
-from threading import Thread
+from threading import Thread, Event
 import time
 
 from IoTuring.Logger.LogObject import LogObject
 from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
 from IoTuring.Entity.EntityManager import EntityManager
+from IoTuring.Scheduler.Scheduler import Ticker, Tick
+from IoTuring.Scheduler.PhaseOffset import PhaseOffset
 
-from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, CONFIG_KEY_UPDATE_INTERVAL, CONFIG_KEY_RETRY_INTERVAL
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings, CONFIG_KEY_UPDATE_INTERVAL, CONFIG_KEY_RETRY_INTERVAL, CONFIG_KEY_RETRY_MAX_INTERVAL, CONFIG_KEY_PUBLISH_ON_CHANGE, CONFIG_KEY_CHANGE_COALESCE_DELAY
 
 
 class Warehouse(ConfiguratorObject, LogObject):
@@ -23,9 +26,24 @@ class Warehouse(ConfiguratorObject, LogObject):
             AppSettings.GetFromSettingsConfigurations(CONFIG_KEY_UPDATE_INTERVAL))
         self.retry_interval = int(AppSettings
                                   .GetFromSettingsConfigurations(CONFIG_KEY_RETRY_INTERVAL))
+        self.retry_max_interval = int(AppSettings
+                                      .GetFromSettingsConfigurations(CONFIG_KEY_RETRY_MAX_INTERVAL))
+
+        # Timing of the last scheduled loop, the loops run because values changed are off the grid:
+        self.lastTick = None
+
+        # Run the loop also when entity values change:
+        self.loopOnChange = AppSettings.GetTrueOrFalseFromSettingsConfigurations(
+            CONFIG_KEY_PUBLISH_ON_CHANGE)
+        self.changeCoalesceDelay = int(AppSettings.GetFromSettingsConfigurations(
+            CONFIG_KEY_CHANGE_COALESCE_DELAY)) / 1000
+        self.valuesChanged = Event()
 
     def Start(self) -> None:
         """ Initial configuration and start the thread that will loop the Warehouse.Loop() function"""
+        if self.loopOnChange:
+            EntityManager().AddValuesChangedListener(self.OnValuesChanged)
+
         thread = Thread(target=self.LoopThread)
         thread.daemon = True
         thread.start()
@@ -34,17 +52,81 @@ class Warehouse(ConfiguratorObject, LogObject):
         """ Set a timeout between 2 loops """
         self.loopTimeout = timeout
 
+    def GetLoopTimeout(self) -> float:
+        """ Return the timeout between 2 loops """
+        return self.loopTimeout
+
     def ShouldCallLoop(self) -> bool:
-        """ Wait the timeout time and then tell it can run the Loop function """
-        time.sleep(self.loopTimeout)
+        """ Called when the loop is due: return False to skip this loop """
         return True
 
+    def GetLastTick(self) -> Tick | None:
+        """ Return the Tick of the last scheduled loop: its deadline and how late it started """
+        return self.lastTick
+
+    def GetTimeUntilNextLoop(self) -> float:
+        """ Seconds until the deadline of the next loop """
+        if not self.lastTick:
+            return self.GetLoopTimeout()
+        return max(0.0, self.lastTick.deadline + self.GetLoopTimeout() - time.monotonic())
+
     def LoopThread(self) -> None:
-        """ Entry point of the warehouse thread, will run Loop() periodically """
-        self.Loop()  # First call without sleep before
+        """ Entry point of the warehouse thread, will run Loop() periodically.
+            Loops start on a fixed grid of the monotonic clock, so they don't drift.
+            The grid is shifted by the phase offset, so hosts don't publish all together """
+        delay = PhaseOffset.FromSettings() \
+            .GetDelay(self.GetLoopTimeout())
+        if delay:
+            self.Log(self.LOG_DEBUG, f"First loop in {delay:.1f} seconds")
+        ticker = Ticker(delay)
+        time.sleep(delay)
+        tick = ticker.MakeTick()
         while (True):
             if self.ShouldCallLoop():
-                self.Loop()
+                self.CallLoop(tick)
+
+            ticker.NextDeadline(self.GetLoopTimeout())
+
+            # Before the next deadline, loop every time values change:
+            while self.WaitForValuesChanged(ticker.GetDeadline()):
+                self.CallLoop()
+
+            tick = ticker.MakeTick()
+
+    def CallLoop(self, tick: Tick | None = None) -> None:
+        """ Run the Loop function. tick: of the scheduled loop, saved for the timing of the next ones;
+            None for a loop run because values changed """
+        if tick:
+            self.lastTick = tick
+        if tick and tick.missed:
+            self.Log(self.LOG_WARNING,
+                     f"Loop is slower than the loop timeout, skipped {tick.missed} loops")
+        # This loop sends all the changes until now:
+        self.valuesChanged.clear()
+        self.Loop()
+
+    def OnValuesChanged(self, entitySensor: EntitySensor) -> None:
+        """ Called by the EntityManager when a value changes, wakes up the loop thread """
+        self.valuesChanged.set()
+
+    def WaitForValuesChanged(self, deadline: float) -> bool:
+        """ Wait until the deadline (monotonic time).
+            Returns True earlier if values changed and the loop should run now """
+        delay = deadline - time.monotonic()
+        if delay <= 0:
+            return False
+
+        if not self.loopOnChange:
+            time.sleep(delay)
+            return False
+
+        if not self.valuesChanged.wait(delay):
+            return False
+
+        # Collect the other changes coming together, e.g. from the same update:
+        time.sleep(min(self.changeCoalesceDelay,
+                       max(0, deadline - time.monotonic())))
+        return True
 
     def GetEntities(self) -> list[Entity]:
         return EntityManager().GetEntities()
@@ -0,0 +1,45 @@
+from IoTuring.Configurator.Configuration import SingleConfiguration
+from IoTuring.Settings.SettingsManager import SettingsManager
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings
+from IoTuring.Entity.EntityManager import EntityManager
+from IoTuring.Entity.Deployments.AppInfo.AppInfo import AppInfo, KEY_UPDATE
+
+
+class TestEntitySensorChanges:
+    def setup_method(self):
+        SettingsManager().AddSettings(
+            [AppSettings(SingleConfiguration("settings", {"type": "App"}), early_init=False)])
+        self.changes = []
+        EntityManager().AddValuesChangedListener(self.changes.append)
+        self.entity = AppInfo(SingleConfiguration("active_entities", {"type": "AppInfo"}))
+        self.entity.Initialize()
+        self.entitySensor = self.entity.GetEntitySensorByKey(KEY_UPDATE)
+        self.changes.clear()
+
+    def teardown_method(self):
+        EntityManager().valuesChangedListeners.remove(self.changes.append)
+
+    def testOnlyRealChangesAreNotified(self):
+        self.entity.SetEntitySensorValue(KEY_UPDATE, "False")
+        version = self.entitySensor.GetVersion()
+        assert self.changes == [self.entitySensor]
+
+        # Same value, nothing changes:
+        self.entity.SetEntitySensorValue(KEY_UPDATE, "False")
+        assert self.entitySensor.GetVersion() == version
+        assert len(self.changes) == 1
+
+        self.entity.SetEntitySensorValue(KEY_UPDATE, "True")
+        assert self.entitySensor.GetVersion() == version + 1
+        assert len(self.changes) == 2
+
+    def testOnlyRealExtraAttributeChangesAreNotified(self):
+        self.entity.SetEntitySensorExtraAttribute(KEY_UPDATE, "Latest version", "1.0")
+        version = self.entitySensor.GetVersion()
+
+        self.entity.SetEntitySensorExtraAttribute(KEY_UPDATE, "Latest version", "1.0")
+        assert self.entitySensor.GetVersion() == version
+
+        self.entity.SetEntitySensorExtraAttribute(KEY_UPDATE, "Latest version", "2.0")
+        assert self.entitySensor.GetVersion() == version + 1
+        assert len(self.changes) == 2
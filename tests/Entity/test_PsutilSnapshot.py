@@ -0,0 +1,46 @@
+import psutil
+
+from IoTuring.Configurator.Configuration import SingleConfiguration
+from IoTuring.Settings.SettingsManager import SettingsManager
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings
+from IoTuring.Entity.PsutilSnapshot import PsutilSnapshot
+
+
+class TestPsutilSnapshot:
+    def setup_method(self):
+        SettingsManager().AddSettings(
+            [AppSettings(SingleConfiguration("settings", {"type": "App"}), early_init=False)])
+        # Process-wide singleton, the values cached by a test must not reach the others:
+        self.snapshot = PsutilSnapshot()
+        self.ttl = self.snapshot.ttl
+        self.snapshot.cache.clear()
+
+    def teardown_method(self):
+        self.snapshot.SetTTL(self.ttl)
+        self.snapshot.cache.clear()
+
+    def testCallsAreCached(self, monkeypatch):
+        calls = []
+
+        def FakeVirtualMemory():
+            calls.append(1)
+            return len(calls)
+
+        monkeypatch.setattr(psutil, "virtual_memory", FakeVirtualMemory)
+
+        snapshot = self.snapshot
+        snapshot.SetTTL(60)
+        assert snapshot.VirtualMemory() == 1
+        assert snapshot.VirtualMemory() == 1
+        assert len(calls) == 1
+
+        snapshot.SetTTL(0)
+        assert snapshot.VirtualMemory() == 2
+
+    def testArgumentsAreCachedSeparately(self, monkeypatch):
+        monkeypatch.setattr(psutil, "disk_usage", lambda path: path)
+
+        snapshot = self.snapshot
+        snapshot.SetTTL(60)
+        assert snapshot.DiskUsage("/a") == "/a"
+        assert snapshot.DiskUsage("/b") == "/b"
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from IoTuring.Configurator.Configuration import SingleConfiguration
+from IoTuring.Settings.SettingsManager import SettingsManager
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings
+from IoTuring.Entity.ShellWorkerPool import ShellWorker, ShellWorkerPool
+
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="Shell workers need a POSIX shell")
+
+
+class TestShellWorker:
+    def setup_method(self):
+        self.worker = ShellWorker()
+
+    def teardown_method(self):
+        self.worker.Close()
+
+    def testOutputAndExitCode(self):
+        result = self.worker.Run("echo out; echo err >&2; exit_code() { return 3; }; exit_code")
+        assert result.stdout == "out\n"
+        assert result.stderr == "err\n"
+        assert result.returncode == 3
+
+        # Output without final newline, and no output at all:
+        assert self.worker.Run("printf abc").stdout == "abc"
+        result = self.worker.Run("true")
+        assert (result.stdout, result.stderr, result.returncode) == ("", "", 0)
+
+    def testQuotesAndStdin(self):
+        assert self.worker.Run("echo \"it's\" '\"ok\"'").stdout == "it's \"ok\"\n"
+        # The command can't read the commands sent to the shell:
+        assert self.worker.Run("cat").stdout == ""
+        assert self.worker.Run("echo next").stdout == "next\n"
+
+    def testExit(self):
+        result = self.worker.Run("echo bye; exit 4")
+        assert result.returncode == 4
+        assert result.stdout == "bye\n"
+        assert self.worker.IsAlive()
+
+    def testStateIsNotShared(self):
+        state = "pwd; echo \"[$VALUE][$EXPORTED]\"; umask"
+        before = self.worker.Run(state).stdout
+        self.worker.Run("cd /tmp; VALUE=set; export EXPORTED=set; umask 077; set -e; trap 'echo trap' EXIT")
+        assert self.worker.Run(state).stdout == before
+        # set -e didn't stay, the command goes on after a failure:
+        assert self.worker.Run("false; echo after").stdout == "after\n"
+
+    def testUnterminatedQuote(self):
+        result = self.worker.Run("echo \"abc")
+        assert result.returncode != 0
+        assert result.stderr
+
+
+class TestShellWorkerPool:
+    def setup_method(self):
+        SettingsManager().AddSettings(
+            [AppSettings(SingleConfiguration("settings", {"type": "App"}), early_init=False)])
+        self.pool = ShellWorkerPool()
+
+    def teardown_method(self):
+        # Stops the idle shells:
+        self.pool.SetSize(0)
+
+    def testWorkersAreReused(self):
+        pool = self.pool
+        pool.SetSize(1)
+        assert pool.IsEnabled()
+
+        first = pool.Run("echo $$").stdout
+        assert pool.Run("echo $$").stdout == first
+
+        # A command exiting doesn't stop the worker:
+        assert pool.Run("exit 2").returncode == 2
+        assert pool.Run("echo $$").stdout == first
+
+        # A worker that died is replaced:
+        assert pool.Run("kill $$").returncode != 0
+        assert pool.Run("echo $$").stdout != first
+        assert pool.workersCount == 1
+
+        pool.SetSize(0)
+        assert not pool.IsEnabled()
+        assert pool.workersCount == 0
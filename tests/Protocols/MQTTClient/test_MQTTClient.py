@@ -0,0 +1,370 @@
+import itertools
+import time
+from threading import Thread
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS, MQTTMessageInfo, ConnectFlags
+from paho.mqtt.reasoncodes import ReasonCode
+from paho.mqtt.packettypes import PacketTypes
+
+from IoTuring.Protocols.MQTTClient import MQTTClient as MQTTClientModule
+from IoTuring.Protocols.MQTTClient.MQTTClient import MQTTClient, MQTT_VERSION_5
+from IoTuring.Protocols.MQTTClient.PublishQueue import OutgoingMessage, PublishQueue
+from IoTuring.Protocols.MQTTClient.MQTTSession import MQTTSession
+from IoTuring.Warehouse.OfflineQueue import OfflineQueue
+
+
+class FakePahoClient:
+    """ Records the SUBSCRIBE packets instead of sending them """
+
+    def __init__(self) -> None:
+        self.subscribes = []
+        self.mids = itertools.count(1)
+        self.reconnectDelay = None
+        self.writeImmediately = False
+        self.publishes = []
+        self.on_publish = None
+
+    def subscribe(self, topics):
+        mid = next(self.mids)
+        self.subscribes.append((mid, topics))
+        return MQTT_ERR_SUCCESS, mid
+
+    def publish(self, topic, payload, qos=0, retain=False, properties=None):
+        self.publishes.append((topic, payload, qos, retain, properties))
+        info = MQTTMessageInfo(next(self.mids))
+        info.rc = MQTT_ERR_SUCCESS
+        if self.writeImmediately:
+            # Written by the network thread before publish() returns:
+            self.on_publish(self, None, info.mid, None, None)
+        return info
+
+    def reconnect_delay_set(self, min_delay, max_delay):
+        self.reconnectDelay = (min_delay, max_delay)
+
+    def socket(self):
+        return None
+
+
+def MakeConnectedClient():
+    client = MQTTClient("localhost", name="test")
+    client.client = FakePahoClient()
+    client.connected = True
+    return client
+
+
+def Suback(client, mid, *codes):
+    client.Event_OnSubscribe(client.client, None, mid,
+                             [ReasonCode(PacketTypes.SUBACK, identifier=code) for code in codes], None)
+
+
+class TestSubscriptions:
+    def testTopicsAreBatched(self, monkeypatch):
+        monkeypatch.setattr(MQTTClientModule, "SUBSCRIBE_BATCH_SIZE", 2)
+        client = MQTTClient("localhost", name="test")
+        client.client = FakePahoClient()
+        for topic in ["a", "b", "c"]:
+            client.AddNewTopicToSubscribeTo(topic, lambda message: None)
+        client.AddNewTopicToSubscribeTo("a", lambda message: None, qos=1)
+
+        client.connected = True
+        client.SubscribeToAllTopics()
+
+        assert [topics for mid, topics in client.client.subscribes] == \
+            [[("a", 1), ("b", 0)], [("c", 0)]]
+        # Already sent, not sent again:
+        client.SubscribeToAllTopics()
+        assert len(client.client.subscribes) == 2
+
+    def testStateFollowsSuback(self):
+        client = MakeConnectedClient()
+        ok = client.AddNewTopicToSubscribeTo("ok", lambda message: None)
+        refused = client.AddNewTopicToSubscribeTo("refused", lambda message: None)
+        assert ok.IsPending() and not ok.GetSubscriptionState()
+
+        Suback(client, 1, 0)
+        Suback(client, 2, 0x80)
+        assert ok.GetSubscriptionState()
+        assert not refused.GetSubscriptionState() and not refused.IsPending()
+
+        # The refused one is retried:
+        client.SubscribeToAllTopics()
+        assert client.client.subscribes[-1][1] == [("refused", 0)]
+
+    def testDisconnectionResetsSubscriptions(self):
+        client = MakeConnectedClient()
+        topicCallback = client.AddNewTopicToSubscribeTo("a", lambda message: None)
+        Suback(client, 1, 0)
+
+        client.Event_OnClientDisconnect(None, None, None, 0, None)
+        assert not topicCallback.GetSubscriptionState()
+        assert client.pendingSubscriptions == {}
+
+
+class TestPersistentSession:
+    def MakeClient(self):
+        client = MQTTClient("localhost", name="test", session=MQTTSession(True))
+        client.client = FakePahoClient()
+        client.connected = True
+        return client
+
+    def Reconnect(self, client, sessionPresent):
+        client.Event_OnClientDisconnect(None, None, None, 0, None)
+        client.Event_OnClientConnect(
+            client.client, None, ConnectFlags(session_present=sessionPresent), 0, None)
+
+    def testCommandsSubscribedWithQoS1(self):
+        client = self.MakeClient()
+        client.AddNewTopicToSubscribeTo("a", lambda message: None)
+        client.AddNewTopicToSubscribeTo("b", lambda message: None, qos=2)
+        assert [topics for mid, topics in client.client.subscribes] == \
+            [[("a", 1)], [("b", 2)]]
+
+    def testNoResubscriptionWhenSessionPresent(self):
+        client = self.MakeClient()
+        subscribed = client.AddNewTopicToSubscribeTo("a", lambda message: None)
+        pending = client.AddNewTopicToSubscribeTo("b", lambda message: None)
+        Suback(client, 1, 0)
+
+        self.Reconnect(client, True)
+        # Only the subscription without SUBACK is sent again:
+        assert client.client.subscribes[-1][1] == [("b", 1)]
+        assert len(client.client.subscribes) == 3
+        assert subscribed.GetSubscriptionState()
+
+    def testResubscriptionWhenSessionLost(self):
+        client = self.MakeClient()
+        client.AddNewTopicToSubscribeTo("a", lambda message: None)
+        Suback(client, 1, 0)
+
+        self.Reconnect(client, False)
+        assert client.client.subscribes[-1][1] == [("a", 1)]
+
+
+class TestReconnectBackoff:
+    def testDelayDoublesUpToMax(self, monkeypatch):
+        monkeypatch.setattr(MQTTClientModule.random, "uniform", lambda a, b: b)
+        client = MQTTClient("localhost", name="test")
+        client.SetReconnectBackoff(1, 10)
+        assert [client.GetReconnectDelay(attempt) for attempt in range(6)] == \
+            [1, 2, 4, 8, 10, 10]
+        assert client.GetReconnectDelay(1000) == 10
+
+    def testDelayHasJitter(self):
+        client = MQTTClient("localhost", name="test")
+        client.SetReconnectBackoff(1, 10)
+        delays = [client.GetReconnectDelay(3) for i in range(50)]
+        assert all(0 <= delay <= 8 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def testConnectionResetsAttempts(self):
+        client = MQTTClient("localhost", name="test")
+        client.client = FakePahoClient()
+        client.SetReconnectBackoff(1, 10)
+        client.Event_OnConnectFail(client.client, None)
+        client.Event_OnConnectFail(client.client, None)
+        assert client.reconnectAttempts == 2
+        delay = client.client.reconnectDelay
+        assert delay[0] == delay[1] <= 2
+
+        client.Event_OnClientConnect(
+            client.client, None, ConnectFlags(session_present=False), 0, None)
+        assert client.reconnectAttempts == 0
+        assert client.WaitForConnection(0)
+
+    def testRefusedConnectionIsOneAttempt(self):
+        client = MQTTClient("localhost", name="test")
+        client.client = FakePahoClient()
+        # paho calls on_disconnect after a refused CONNACK:
+        client.Event_OnClientConnect(
+            client.client, None, ConnectFlags(session_present=False),
+            ReasonCode(PacketTypes.CONNACK, identifier=0x87), None)
+        client.Event_OnClientDisconnect(client.client, None, None, 0x87, None)
+        assert client.reconnectAttempts == 1
+        assert not client.WaitForConnection(0)
+
+
+class TestPublish:
+    def testLatencyIsMeasuredWhenWritten(self):
+        client = MakeConnectedClient()
+        client.client.on_publish = client.Event_OnPublish
+
+        client.Publish(OutgoingMessage("a", "1"))
+        assert len(client.unsentPublishes) == 1
+        assert client.GetPublishQueue().GetMetrics()["published"] == 0
+
+        client.Event_OnPublish(client.client, None, 1, None, None)
+        assert client.unsentPublishes == {}
+        assert client.GetPublishQueue().GetMetrics()["published"] == 1
+
+    def testWrittenBeforePublishReturns(self):
+        client = MakeConnectedClient()
+        client.client.on_publish = client.Event_OnPublish
+        client.client.writeImmediately = True
+
+        client.Publish(OutgoingMessage("a", "1"))
+        assert client.unsentPublishes == {}
+        assert client.earlyPublishes == set()
+        assert client.GetPublishQueue().GetMetrics()["published"] == 1
+
+    def testOnPublishedWhenAccepted(self):
+        client = MakeConnectedClient()
+        published = []
+        client.Publish(OutgoingMessage("a", "1", expiry=10, queuedTime=time.monotonic() - 11,
+                                       onPublished=lambda: published.append("a")))
+        client.Publish(OutgoingMessage("b", "1", onPublished=lambda: published.append("b")))
+        # Expired messages are not published:
+        assert published == ["b"]
+
+    def testQoS1SurvivesDisconnection(self):
+        client = MakeConnectedClient()
+        client.client.on_publish = client.Event_OnPublish
+        client.Publish(OutgoingMessage("a", "1", qos=0))
+        client.Publish(OutgoingMessage("b", "2", qos=1))
+
+        client.Event_OnClientDisconnect(client.client, None, None, 0, None)
+        # paho sends the QoS 1 message again, its PUBACK arrives after the reconnection:
+        assert list(client.unsentPublishes) == [2]
+        client.Event_OnPublish(client.client, None, 2, None, None)
+        assert client.unsentPublishes == {}
+        assert client.earlyPublishes == set()
+        assert client.GetPublishQueue().GetMetrics()["published"] == 1
+
+    def testUnknownMessageIdsAreNotKept(self):
+        client = MakeConnectedClient()
+        client.client.on_publish = client.Event_OnPublish
+        client.Event_OnPublish(client.client, None, 1, None, None)
+        assert client.earlyPublishes == set()
+
+        # The same message id, reused by a later message, is not taken as already written:
+        client.Publish(OutgoingMessage("a", "1"))
+        assert list(client.unsentPublishes) == [1]
+
+    def testOfflineMessagesTakeTheRateTokens(self):
+        client = MakeConnectedClient()
+        client.SetPublishQueue(PublishQueue(messageRate=100, byteRate=0))
+        client.SetOfflineQueue(OfflineQueue(drainRate=0))
+        client.offlineQueue.Put("a", "1")
+        client.offlineQueue.Put("b", "2")
+
+        client.draining = True
+        client.DrainOfflineQueueThread()
+        assert [payload for topic, payload, qos, retain, properties in client.client.publishes] == ["1", "2"]
+        assert client.offlineQueue.IsEmpty()
+        assert client.GetPublishQueue().messageBucket.tokens < 99
+
+    def testExpiredMessagesAreNotSent(self):
+        client = MakeConnectedClient()
+        client.Publish(OutgoingMessage("a", "1", expiry=10, queuedTime=time.monotonic() - 11))
+        assert client.client.publishes == []
+        assert client.GetPublishQueue().GetMetrics()["expired"] == 1
+
+    def testExpiryIsSentWithMQTT5(self):
+        client = MQTTClient("localhost", name="test", protocolVersion=MQTT_VERSION_5)
+        client.client = FakePahoClient()
+        client.connected = True
+        client.Publish(OutgoingMessage("a", "1", qos=1, expiry=10,
+                                       queuedTime=time.monotonic() - 4))
+        topic, payload, qos, retain, properties = client.client.publishes[0]
+        assert qos == 1
+        assert properties.MessageExpiryInterval == 5
+
+    def testTopicAliasesWithMQTT5(self):
+        client = MQTTClient("localhost", name="test", protocolVersion=MQTT_VERSION_5)
+        client.client = FakePahoClient()
+        client.connected = True
+        client.topicAliases.Reset(maximum=10)
+        for qos in [0, 0, 0, 1]:
+            client.Publish(OutgoingMessage("a/long/topic", "1", qos=qos))
+
+        sent = [(topic, properties and properties.TopicAlias)
+                for topic, payload, qos, retain, properties in client.client.publishes]
+        # Set at the second publish, then only the alias; never with QoS 1:
+        assert sent == [("a/long/topic", None), ("a/long/topic", 1), ("", 1), ("a/long/topic", None)]
+
+    def testAliasesResetBetweenPublishes(self):
+        client = MQTTClient("localhost", name="test", protocolVersion=MQTT_VERSION_5)
+        client.client = FakePahoClient()
+        client.topicAliases.Reset(maximum=10)
+        # A message is being passed to paho:
+        client.publishLock.acquire()
+        thread = Thread(target=client.Event_OnClientDisconnect, args=(None, None, None, 0, None))
+        thread.start()
+        thread.join(0.1)
+        assert client.topicAliases.GetMaximum() == 10
+
+        client.publishLock.release()
+        thread.join(1)
+        assert client.topicAliases.GetMaximum() == 0
+
+
+class TestBatch:
+    def StartPublishThread(self, client):
+        client.connectedEvent.set()
+        client.client.writeImmediately = True
+        client.client.on_publish = client.Event_OnPublish
+        client.GetPublishQueue()
+        Thread(target=client.PublishThread, daemon=True).start()
+
+    def WaitForPublishes(self, client, count):
+        deadline = time.monotonic() + 2
+        while len(client.client.publishes) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return [payload for topic, payload, qos, retain, properties in client.client.publishes]
+
+    def testMessagesHeldUntilFlush(self):
+        client = MakeConnectedClient()
+        self.StartPublishThread(client)
+        client.StartBatch()
+        client.StartBatch()
+        for value in ["1", "2", "3"]:
+            client.SendTopicData("a", value)
+        time.sleep(0.1)
+        assert client.client.publishes == []
+
+        client.FlushBatch()
+        time.sleep(0.1)
+        # Another batch is still open:
+        assert client.client.publishes == []
+        client.FlushBatch()
+        assert self.WaitForPublishes(client, 3) == ["1", "2", "3"]
+
+    def testBatchHoldIsLimited(self, monkeypatch):
+        monkeypatch.setattr(MQTTClientModule, "MAX_BATCH_HOLD", 0.1)
+        client = MakeConnectedClient()
+        self.StartPublishThread(client)
+        client.StartBatch()
+        client.SendTopicData("a", "1")
+        assert self.WaitForPublishes(client, 1) == ["1"]
+
+    def testFullQueueIsNotHeld(self):
+        client = MakeConnectedClient()
+        client.SetPublishQueue(PublishQueue(maxSize=2))
+        self.StartPublishThread(client)
+        client.StartBatch()
+        queue = client.GetPublishQueue()
+        for value in range(5):
+            client.SendTopicData(f"topic{value}", str(value))
+            deadline = time.monotonic() + 1
+            while queue.IsFull() and time.monotonic() < deadline:
+                time.sleep(0.01)
+        # The messages left the queue before the next ones could replace or drop them:
+        assert self.WaitForPublishes(client, 4) == ["0", "1", "2", "3"]
+        assert queue.GetMetrics()["dropped"] == 0
+        assert queue.GetMetrics()["coalesced"] == 0
+        client.FlushBatch()
+        assert self.WaitForPublishes(client, 5)[4:] == ["4"]
+
+    def testRateLimitsTheMessageSent(self, monkeypatch):
+        client = MakeConnectedClient()
+        client.SetPublishQueue(PublishQueue(maxSize=1, messageRate=0, byteRate=100))
+        taken = []
+        queue = client.GetPublishQueue()
+        getRateDelay = queue.GetRateDelay
+        monkeypatch.setattr(queue, "GetRateDelay",
+                            lambda message: taken.append(message.payload) or getRateDelay(message))
+        client.SendTopicData("a", "1")
+        # The queue is full, the new topic drops the waiting message:
+        client.SendTopicData("b", "2")
+        self.StartPublishThread(client)
+        assert self.WaitForPublishes(client, 1) == ["2"]
+        assert taken == ["2"]
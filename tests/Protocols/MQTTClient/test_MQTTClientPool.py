@@ -0,0 +1,52 @@
+from IoTuring.Protocols.MQTTClient.MQTTClientPool import MQTTClientPool
+from IoTuring.Protocols.MQTTClient.PublishQueue import PublishQueue
+from IoTuring.Warehouse.OfflineQueue import OfflineQueue
+
+
+class TestMQTTClientPool:
+    def testSameBrokerSharesTheClient(self):
+        pool = MQTTClientPool()
+        client = pool.GetClient("pool-test-1", 1883, "a", lwt=("a/lwt", "OFFLINE"))
+        assert pool.GetClient("Pool-Test-1", "1883", "b") is client
+        assert pool.GetClient("pool-test-1", 1883, "c", lwt=("a/lwt", "OFFLINE")) is client
+        assert pool.GetClient("pool-test-1", 1884, "d") is not client
+        assert pool.GetClient("pool-test-1", 1883, "e", "user", "pass") is not client
+        assert pool.GetClient("pool-test-1", 1883, "f", shared=False) is not client
+
+    def testDifferentLastWillGetsAnotherClient(self):
+        pool = MQTTClientPool()
+        client = pool.GetClient("pool-test-2", 1883, "a")
+        # Not connected yet, the will can be set:
+        assert pool.GetClient("pool-test-2", 1883, "b", lwt=("b/lwt", "OFF")) is client
+        assert client.GetLwt() == ("b/lwt", "OFF")
+        assert pool.GetClient("pool-test-2", 1883, "c", lwt=("c/lwt", "OFF")) is not client
+
+    def testUnsubscribeOnlyWhenTheLastCallbackIsRemoved(self):
+        client = MQTTClientPool().GetClient("pool-test-3", 1883, "a")
+        unsubscribed = []
+        client.client.unsubscribe = unsubscribed.append
+        first = client.AddNewTopicToSubscribeTo("a/b", lambda message: None)
+        second = client.AddNewTopicToSubscribeTo("a/b", lambda message: None)
+
+        client.RemoveTopicCallback(first)
+        assert unsubscribed == []
+        client.RemoveTopicCallback(second)
+        assert unsubscribed == ["a/b"]
+
+    def testSharedClientKeepsTheFirstQueues(self, monkeypatch):
+        client = MQTTClientPool().GetClient("pool-test-4", 1883, "a")
+        warnings = []
+        monkeypatch.setattr(client, "Log", lambda loglevel, message: warnings.append(message)
+                            if loglevel == client.LOG_WARNING else None)
+        first = PublishQueue(messageRate=10)
+        client.SetPublishQueue(first)
+        client.SetPublishQueue(PublishQueue(messageRate=10))
+        assert warnings == []
+
+        # The settings of the joining warehouse are not used, it's logged:
+        client.SetPublishQueue(PublishQueue(messageRate=20))
+        client.SetOfflineQueue(OfflineQueue(maxSize=10))
+        client.SetOfflineQueue(OfflineQueue(maxSize=20))
+        assert client.GetPublishQueue() is first
+        assert client.offlineQueue.maxSize == 10
+        assert len(warnings) == 2
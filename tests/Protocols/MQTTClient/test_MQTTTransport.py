@@ -0,0 +1,37 @@
+import socket
+import ssl
+
+import pytest
+
+from IoTuring.Protocols.MQTTClient.MQTTTransport import MQTTTransport, ResumingSSLContext, \
+    TRANSPORT_TCP, TRANSPORT_TLS, TRANSPORT_UNIX
+from IoTuring.Protocols.MQTTClient.MQTTClientPool import MQTTClientPool
+
+
+class TestMQTTTransport:
+    def testPahoTransport(self):
+        assert MQTTTransport(TRANSPORT_TCP).GetPahoTransport() == "tcp"
+        assert MQTTTransport(TRANSPORT_TLS).GetPahoTransport() == "tcp"
+        assert MQTTTransport(TRANSPORT_UNIX).GetPahoTransport() == "unix"
+        with pytest.raises(Exception):
+            MQTTTransport("udp")
+
+    def testSSLContextIsKept(self):
+        transport = MQTTTransport(TRANSPORT_TLS)
+        context = transport.GetSSLContext()
+        assert isinstance(context, ResumingSSLContext)
+        assert context.verify_mode == ssl.CERT_REQUIRED
+        # The same context keeps the session for the next connections:
+        assert transport.GetSSLContext() is context
+
+    def testSaveSessionIgnoresPlainSockets(self):
+        transport = MQTTTransport(TRANSPORT_TLS)
+        transport.GetSSLContext()
+        with socket.socket() as plainSocket:
+            assert not transport.SaveSession(plainSocket)
+        assert transport.GetSSLContext().session is None
+
+    def testDifferentTransportsDontShareClients(self):
+        assert MQTTClientPool.MakeBrokerKey("broker", 1883, "", "") != \
+            MQTTClientPool.MakeBrokerKey("broker", 1883, "", "",
+                                         transport=MQTTTransport(TRANSPORT_TLS))
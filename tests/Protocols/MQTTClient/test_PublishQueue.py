@@ -0,0 +1,63 @@
+from IoTuring.Protocols.MQTTClient.PublishQueue import PublishQueue, TokenBucket
+
+
+def PopAll(publishQueue):
+    messages = []
+    while (message := publishQueue.Pop()):
+        messages.append((message.topic, message.payload))
+    return messages
+
+
+class TestPublishQueue:
+    def testMessagesKeepTheOrder(self):
+        publishQueue = PublishQueue(maxSize=10)
+        for topic, payload in [("a", "1"), ("b", "1"), ("a", "2")]:
+            publishQueue.Put(topic, payload)
+        assert PopAll(publishQueue) == [("a", "1"), ("b", "1"), ("a", "2")]
+
+    def testFullQueueKeepsLatestValue(self):
+        publishQueue = PublishQueue(maxSize=2)
+        publishQueue.Put("a", "1")
+        publishQueue.Put("b", "1")
+        publishQueue.Put("a", "2")
+        assert PopAll(publishQueue) == [("a", "2"), ("b", "1")]
+        assert publishQueue.GetMetrics()["coalesced"] == 1
+
+    def testReplacedMessageTakesTheNewCallback(self):
+        publishQueue = PublishQueue(maxSize=1)
+        publishQueue.Put("a", "1", onPublished=lambda: "1")
+        publishQueue.Put("a", "2", onPublished=lambda: "2")
+        assert publishQueue.Pop().onPublished() == "2"
+
+    def testFullQueueDropsOldest(self):
+        publishQueue = PublishQueue(maxSize=2)
+        for topic in ["a", "b", "c"]:
+            publishQueue.Put(topic, "1")
+        # "a" was dropped, a new "a" is not coalesced with it:
+        publishQueue.Put("a", "2")
+        assert PopAll(publishQueue) == [("c", "1"), ("a", "2")]
+        metrics = publishQueue.GetMetrics()
+        assert metrics["dropped"] == 2
+        assert metrics["max_queue_depth"] == 2
+
+    def testLatency(self):
+        publishQueue = PublishQueue()
+        publishQueue.Put("a", "1")
+        publishQueue.SetAsPublished(publishQueue.Pop())
+        metrics = publishQueue.GetMetrics()
+        assert metrics["published"] == 1
+        assert 0 <= metrics["average_latency"] <= metrics["max_latency"]
+
+
+class TestTokenBucket:
+    def testBurstThenWait(self):
+        bucket = TokenBucket(rate=10)
+        assert [bucket.Take(1) for i in range(10)] == [0] * 10
+        assert 0.05 < bucket.Take(1) <= 0.1
+
+    def testLargeAmountIsPaidByWaiting(self):
+        bucket = TokenBucket(rate=100)
+        assert 0.9 < bucket.Take(200) <= 1
+
+    def testNoLimit(self):
+        assert TokenBucket(rate=0).Take(1000000) == 0
@@ -0,0 +1,43 @@
+from IoTuring.Protocols.MQTTClient.TopicAliases import TopicAliases
+
+
+class TestTopicAliases:
+    def testAliasAfterSecondPublish(self):
+        topicAliases = TopicAliases()
+        topicAliases.Reset(maximum=2)
+        assert topicAliases.GetAlias("a") == (None, False)
+        assert topicAliases.GetAlias("a") == (1, True)
+        assert topicAliases.GetAlias("a") == (1, False)
+        assert topicAliases.GetSavedBytes() == 1
+
+    def testNoAliasesIfNotSupported(self):
+        topicAliases = TopicAliases()
+        for i in range(5):
+            assert topicAliases.GetAlias("a") == (None, False)
+
+    def testHotterTopicTakesTheAlias(self):
+        topicAliases = TopicAliases()
+        topicAliases.Reset(maximum=1)
+        for i in range(2):
+            topicAliases.GetAlias("cold")
+        # Needs more than twice the publishes of the topic with the alias:
+        assert [topicAliases.GetAlias("hot") for i in range(5)][-2:] == [(None, False), (1, True)]
+        assert topicAliases.GetAlias("cold") == (None, False)
+
+    def testResetKeepsTheCounts(self):
+        topicAliases = TopicAliases()
+        topicAliases.Reset(maximum=1)
+        topicAliases.GetAlias("a")
+        topicAliases.GetAlias("a")
+        topicAliases.Reset(maximum=1)
+        # Set again at the first publish of the new connection:
+        assert topicAliases.GetAlias("a") == (1, True)
+
+    def testForgottenAliasIsReused(self):
+        topicAliases = TopicAliases()
+        topicAliases.Reset(maximum=2)
+        for topic in ["a", "a", "b", "b"]:
+            topicAliases.GetAlias(topic)
+        topicAliases.Forget("a")
+        assert topicAliases.GetAlias("c") == (None, False)
+        assert topicAliases.GetAlias("c") == (1, True)
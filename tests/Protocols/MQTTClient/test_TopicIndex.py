@@ -0,0 +1,59 @@
+from IoTuring.Protocols.MQTTClient.TopicCallback import TopicCallback
+from IoTuring.Protocols.MQTTClient.TopicIndex import TopicIndex
+
+
+def MakeIndex(*topics):
+    index = TopicIndex()
+    topicCallbacks = {}
+    for topic in topics:
+        topicCallbacks[topic] = TopicCallback(topic, lambda message: None)
+        index.Add(topicCallbacks[topic])
+    return index, topicCallbacks
+
+
+def MatchedTopics(index, topic):
+    return sorted(tc.GetTopic() for tc in index.Match(topic))
+
+
+class TestTopicIndex:
+    def testExactMatch(self):
+        index, _ = MakeIndex("a/b/c", "a/b")
+        assert MatchedTopics(index, "a/b/c") == ["a/b/c"]
+        assert MatchedTopics(index, "a/b") == ["a/b"]
+        assert MatchedTopics(index, "a/b/d") == []
+
+    def testSingleLevelWildcard(self):
+        index, _ = MakeIndex("a/+/c", "+/+")
+        assert MatchedTopics(index, "a/b/c") == ["a/+/c"]
+        assert MatchedTopics(index, "a/x/c") == ["a/+/c"]
+        assert MatchedTopics(index, "a/b") == ["+/+"]
+        assert MatchedTopics(index, "a/b/c/d") == []
+
+    def testMultiLevelWildcard(self):
+        index, _ = MakeIndex("a/#", "#", "a/b/c")
+        assert MatchedTopics(index, "a/b/c") == ["#", "a/#", "a/b/c"]
+        assert MatchedTopics(index, "a") == ["#", "a/#"]
+        assert MatchedTopics(index, "b") == ["#"]
+
+    def testSystemTopics(self):
+        index, _ = MakeIndex("#", "+/status", "$SYS/#")
+        assert MatchedTopics(index, "$SYS/status") == ["$SYS/#"]
+
+    def testSameAsCompareTopic(self):
+        topics = ["a/+/c", "a/#", "+/b/+", "a/b/c", "#", "+"]
+        index, topicCallbacks = MakeIndex(*topics)
+        for topic in ["a/b/c", "a", "x/b/y", "a/b", "b"]:
+            expected = sorted(t for t in topics if topicCallbacks[t].CompareTopic(topic))
+            assert MatchedTopics(index, topic) == expected
+
+    def testRemove(self):
+        index, topicCallbacks = MakeIndex("a/+/c", "a/+/d", "a/b")
+        index.Remove(topicCallbacks["a/+/c"])
+        index.Remove(topicCallbacks["a/b"])
+        assert MatchedTopics(index, "a/b/c") == []
+        assert MatchedTopics(index, "a/b/d") == ["a/+/d"]
+        assert MatchedTopics(index, "a/b") == []
+
+        index.Remove(topicCallbacks["a/+/d"])
+        assert index.wildcardsRoot.IsEmpty()
+        assert index.GetByTopic("a/+/d") == []
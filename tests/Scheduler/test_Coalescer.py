@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from IoTuring.Scheduler.Coalescer import Coalescer, CoalescingPolicy, \
+    COALESCE_NONE, COALESCE_LATEST, COALESCE_DEBOUNCE, COALESCE_THROTTLE
+from IoTuring.Protocols.MQTTClient.TopicCallback import TopicCallback
+
+
+def RunNow(function):
+    function()
+
+
+class TestCoalescer:
+    def testLatestWins(self):
+        called = []
+        waiting = []
+        coalescer = Coalescer(CoalescingPolicy(COALESCE_LATEST), called.append)
+        # The executor is busy, the runs wait:
+        for message in ["1", "2", "3"]:
+            coalescer.Put(message, waiting.append)
+        assert len(waiting) == 1 and called == []
+
+        waiting.pop()()
+        assert called == ["3"]
+        assert coalescer.GetDroppedCount() == 2
+
+    def testDebounce(self):
+        called = []
+        coalescer = Coalescer(CoalescingPolicy(COALESCE_DEBOUNCE, 0.1), called.append)
+        for message in ["1", "2", "3"]:
+            coalescer.Put(message, RunNow)
+            time.sleep(0.02)
+        assert called == []
+
+        time.sleep(0.25)
+        assert called == ["3"]
+
+    def testThrottle(self):
+        called = []
+        coalescer = Coalescer(CoalescingPolicy(COALESCE_THROTTLE, 0.1), called.append)
+        for message in ["1", "2", "3"]:
+            coalescer.Put(message, RunNow)
+        # The first one runs at once, the last one at the end of the window:
+        assert called == ["1"]
+
+        time.sleep(0.25)
+        assert called == ["1", "3"]
+
+    def testPolicy(self):
+        assert TopicCallback("a", print).GetCoalescer() is None
+        assert TopicCallback("a", print, coalescing=CoalescingPolicy(COALESCE_NONE)).GetCoalescer() is None
+        assert TopicCallback("a", print, coalescing=CoalescingPolicy(COALESCE_LATEST)).GetCoalescer()
+        with pytest.raises(Exception):
+            CoalescingPolicy("wrong")
+
+    def testDiscardedRunIsSubmittedAgain(self):
+        called = []
+        coalescer = Coalescer(CoalescingPolicy(COALESCE_LATEST), called.append)
+        # The executor queue is full:
+        coalescer.Put("a", lambda function: False)
+        coalescer.Put("b", RunNow)
+        assert called == ["b"]
+
+        def Fail(function):
+            raise Exception("Executor stopped")
+        coalescer.Put("c", Fail)
+        coalescer.Put("d", RunNow)
+        assert called == ["b", "d"]
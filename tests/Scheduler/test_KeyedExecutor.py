@@ -0,0 +1,51 @@
+import threading
+import time
+
+from IoTuring.Scheduler.KeyedExecutor import KeyedExecutor
+
+
+class TestKeyedExecutor:
+    def testSameKeyRunsInOrderOneAtATime(self):
+        runs = []
+        running = []
+        overlaps = []
+
+        def Work(i):
+            if running:
+                overlaps.append(i)
+            running.append(i)
+            time.sleep(0.01)
+            runs.append(i)
+            running.pop()
+
+        executor = KeyedExecutor()
+        for i in range(5):
+            executor.Submit("entity", Work, i)
+        executor.Start(workers=4)
+
+        time.sleep(0.3)
+        assert runs == [0, 1, 2, 3, 4]
+        assert overlaps == []
+        assert executor.GetQueueDepth() == 0
+        assert executor.GetMaxQueueDepth() == 5
+
+    def testSlowKeyDoesntBlockTheOthers(self):
+        release = threading.Event()
+        runs = []
+
+        executor = KeyedExecutor()
+        executor.Start(workers=2)
+        executor.Submit("slow", release.wait)
+        executor.Submit("fast", runs.append, 1)
+        executor.Submit("fast", runs.append, 2)
+
+        time.sleep(0.1)
+        assert runs == [1, 2]
+        release.set()
+
+    def testFullQueueDiscards(self):
+        executor = KeyedExecutor(maxQueueSize=2)
+        assert executor.Submit("a", print)
+        assert executor.Submit("b", print)
+        assert not executor.Submit("c", print)
+        assert executor.GetQueueDepth() == 2
@@ -0,0 +1,25 @@
+import pytest
+
+from IoTuring.Scheduler.PhaseOffset import PhaseOffset
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import \
+    PHASE_OFFSET_NONE, PHASE_OFFSET_NAME, PHASE_OFFSET_RANDOM
+
+
+class TestPhaseOffset:
+    def testNameOffsetIsStable(self):
+        first = PhaseOffset(PHASE_OFFSET_NAME, "host1")
+        assert first.GetFraction() == PhaseOffset(PHASE_OFFSET_NAME, "host1").GetFraction()
+        assert first.GetFraction() != PhaseOffset(PHASE_OFFSET_NAME, "host2").GetFraction()
+        assert 0 <= first.GetDelay(10) < 10
+
+    def testNamesAreSpread(self):
+        fractions = [PhaseOffset(PHASE_OFFSET_NAME, f"host{i}").GetFraction()
+                     for i in range(1000)]
+        # Every tenth of the interval has some hosts:
+        assert {int(fraction * 10) for fraction in fractions} == set(range(10))
+
+    def testOtherModes(self):
+        assert PhaseOffset(PHASE_OFFSET_NONE, "host1").GetDelay(10) == 0
+        assert 0 <= PhaseOffset(PHASE_OFFSET_RANDOM).GetDelay(10) < 10
+        with pytest.raises(Exception):
+            PhaseOffset("wrong")
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from IoTuring.Scheduler.Scheduler import Scheduler, ScheduledJob, Ticker
+
+
+def WaitUntil(condition, timeout=2):
+    """ Wait until condition() is True, at most timeout seconds """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestScheduler:
+    def testJobsRunPeriodically(self):
+        runs = {"fast": 0, "slow": 0}
+
+        def Increment(key):
+            runs[key] += 1
+
+        scheduler = Scheduler()
+        # After 5 runs the fast job waits long too, so it's back in the heap:
+        scheduler.AddJob(ScheduledJob("fast", lambda tick: Increment("fast"),
+                                      lambda: 0.02 if runs["fast"] < 5 else 10))
+        scheduler.AddJob(ScheduledJob("slow", lambda tick: Increment("slow"), lambda: 10))
+        scheduler.Start(workers=2)
+
+        assert WaitUntil(lambda: runs["fast"] == 5 and scheduler.GetJobsCount() == 2)
+        assert runs["slow"] == 1  # only the first run
+
+    def testShouldRunSkipsTheRun(self):
+        runs = []
+        checks = []
+
+        def ShouldRun():
+            checks.append(1)
+            return False
+
+        scheduler = Scheduler()
+        scheduler.AddJob(ScheduledJob("job", lambda tick: runs.append(1),
+                                      lambda: 0.01 if len(checks) < 3 else 10, ShouldRun))
+        scheduler.Start(workers=1)
+
+        # Due 3 times, never run:
+        assert WaitUntil(lambda: len(checks) == 3 and scheduler.GetJobsCount() == 1)
+        assert runs == []
+
+    def testWorkersAreBounded(self):
+        running = []
+        maxRunning = []
+        lock = threading.Lock()
+
+        def Work(tick):
+            with lock:
+                running.append(1)
+                maxRunning.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+        scheduler = Scheduler()
+        for i in range(6):
+            scheduler.AddJob(ScheduledJob(f"job{i}", Work, lambda: 0.01))
+        scheduler.Start(workers=2)
+
+        time.sleep(0.3)
+        assert len(scheduler.workers) == 2
+        assert max(maxRunning) == 2
+
+    def testSameJobNeverRunsTwiceAtTheSameTime(self):
+        running = []
+        overlaps = []
+
+        def Work(tick):
+            if running:
+                overlaps.append(1)
+            running.append(1)
+            time.sleep(0.05)
+            running.pop()
+
+        scheduler = Scheduler()
+        scheduler.AddJob(ScheduledJob("job", Work, lambda: 0))
+        scheduler.Start(workers=4)
+
+        time.sleep(0.3)
+        assert overlaps == []
+
+
+class TestTicker:
+    def testDeadlinesDontDrift(self):
+        ticker = Ticker()
+        start = ticker.GetDeadline()
+        for i in range(5):
+            tick = ticker.Wait(0.02)
+            time.sleep(0.01)  # the run duration doesn't move the next deadline
+        assert abs(tick.deadline - (start + 5 * 0.02)) < 1e-9
+        assert tick.missed == 0
+
+    def testMissedDeadlinesAreCoalesced(self):
+        ticker = Ticker()
+        start = ticker.GetDeadline()
+        time.sleep(0.055)  # a long run, more than 5 intervals
+        tick = ticker.Wait(0.01)
+        assert tick.missed >= 4
+        # The late tick stays on the grid:
+        steps = (tick.deadline - start) / 0.01
+        assert abs(steps - round(steps)) < 1e-6
+        assert tick.lateness < 0.01
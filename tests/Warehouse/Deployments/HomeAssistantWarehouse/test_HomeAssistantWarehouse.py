@@ -0,0 +1,78 @@
+import os
+from types import SimpleNamespace
+
+from IoTuring.Warehouse.Deployments.HomeAssistantWarehouse.HomeAssistantWarehouse import EntityDataConfigurations, \
+    HomeAssistantEntityBase, HomeAssistantWarehouse
+from IoTuring.Warehouse.PublishPolicy import PublishPolicy
+
+
+class TestEntityDataConfigurations:
+    def testExactMatchFirstThenRegexInFileOrder(self, tmp_path):
+        path = tmp_path / "entities.yaml"
+        path.write_text("Cpu.*:\n  name: A\nCpu - load:\n  name: B\n.*load:\n  name: C\n")
+        configurations = EntityDataConfigurations(str(path))
+        assert configurations.Get("Cpu - load") == {"name": "B"}
+        assert configurations.Get("Cpu - other load") == {"name": "A"}
+        assert configurations.Get("Ram - load") == {"name": "C"}
+        assert configurations.Get("Ram") == {}
+
+    def testReturnedConfigurationsAreCopies(self, tmp_path):
+        path = tmp_path / "entities.yaml"
+        path.write_text("Cpu:\n  custom_type: binary_sensor\n")
+        configurations = EntityDataConfigurations(str(path))
+        configurations.Get("Cpu").pop("custom_type")
+        assert configurations.Get("Cpu") == {"custom_type": "binary_sensor"}
+
+    def testReloadedWhenTheFileChanges(self, tmp_path):
+        path = tmp_path / "entities.yaml"
+        path.write_text("Cpu:\n  name: A\n")
+        configurations = EntityDataConfigurations(str(path))
+        assert configurations.Get("Cpu") == {"name": "A"}
+
+        path.write_text("Cpu:\n  name: B\n")
+        mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+        os.utime(path, ns=(mtime, mtime))
+        assert configurations.Get("Cpu") == {"name": "B"}
+
+
+class FakeClient:
+    """ Records the messages instead of queueing them """
+
+    def __init__(self) -> None:
+        self.sent = []
+
+    def SendTopicData(self, topic, data, retain=False, qos=0, expiry=0, onPublished=None):
+        self.sent.append((topic, data, onPublished))
+
+
+class TestDiscoveryMessage:
+    def testMessageFollowsThePayload(self, tmp_path):
+        path = tmp_path / "entities.yaml"
+        path.write_text("")
+        wh = SimpleNamespace(clientName="pc", addNameToEntityName=False, device_info={"name": "pc"},
+                             entityDataConfigurations=EntityDataConfigurations(str(path)))
+        hassentity = HomeAssistantEntityBase(wh, "Cpu", "cpu")
+        message = hassentity.GetDiscoveryMessage()
+
+        hassentity.AddTopic("state_topic", "pc/cpu")
+        assert hassentity.GetDiscoveryMessage() != message
+        assert b'"state_topic": "pc/cpu"' in hassentity.GetDiscoveryMessage()
+
+    def testSentOnlyOncePublished(self):
+        wh = HomeAssistantWarehouse.__new__(HomeAssistantWarehouse)
+        wh.client = FakeClient()
+        wh.publishPolicy = PublishPolicy()
+        wh.sentDiscoveryHashes = {}
+
+        wh.SendDiscoveryMessage("topic", b"1")
+        # Not published yet, e.g. dropped by the full publish queue:
+        wh.SendDiscoveryMessage("topic", b"1")
+        assert len(wh.client.sent) == 2
+
+        topic, data, onPublished = wh.client.sent[-1]
+        onPublished()
+        wh.SendDiscoveryMessage("topic", b"1")
+        assert len(wh.client.sent) == 2
+
+        wh.SendDiscoveryMessage("topic", b"2")
+        assert wh.client.sent[-1][1] == b"2"
@@ -0,0 +1,54 @@
+from IoTuring.Warehouse.OfflineQueue import OfflineQueue, POLICY_HISTORY, POLICY_LATEST
+
+
+def Drain(queue):
+    sent = []
+    while not queue.IsEmpty():
+        message = queue.Peek()
+        sent.append((message.topic, message.payload))
+        queue.Remove(message)
+    return sent
+
+
+class TestOfflineQueue:
+    def testHistoryKeepsEveryMessageInOrder(self):
+        queue = OfflineQueue(maxSize=3, policy=POLICY_HISTORY)
+        for i in range(4):
+            queue.Put("a", str(i))
+        assert queue.GetDroppedMessagesCount() == 1
+        assert Drain(queue) == [("a", "1"), ("a", "2"), ("a", "3")]
+
+    def testLatestKeepsOneMessageForTopic(self):
+        queue = OfflineQueue(maxSize=2, policy=POLICY_LATEST)
+        queue.Put("a", "1")
+        queue.Put("b", "1")
+        queue.Put("a", "2")
+        # The replaced message moves to the end:
+        assert Drain(queue) == [("b", "1"), ("a", "2")]
+
+    def testReplacedMessageIsNotRemoved(self):
+        queue = OfflineQueue(policy=POLICY_LATEST)
+        queue.Put("a", "1")
+        message = queue.Peek()
+        queue.Put("a", "2")
+        queue.Remove(message)
+        assert queue.Peek().payload == "2"
+
+    def testMessagesSurviveARestart(self, tmp_path):
+        filePath = tmp_path / "queue.jsonl"
+        queue = OfflineQueue(filePath, maxSize=10, policy=POLICY_HISTORY)
+        queue.Put("a", "1")
+        queue.Put("b", b"2")
+
+        queue = OfflineQueue(filePath, maxSize=10, policy=POLICY_HISTORY)
+        assert Drain(queue) == [("a", "1"), ("b", "2")]
+        # Emptied when everything is sent:
+        assert filePath.read_text() == ""
+
+    def testFileIsCompacted(self, tmp_path):
+        filePath = tmp_path / "queue.jsonl"
+        queue = OfflineQueue(filePath, maxSize=2, policy=POLICY_LATEST)
+        for i in range(10):
+            queue.Put("a", str(i))
+        assert len(filePath.read_text().splitlines()) <= 4
+        assert Drain(OfflineQueue(filePath, policy=POLICY_LATEST)) == [("a", "9")]
@@ -0,0 +1,65 @@
+import time
+
+from IoTuring.Warehouse.PublishFilter import PublishFilter, Deadband
+
+
+class TestDeadband:
+    def testNumbers(self):
+        deadband = Deadband(absolute=1)
+        assert not deadband.IsExceeded(10, 10.5)
+        assert not deadband.IsExceeded(10, 11)
+        assert deadband.IsExceeded(10, 11.5)
+        assert deadband.IsExceeded("10", "8")
+
+        deadband = Deadband(relative=10)
+        assert not deadband.IsExceeded(100, 105)
+        assert deadband.IsExceeded(100, 111)
+
+        # Both must be exceeded:
+        deadband = Deadband(absolute=5, relative=10)
+        assert not deadband.IsExceeded(10, 14)  # 40% but less than 5
+        assert not deadband.IsExceeded(100, 108)
+        assert deadband.IsExceeded(100, 111)
+
+    def testNotNumbers(self):
+        deadband = Deadband(absolute=100)
+        assert not deadband.IsExceeded("ON", "ON")
+        assert deadband.IsExceeded("ON", "OFF")
+
+
+class TestPublishFilter:
+    def testOnlyChangesArePublished(self):
+        publishFilter = PublishFilter(heartbeat=60)
+        assert publishFilter.ShouldPublish("topic", 1, "1")
+        publishFilter.SetAsPublished("topic", 1, "1")
+        assert not publishFilter.ShouldPublish("topic", 1, "1")
+        assert publishFilter.ShouldPublish("topic", 2, "2")
+
+        publishFilter.Reset()
+        assert publishFilter.ShouldPublish("topic", 1, "1")
+
+    def testDisabledPublishesEverything(self):
+        publishFilter = PublishFilter(enabled=False)
+        publishFilter.SetAsPublished("topic", 1, "1")
+        assert publishFilter.ShouldPublish("topic", 1, "1")
+
+    def testHeartbeat(self):
+        publishFilter = PublishFilter(heartbeat=0.05)
+        publishFilter.SetAsPublished("topic", 1, "1")
+        assert not publishFilter.ShouldPublish("topic", 1, "1")
+        time.sleep(0.06)
+        assert publishFilter.ShouldPublish("topic", 1, "1")
+
+    def testDeadbandOverrides(self):
+        overrides = PublishFilter.ParseDeadbandOverrides(
+            "Cpu.used_percentage=2; Ram=0,50")
+        publishFilter = PublishFilter(deadband=Deadband(absolute=10),
+                                      deadbandOverrides=overrides)
+
+        assert publishFilter.GetDeadband("Entity.Cpu.used_percentage").absolute == 2
+        assert publishFilter.GetDeadband("Entity.Ram.swap").relative == 50
+        assert publishFilter.GetDeadband("Entity.Disk.used").absolute == 10
+
+        publishFilter.SetAsPublished("cpu", 10, "10")
+        assert not publishFilter.ShouldPublish("cpu", 11, "11", "Entity.Cpu.used_percentage")
+        assert publishFilter.ShouldPublish("cpu", 13, "13", "Entity.Cpu.used_percentage")
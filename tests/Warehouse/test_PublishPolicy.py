@@ -0,0 +1,59 @@
+from IoTuring.Configurator.Configuration import SingleConfiguration
+from IoTuring.Configurator.ConfiguratorObject import ConfiguratorObject
+from IoTuring.Configurator.MenuPreset import MenuPreset
+from IoTuring.Settings.SettingsManager import SettingsManager
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings
+from IoTuring.Entity.Deployments.AppInfo.AppInfo import AppInfo
+from IoTuring.Entity.Deployments.BootTime.BootTime import BootTime
+from IoTuring.Warehouse.PublishPolicy import PublishPolicy
+
+
+class ConfiguredObject(ConfiguratorObject):
+    DISCOVERY = False
+
+    @classmethod
+    def ConfigurationPreset(cls) -> MenuPreset:
+        preset = MenuPreset()
+        PublishPolicy.AddConfigurationEntries(preset, discovery=cls.DISCOVERY)
+        return preset
+
+
+def MakeEntity(entityClass):
+    entity = entityClass(SingleConfiguration("active_entities", {"type": entityClass.NAME}))
+    entity.Initialize()
+    return entity
+
+
+class TestPublishPolicy:
+    def setup_method(self):
+        SettingsManager().AddSettings(
+            [AppSettings(SingleConfiguration("settings", {"type": "App"}), early_init=False)])
+
+    def testStaticSensorsUseTheStaticPolicy(self):
+        publishPolicy = PublishPolicy.FromConfigurations(ConfiguredObject(
+            SingleConfiguration("warehouses", {"type": "Test", "sensor_expiry": 30})))
+
+        # BootTime has an Update method, but its value never changes:
+        bootTime = MakeEntity(BootTime)
+        static = publishPolicy.GetEntityPolicy(bootTime)
+        assert (static.GetQoS(), static.IsRetained(), static.GetExpiry()) == (0, True, 0)
+        assert publishPolicy.GetSensorPolicy(bootTime.GetEntitySensors()[0]) is static
+
+        # Only the update sensor of AppInfo changes:
+        appInfo = MakeEntity(AppInfo)
+        updated = publishPolicy.GetEntityPolicy(appInfo)
+        assert (updated.GetQoS(), updated.IsRetained(), updated.GetExpiry()) == (0, False, 30)
+        assert [publishPolicy.GetSensorPolicy(entitySensor) is static
+                for entitySensor in appInfo.GetEntitySensors()] == [True, True, False]
+
+    def testDiscoveryIsAlwaysRetained(self):
+        ConfiguredObject.DISCOVERY = True
+        try:
+            publishPolicy = PublishPolicy.FromConfigurations(ConfiguredObject(
+                SingleConfiguration("warehouses", {"type": "Test", "discovery_qos": 0, "command_qos": 1})))
+        finally:
+            ConfiguredObject.DISCOVERY = False
+
+        assert publishPolicy.GetDiscoveryPolicy().GetQoS() == 0
+        assert publishPolicy.GetDiscoveryPolicy().IsRetained()
+        assert publishPolicy.GetCommandQoS() == 1
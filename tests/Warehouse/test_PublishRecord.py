@@ -0,0 +1,37 @@
+from IoTuring.Warehouse.PublishRecord import PublishRecord
+
+
+class FakeSensor:
+    def __init__(self) -> None:
+        self.value = 1
+        self.version = 0
+
+    def GetValue(self):
+        return self.value
+
+    def GetVersion(self) -> int:
+        return self.version
+
+    def SetValue(self, value) -> None:
+        self.value = value
+        self.version += 1
+
+
+class TestPublishRecord:
+    def testPayloadIsFormattedOnlyWhenTheSensorChanges(self):
+        formatted = []
+
+        def Format(sensor):
+            formatted.append(sensor.GetValue())
+            return sensor.GetValue(), f"{sensor.GetValue()} %"
+
+        sensor = FakeSensor()
+        record = PublishRecord(sensor, "topic", Format)
+        assert record.GetValueAndPayload() == (1, b"1 %")
+        assert record.GetValueAndPayload() == (1, b"1 %")
+        assert formatted == [1]
+
+        sensor.SetValue(2)
+        assert record.GetValueAndPayload() == (2, b"2 %")
+        assert formatted == [1, 2]
+        assert record.GetTopic() == "topic"
@@ -0,0 +1,80 @@
+import time
+from threading import Thread
+
+from IoTuring.Configurator.Configuration import SingleConfiguration
+from IoTuring.Settings.SettingsManager import SettingsManager
+from IoTuring.Settings.Deployments.AppSettings.AppSettings import AppSettings
+from IoTuring.Warehouse.Warehouse import Warehouse
+
+
+class LoopCounterWarehouse(Warehouse):
+    NAME = "LoopCounter"
+
+    def __init__(self, single_configuration: SingleConfiguration) -> None:
+        super().__init__(single_configuration)
+        self.loops = []
+
+    def Loop(self) -> None:
+        self.loops.append(time.monotonic())
+
+
+def MakeWarehouse(publishOnChange="Y"):
+    SettingsManager().AddSettings([AppSettings(SingleConfiguration("settings", {
+        "type": "App", "update_interval": 10, "publish_on_change": publishOnChange,
+        "change_coalesce_delay": 100, "phase_offset": "none"}), early_init=False)])
+    return LoopCounterWarehouse(SingleConfiguration("active_warehouses", {"type": "LoopCounter"}))
+
+
+def WaitUntil(condition, timeout=2):
+    """ Wait until condition() is True, at most timeout seconds """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestValuesChanged:
+    def testChangeWakesUpTheLoop(self):
+        warehouse = MakeWarehouse()
+        result = []
+        thread = Thread(target=lambda: result.append(
+            warehouse.WaitForValuesChanged(time.monotonic() + 10)))
+        thread.start()
+        time.sleep(0.05)
+        start = time.monotonic()
+        warehouse.OnValuesChanged(None)
+        thread.join(2)
+        assert result == [True]
+        # After the coalesce delay:
+        assert time.monotonic() - start >= 0.1
+
+    def testNoWakeUpWithoutPublishOnChange(self):
+        warehouse = MakeWarehouse(publishOnChange="N")
+        warehouse.OnValuesChanged(None)
+        assert not warehouse.WaitForValuesChanged(time.monotonic() + 0.05)
+
+    def testChangesTogetherMakeOneLoop(self):
+        warehouse = MakeWarehouse()
+        Thread(target=warehouse.LoopThread, daemon=True).start()
+        # The first scheduled loop:
+        assert WaitUntil(lambda: len(warehouse.loops) == 1)
+
+        for i in range(3):
+            warehouse.OnValuesChanged(None)
+            time.sleep(0.01)
+        assert WaitUntil(lambda: len(warehouse.loops) == 2)
+        time.sleep(0.2)
+        assert len(warehouse.loops) == 2
+
+    def testChangeLoopsKeepTheSchedule(self):
+        warehouse = MakeWarehouse()
+        Thread(target=warehouse.LoopThread, daemon=True).start()
+        assert WaitUntil(lambda: len(warehouse.loops) == 1)
+        scheduledTick = warehouse.GetLastTick()
+
+        warehouse.OnValuesChanged(None)
+        assert WaitUntil(lambda: len(warehouse.loops) == 2)
+        # The next loop is still 10 seconds after the scheduled one:
+        assert warehouse.GetLastTick() is scheduledTick
+        assert abs(warehouse.GetTimeUntilNextLoop() -
+                   (scheduledTick.deadline + 10 - time.monotonic())) < 0.05